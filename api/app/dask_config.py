@@ -39,7 +39,8 @@ class DaskConfig:
         # Explicit local mode
         if self.mode == "local":
             threads = None if self.local_threads == 0 else self.local_threads
-            cluster = LocalCluster(n_workers=0 if self.local_threads == 0 else 1,
+            # n_workers=None lets dask size the cluster to the machine (0 would start no workers at all)
+            cluster = LocalCluster(n_workers=None if self.local_threads == 0 else 1,
                                    threads_per_worker=threads)
             return Client(cluster)
 
@@ -51,6 +52,6 @@ class DaskConfig:
 
         # Default: local cluster
         threads = None if self.local_threads == 0 else self.local_threads
-        cluster = LocalCluster(n_workers=0 if self.local_threads == 0 else 1,
+        cluster = LocalCluster(n_workers=None if self.local_threads == 0 else 1,
                                threads_per_worker=threads)
         return Client(cluster)
@@ -0,0 +1,339 @@
+"""Audit Redis against Postgres, one (namespace, entity) partition per task.
+
+For every active attribute the stored `hash` (md5 of namespace|entity|physical|logical)
+and `version` are compared with what Redis holds: the payloads under its by_phys / by_logi /
+by_syn keys (legacy layout) and/or its record and name -> id index entries in the entity's
+hashes (compact layout, see CACHE_LAYOUT). Findings per entity:
+  - stale:    a cached payload whose hash or version differs from the DB row
+  - missing:  a DB row with no cached entry (normal for a read-through cache; reported for completeness)
+  - orphaned: cached keys / index entries / records for names or ids no longer active in the DB
+Entities come from the DB and from the Redis key prefixes of the namespace, so the keys of an entity
+deleted from the DB altogether are audited (and reported as orphans) too.
+With `--repair`, the selected kinds are fixed in pipelined batches (stale/missing are rewritten
+from rows re-read just before writing, orphans deleted); every fix is broadcast so API workers
+drop their L1 copies.
+
+Legacy keys are `attr:by_*:{namespace}:{entity}:{name}`, so the SCAN for one entity also matches
+entities named `{entity}:...`; keys under such an entity are left to that entity's audit.
+
+Usage:
+  python -m api.app.jobs.audit_cache [--namespace NS] [--entity E] [--repair stale,orphaned,missing]
+                                     [--max-db-connections 4] [--inline]
+
+Runs on the DaskConfig cluster by default; `--inline` audits from this process instead.
+"""
+import argparse
+import asyncio
+import hashlib
+import json
+import logging
+import sys
+from api.app.dask_config import DaskConfig
+
+log = logging.getLogger("audit_cache")
+
+REPAIRABLE = ("stale", "orphaned", "missing")
+# Sample size per finding kind and entity in the report
+MAX_REPORTED = 20
+# Payloads / orphans per repair pipeline
+REPAIR_BATCH = 1000
+
+def attr_hash(ns: str, ent: str, phys: str | None, logi: str | None) -> str:
+    """Python twin of the generated `hash` column in migrations/001_init.sql."""
+    return hashlib.md5(f"{ns}|{ent}|{phys or ''}|{logi or ''}".encode()).hexdigest()
+
+def _glob_escape(s: str) -> str:
+    return "".join("\\" + c if c in "*?[]\\" else c for c in s)
+
+def shadowing(pairs: list[tuple[str, str]]) -> dict[tuple[str, str], list[tuple[str, str]]]:
+    """(namespace, entity) -> the other pairs whose legacy keys its SCAN prefix also matches."""
+    scopes = sorted((f"{ns}:{ent}:", (ns, ent)) for ns, ent in set(pairs))
+    out = {}
+    for i, (scope, pair) in enumerate(scopes):
+        # Sorted: every scope starting with this one follows it directly
+        j = i + 1
+        while j < len(scopes) and scopes[j][0].startswith(scope): j += 1
+        out[pair] = [p for _, p in scopes[i + 1:j]]
+    return out
+
+async def list_entities(namespace: str | None = None, entity: str | None = None) -> list[tuple[str, str]]:
+    import asyncpg
+    from api.app.repo.db import asyncpg_connect_kwargs
+    conn = await asyncpg.connect(**asyncpg_connect_kwargs())
+    try:
+        rows = await conn.fetch(
+            "SELECT DISTINCT namespace, entity FROM meta.attribute "
+            "WHERE ($1::text IS NULL OR namespace = $1) AND ($2::text IS NULL OR entity = $2) ORDER BY 1, 2",
+            namespace, entity)
+    finally:
+        await conn.close()
+    return [(r["namespace"], r["entity"]) for r in rows]
+
+def _decode(k) -> str:
+    return k.decode() if isinstance(k, bytes) else k
+
+async def cached_entities(redis, layout: str, namespace: str | None = None,
+                          known: list[tuple[str, str]] = ()) -> list[tuple[str, str]]:
+    """(namespace, entity) pairs Redis holds entries for besides `known` (e.g. entities deleted from the DB).
+
+    Compact hashes end in "{namespace}:{entity}": split after a known namespace, or else after the first ':'.
+    A per-name key can't be split ("{entity}:{name}" may contain ':' on either side), so keys outside every
+    known entity are read and the pair taken from the payload.
+    """
+    import orjson
+    from api.app.services.cache import entity_key_prefixes, namespace_key_prefixes
+    known = set(known)
+    namespaces = sorted({ns for ns, _ in known}, key=len, reverse=True)
+    prefixes = namespace_key_prefixes(namespace)
+    found = set()
+
+    def split(rest: str) -> tuple[str, str]:
+        if namespace is not None: return namespace, rest
+        ns = next((n for n in namespaces if rest.startswith(n + ":")), rest.partition(":")[0])
+        return ns, rest[len(ns) + 1:]
+
+    if layout != "legacy":
+        for prefix in prefixes["compact"]:
+            async for k in redis.scan_iter(match=_glob_escape(prefix) + "*", count=1000):
+                found.add(split(_decode(k)[len(prefix):]))
+
+    if layout != "compact":
+        owned = {p for pair in known | found for p in entity_key_prefixes(*pair).values()}
+
+        def is_owned(k: str) -> bool:
+            # A key's entity prefix ends at one of its ':'s
+            return any(k[:i + 1] in owned for i, c in enumerate(k) if c == ":")
+
+        async def resolve(keys):
+            for raw in await redis.mget(keys):
+                if not raw: continue
+                p = orjson.loads(raw)
+                pair = (p.get("namespace"), p.get("entity"))
+                if None in pair or pair in found: continue
+                found.add(pair)
+                owned.update(entity_key_prefixes(*pair).values())
+
+        pending = []
+        for prefix in prefixes["legacy"]:
+            async for k in redis.scan_iter(match=_glob_escape(prefix) + "*", count=1000):
+                k = _decode(k)
+                if is_owned(k): continue
+                pending.append(k)
+                if len(pending) >= REPAIR_BATCH:
+                    await resolve(pending)
+                    pending = []
+        if pending: await resolve(pending)
+    return sorted(found - known)
+
+def _current(cached: dict, payload: dict, digest: str) -> bool:
+    got = attr_hash(cached.get("namespace"), cached.get("entity"), cached.get("physical_name"), cached.get("logical_name"))
+    return got == digest and cached.get("version") == payload["version"]
+
+def _check(cached: dict, ids: list[int], expected: dict) -> tuple[bool, int]:
+    """(is current, id to rewrite it from) for an entry any of `ids` may own (a shared synonym has several)."""
+    i = cached.get("id")
+    if i not in ids: return False, ids[0]
+    return _current(cached, *expected[i]), i
+
+async def _audit_legacy(cache, ns, ent, expected: dict, shadows=()):
+    """Per-name keys (`attr:by_*`): MGET what the DB says should exist, SCAN for what shouldn't."""
+    import orjson
+    from api.app.services.cache import entity_key_prefixes, payload_keys
+    by_key: dict[str, list[int]] = {}
+    for payload, _ in expected.values():
+        for k in payload_keys(payload): by_key.setdefault(k, []).append(payload["id"])
+    keys = list(by_key)
+    raws = await cache.redis.mget(keys) if keys else []
+    stale, missing = [], []
+    for k, raw in zip(keys, raws):
+        if not raw:
+            missing.append((k, by_key[k][0]))
+            continue
+        ok, i = _check(orjson.loads(raw), by_key[k], expected)
+        if not ok: stale.append((k, i))
+
+    orphaned = []
+    for index, prefix in entity_key_prefixes(ns, ent).items():
+        # Keys of entities named "{ent}:..." match the pattern too; they are not ours to judge
+        foreign = tuple(entity_key_prefixes(*pair)[index] for pair in shadows)
+        async for k in cache.redis.scan_iter(match=_glob_escape(prefix) + "*", count=1000):
+            k = _decode(k)
+            if k not in by_key and not k.startswith(foreign): orphaned.append(k)
+
+    async def drop():
+        for i in range(0, len(orphaned), REPAIR_BATCH):
+            await cache.delete_keys(orphaned[i:i + REPAIR_BATCH])
+    return stale, missing, orphaned, drop
+
+async def _audit_compact(cache, ns, ent, expected: dict):
+    """Per-entity hashes: one HGETALL each for the records and the name -> id indexes."""
+    import orjson
+    from api.app.services.cache import entity_hash_keys, name_key
+    keys = entity_hash_keys(ns, ent)
+    pipe = cache.redis.pipeline(transaction=False)
+    for k in keys.values(): pipe.hgetall(k)
+    recs, *indexes = await pipe.execute()
+    recs = {int(i): orjson.loads(v) for i, v in recs.items()}
+
+    stale, missing, orphaned = [], [], []
+    for i, (payload, digest) in expected.items():
+        label = f"{keys['rec']}#{i}"
+        if i not in recs: missing.append((label, i))
+        elif not _current(recs[i], payload, digest): stale.append((label, i))
+    orphaned += [("rec", keys["rec"], str(i)) for i in recs if i not in expected]
+
+    # name -> every id that may own the entry (a synonym shared by several attributes has several)
+    want = {"phys": {}, "logi": {}, "syn": {}}
+    for payload, _ in expected.values():
+        want["phys"].setdefault(payload["physical_name"], []).append(payload["id"])
+        want["logi"].setdefault(payload["logical_name"], []).append(payload["id"])
+        for syn in payload["synonyms"]: want["syn"].setdefault(syn, []).append(payload["id"])
+    for index, have in zip(("phys", "logi", "syn"), indexes):
+        have = {f.decode(): int(v) for f, v in have.items()}
+        for name, ids in want[index].items():
+            label = f"{keys[index]}#{name}"
+            if name not in have: missing.append((label, ids[0]))
+            elif have[name] not in ids: stale.append((label, ids[0]))
+        orphaned += [(index, keys[index], n) for n in have if n not in want[index]]
+
+    async def drop():
+        for start in range(0, len(orphaned), REPAIR_BATCH):
+            part = orphaned[start:start + REPAIR_BATCH]
+            pipe = cache.redis.pipeline(transaction=False)
+            for _, key, field in part: pipe.hdel(key, field)
+            await pipe.execute()
+            # Workers may still hold the orphaned names in their L1
+            await cache.delete_keys([name_key(index, ns, ent, field) for index, _, field in part if index != "rec"])
+    return stale, missing, [f"{key}#{field}" for _, key, field in orphaned], drop
+
+async def read_expected(ns: str, ent: str, ids: list[int] | None = None) -> dict[int, tuple[dict, str]]:
+    """Active rows of one entity (or just `ids` of them) as id -> (cache payload, hash)."""
+    import asyncpg
+    from api.app.repo.bulk import payload_columns, payload_from_record
+    from api.app.repo.db import asyncpg_connect_kwargs
+    conn = await asyncpg.connect(**asyncpg_connect_kwargs())
+    try:
+        rows = await conn.fetch(
+            f"SELECT {payload_columns()}, hash FROM meta.attribute WHERE namespace = $1 AND entity = $2 AND is_active "
+            "AND ($3::bigint[] IS NULL OR id = ANY($3))", ns, ent, ids)
+    finally:
+        await conn.close()
+    expected = {}
+    for r in rows:
+        payload = payload_from_record({k: v for k, v in r.items() if k != "hash"})
+        expected[payload["id"]] = (payload, r["hash"] or attr_hash(ns, ent, r["physical_name"], r["logical_name"]))
+    return expected
+
+async def audit_entity(ns: str, ent: str, repair: tuple[str, ...] = (), shadows=()) -> dict:
+    """Audit one entity; `shadows` are the pairs whose legacy keys its SCAN also matches (see `shadowing`)."""
+    from api.app.services.cache import Cache
+
+    expected = await read_expected(ns, ent)
+    # A fresh client per task: each asyncio.run() on a worker has its own event loop
+    cache = Cache()
+    if not cache.redis:
+        return {"namespace": ns, "entity": ent, "error": "cache disabled (ENABLE_CACHE/REDIS_URL)"}
+    try:
+        # During a CACHE_LAYOUT=dual rollout both layouts are written, so both are audited
+        audits = []
+        if cache.layout != "compact": audits.append(await _audit_legacy(cache, ns, ent, expected, shadows))
+        if cache.layout != "legacy": audits.append(await _audit_compact(cache, ns, ent, expected))
+        stale = [x for a in audits for x in a[0]]
+        missing = [x for a in audits for x in a[1]]
+        orphaned = [x for a in audits for x in a[2]]
+
+        repaired = {}
+        fix = set()
+        if "stale" in repair:
+            fix |= {i for _, i in stale}
+            repaired["stale"] = len(stale)
+        if "missing" in repair:
+            fix |= {i for _, i in missing}
+            repaired["missing"] = len(missing)
+        # set_many rewrites every key/index entry of each payload. The rows are read again right
+        # before: one written since the audit read must not be put back to its audited state.
+        ids = sorted(fix)
+        for start in range(0, len(ids), REPAIR_BATCH):
+            fresh = await read_expected(ns, ent, ids[start:start + REPAIR_BATCH])
+            await cache.set_many([payload for payload, _ in fresh.values()])
+        if "orphaned" in repair and orphaned:
+            for a in audits: await a[3]()
+            repaired["orphaned"] = len(orphaned)
+    finally:
+        await cache.redis.aclose()
+
+    stale, missing = [k for k, _ in stale], [k for k, _ in missing]
+    return {
+        "namespace": ns, "entity": ent, "layout": cache.layout, "rows": len(expected),
+        "stale": len(stale), "missing": len(missing), "orphaned": len(orphaned), "repaired": repaired,
+        "sample": {"stale": stale[:MAX_REPORTED], "missing": missing[:MAX_REPORTED], "orphaned": orphaned[:MAX_REPORTED]},
+    }
+
+def audit_entity_task(ns: str, ent: str, shadows: list, repair: tuple[str, ...], max_connections: int) -> dict:
+    """Dask task wrapper: bounded DB usage across the cluster via a distributed Semaphore."""
+    from distributed import Semaphore
+    with Semaphore(max_leases=max_connections, name="attr-audit-db"):
+        return asyncio.run(audit_entity(ns, ent, repair, shadows))
+
+def summarize(results: list[dict]) -> dict:
+    totals = {"entities": len(results), "rows": 0, "stale": 0, "missing": 0, "orphaned": 0}
+    for r in results:
+        for k in ("rows", "stale", "missing", "orphaned"): totals[k] += r.get(k, 0)
+    drifted = [r for r in results if r.get("stale") or r.get("orphaned") or r.get("error")]
+    return {"totals": totals, "entities": drifted}
+
+async def _plan(namespace, entity) -> tuple[list[tuple[str, str]], dict]:
+    from api.app.services.cache import Cache
+    # Shadowing is over every entity, not just the selected ones
+    everything = await list_entities()
+    cache = Cache()
+    if cache.redis:
+        try:
+            everything += await cached_entities(cache.redis, cache.layout, namespace, everything)
+        finally:
+            await cache.redis.aclose()
+    pairs = [(ns, ent) for ns, ent in everything if namespace in (None, ns) and entity in (None, ent)]
+    return pairs, shadowing(everything)
+
+def run_audit(client, namespace=None, entity=None, repair=(), max_connections: int = 4) -> dict:
+    pairs, shadows = asyncio.run(_plan(namespace, entity))
+    if not pairs: return summarize([])
+    futures = client.map(audit_entity_task, [p[0] for p in pairs], [p[1] for p in pairs],
+                         [shadows[p] for p in pairs],
+                         repair=tuple(repair), max_connections=max_connections, pure=False)
+    return summarize(client.gather(futures))
+
+async def run_audit_inline(namespace=None, entity=None, repair=(), max_connections: int = 4) -> dict:
+    pairs, shadows = await _plan(namespace, entity)
+    sem = asyncio.Semaphore(max_connections)
+    async def one(ns, ent):
+        async with sem:
+            return await audit_entity(ns, ent, tuple(repair), shadows[(ns, ent)])
+    return summarize(list(await asyncio.gather(*(one(ns, ent) for ns, ent in pairs))))
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    ap.add_argument("--namespace")
+    ap.add_argument("--entity")
+    ap.add_argument("--repair", default="", help=f"comma-separated subset of {','.join(REPAIRABLE)}")
+    ap.add_argument("--max-db-connections", type=int, default=4)
+    ap.add_argument("--inline", action="store_true", help="run in this process instead of on the dask cluster")
+    args = ap.parse_args(argv)
+    repair = tuple(x for x in args.repair.split(",") if x)
+    if any(x not in REPAIRABLE for x in repair):
+        ap.error(f"--repair accepts {','.join(REPAIRABLE)}")
+    logging.basicConfig(level=logging.INFO)
+    if args.inline:
+        report = asyncio.run(run_audit_inline(args.namespace, args.entity, repair, args.max_db_connections))
+    else:
+        client = DaskConfig().client()
+        try:
+            report = run_audit(client, args.namespace, args.entity, repair, args.max_db_connections)
+        finally:
+            client.close()
+    print(json.dumps(report, indent=2, default=str))
+    t = report["totals"]
+    return 0 if not (t["stale"] or t["orphaned"]) or repair else 1
+
+if __name__ == "__main__":
+    sys.exit(main())
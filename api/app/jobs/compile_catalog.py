@@ -0,0 +1,26 @@
+"""Compile meta.attribute into a memory-mapped catalog generation (see api/app/services/catalog.py).
+
+Usage:
+  python -m api.app.jobs.compile_catalog [--dir CATALOG_DIR]
+
+Run it wherever the API workers can see CATALOG_DIR (same host or a shared volume); they map
+the new generation within CATALOG_POLL_SECONDS.
+"""
+import argparse
+import asyncio
+import json
+import logging
+import sys
+from api.app.config import settings
+from api.app.services.catalog import compile_catalog
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    ap.add_argument("--dir", default=settings.catalog_dir)
+    args = ap.parse_args(argv)
+    logging.basicConfig(level=logging.INFO)
+    print(json.dumps(asyncio.run(compile_catalog(args.dir)), indent=2))
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
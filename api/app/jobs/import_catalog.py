@@ -0,0 +1,183 @@
+"""Import a CSV/Parquet attribute catalog into meta.attribute with dask (CSV -> Postgres seed).
+
+Partitions are validated and normalized in parallel with the same rules as the API
+(`AttributeIn` + `_normalize_row`), de-duplicated on both unique keys across the
+whole input, then loaded concurrently through `repo.bulk.copy_upsert`. A
+distributed Semaphore caps how many partitions hold a DB connection at once.
+
+Usage:
+  python -m api.app.jobs.import_catalog catalog.csv [--format csv|parquet] [--on-conflict skip|update|fail]
+                                        [--blocksize 64MB] [--max-db-connections 4]
+
+The cluster comes from `DaskConfig` (DASK_MODE=local gives a LocalCluster for testing).
+List columns (`synonyms`, `tags`) may be JSON arrays or `|`-separated; `metadata` is a JSON object.
+With `--on-conflict fail` each partition is its own transaction, so earlier partitions stay committed.
+"""
+import argparse
+import asyncio
+import json
+import logging
+import sys
+import pandas as pd
+from pydantic import ValidationError
+from api.app.dask_config import DaskConfig
+from api.app.models.dto import AttributeIn
+from api.app.repo.attribute_repo import _normalize_row
+from api.app.repo.bulk import CONFLICT_POLICIES
+
+log = logging.getLogger("import_catalog")
+
+PHYS_KEY = ["namespace", "entity", "physical_name"]
+LOGI_KEY = ["namespace", "entity", "logical_name"]
+COLUMNS = ["namespace", "entity", "category", "logical_name", "physical_name", "data_type", "description",
+           "source_system", "created_by", "updated_by", "synonyms", "tags", "is_active", "metadata"]
+# Global input order (partition, row): "first occurrence wins" stays deterministic after shuffles
+SEQ = "_seq"
+ERROR = "_error"
+
+# Problem rows returned per partition; enough to diagnose, small enough to gather
+MAX_REPORTED = 100
+
+def read_catalog(path: str, fmt: str | None = None, blocksize: str = "64MB"):
+    import dask.dataframe as dd
+    fmt = fmt or ("parquet" if path.rstrip("/").endswith(".parquet") else "csv")
+    if fmt == "parquet":
+        return dd.read_parquet(path)
+    # Keep everything as text; typing is AttributeIn's job
+    return dd.read_csv(path, dtype=str, blocksize=blocksize, keep_default_na=False)
+
+def _list_field(v):
+    if isinstance(v, (list, tuple)): return list(v)
+    if hasattr(v, "tolist"): return list(v.tolist())
+    if v is None or (isinstance(v, float) and pd.isna(v)) or v == "": return []
+    v = str(v).strip()
+    return json.loads(v) if v.startswith("[") else [s.strip() for s in v.split("|") if s.strip()]
+
+def _clean(row: dict) -> dict:
+    out = {}
+    for k, v in row.items():
+        if k not in COLUMNS: continue
+        if v is None or (isinstance(v, float) and pd.isna(v)) or v == "": continue
+        if k in ("synonyms", "tags"): v = _list_field(v)
+        elif k == "metadata" and isinstance(v, str): v = json.loads(v)
+        elif k == "is_active" and isinstance(v, str): v = v.strip().lower() in ("true", "1", "yes", "y", "t")
+        out[k] = v
+    return out
+
+def validate_partition(df: pd.DataFrame, partition_info=None) -> pd.DataFrame:
+    """Validate/normalize one partition. Invalid rows are kept with `_error` set."""
+    part = (partition_info or {}).get("number", 0)
+    records = []
+    for i, row in enumerate(df.to_dict("records")):
+        rec = {c: None for c in COLUMNS}
+        try:
+            model = AttributeIn(**_clean(row))
+            rec.update(_normalize_row(model.model_dump()))
+            rec["metadata"] = json.dumps(rec.pop("meta", None) or {})
+            rec[ERROR] = None
+        except (ValidationError, ValueError) as e:
+            rec.update({k: row.get(k) for k in PHYS_KEY + ["logical_name"]})
+            rec[ERROR] = str(e).replace("\n", " ")
+        rec[SEQ] = (part << 32) | i
+        records.append(rec)
+    return pd.DataFrame.from_records(records, columns=_meta().columns)
+
+def _meta() -> pd.DataFrame:
+    cols = {c: pd.Series(dtype=object) for c in COLUMNS + [ERROR]}
+    cols["is_active"] = pd.Series(dtype=object)
+    cols[SEQ] = pd.Series(dtype="int64")
+    return pd.DataFrame(cols)
+
+def _first_per_key(df: pd.DataFrame, key: list[str]) -> pd.DataFrame:
+    return df.sort_values(SEQ).drop_duplicates(subset=key, keep="first")
+
+def dedupe(valid, key: list[str]):
+    """Keep the first occurrence (input order) of every `key` across all partitions."""
+    return valid.shuffle(on=key).map_partitions(_first_per_key, key, meta=valid._meta)
+
+def load_partition(df: pd.DataFrame, on_conflict: str, max_connections: int) -> dict:
+    """Runs on a dask worker: COPY-upsert one partition and refresh the cache for what changed."""
+    from distributed import Semaphore
+    rows = []
+    for r in df.drop(columns=[SEQ, ERROR]).to_dict("records"):
+        # list columns may come back as numpy arrays after a shuffle
+        r["synonyms"], r["tags"] = _list_field(r.get("synonyms")), _list_field(r.get("tags"))
+        r["metadata"] = json.loads(r["metadata"]) if r.get("metadata") else {}
+        rows.append(r)
+    if not rows: return {"counts": {}, "problems": []}
+    with Semaphore(max_leases=max_connections, name="attr-import-db"):
+        result = asyncio.run(_load(rows, on_conflict))
+    problems = [o | {"physical_name": rows[o["row"]]["physical_name"]}
+                for o in result.outcomes if o["status"] not in ("inserted", "updated")]
+    return {"counts": result.counts, "problems": problems[:MAX_REPORTED]}
+
+async def _load(rows: list[dict], on_conflict: str):
+    import asyncpg
+    from api.app.repo.bulk import copy_upsert
+    from api.app.repo.db import asyncpg_connect_kwargs
+    from api.app.services.cache import Cache
+    conn = await asyncpg.connect(**asyncpg_connect_kwargs())
+    try:
+        async with conn.transaction():
+            result = await copy_upsert(conn, rows, on_conflict)
+    finally:
+        await conn.close()
+    # A fresh client per partition: each asyncio.run() gets its own event loop.
+    # set_many broadcasts invalidations so API workers drop stale L1 entries.
+    cache = Cache()
+    if cache.redis:
+        await cache.invalidate_many(result.stale)
+        await cache.set_many([p for p in result.payloads if p["is_active"]])
+        await cache.redis.aclose()
+    return result
+
+def run_import(client, path: str, fmt: str | None = None, on_conflict: str = "skip",
+               blocksize: str = "64MB", max_connections: int = 4) -> dict:
+    import dask
+    if on_conflict not in CONFLICT_POLICIES:
+        raise ValueError(f"on_conflict must be one of {CONFLICT_POLICIES}")
+    ddf = read_catalog(path, fmt, blocksize).map_partitions(validate_partition, meta=_meta())
+    ddf = ddf.persist()
+    invalid = ddf[ddf[ERROR].notnull()]
+    valid = ddf[ddf[ERROR].isnull()]
+    deduped = dedupe(dedupe(valid, PHYS_KEY), LOGI_KEY).persist()
+
+    n_total, n_invalid, n_valid, n_loadable, invalid_sample = dask.compute(
+        ddf.shape[0], invalid.shape[0], valid.shape[0], deduped.shape[0],
+        invalid[[*PHYS_KEY, "logical_name", ERROR]].head(MAX_REPORTED, npartitions=-1, compute=False))
+
+    parts = [dask.delayed(load_partition)(p, on_conflict, max_connections) for p in deduped.to_delayed()]
+    results = client.gather(client.compute(parts))
+    counts: dict[str, int] = {}
+    problems: list[dict] = []
+    for r in results:
+        for k, v in r["counts"].items(): counts[k] = counts.get(k, 0) + v
+        problems.extend(r["problems"])
+    return {
+        "rows_read": int(n_total),
+        "invalid": int(n_invalid),
+        "duplicates_in_input": int(n_valid - n_loadable),
+        "loaded": counts,
+        "invalid_sample": invalid_sample.to_dict("records"),
+        "problem_sample": problems[:MAX_REPORTED],
+    }
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    ap.add_argument("path")
+    ap.add_argument("--format", choices=["csv", "parquet"])
+    ap.add_argument("--on-conflict", default="skip", choices=list(CONFLICT_POLICIES))
+    ap.add_argument("--blocksize", default="64MB")
+    ap.add_argument("--max-db-connections", type=int, default=4)
+    args = ap.parse_args(argv)
+    logging.basicConfig(level=logging.INFO)
+    client = DaskConfig().client()
+    try:
+        summary = run_import(client, args.path, args.format, args.on_conflict, args.blocksize, args.max_db_connections)
+    finally:
+        client.close()
+    print(json.dumps(summary, indent=2, default=str))
+    return 0 if not summary["invalid"] else 1
+
+if __name__ == "__main__":
+    sys.exit(main())
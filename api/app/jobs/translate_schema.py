@@ -0,0 +1,175 @@
+"""Translate a warehouse column inventory from physical to logical names with dask.
+
+The inventory (CSV/Parquet) has one row per column: `entity` and `physical_name`, optionally
+`namespace` (missing or blank: `--namespace`) and any other columns (schema, table, ...), which are
+passed through. The catalog of active attributes for the inventory's namespaces is read once,
+indexed by (namespace, entity, physical_name) and broadcast to every worker; each partition is
+then resolved against it in one vectorized lookup, no per-name round trips.
+
+Writes to `--out`:
+  translated/  every inventory row plus logical_name, attribute_id, version, data_type, resolved
+  unresolved/  one row per distinct unresolved (namespace, entity, physical_name), with its count
+  report.json  totals and the entities with the most unresolved names
+
+Usage:
+  python -m api.app.jobs.translate_schema inventory.parquet --out /data/translated
+                                          [--format csv|parquet] [--out-format parquet|csv]
+                                          [--catalog catalog.parquet] [--ignore-case] [--blocksize 64MB]
+
+The catalog comes from Postgres unless `--catalog` points at an export (CSV/Parquet with at least
+namespace, entity, physical_name, logical_name). The cluster comes from `DaskConfig`.
+"""
+import argparse
+import asyncio
+import json
+import logging
+import os
+import sys
+import time
+import pandas as pd
+from api.app.config import settings
+from api.app.dask_config import DaskConfig
+
+log = logging.getLogger("translate_schema")
+
+KEY = ["namespace", "entity", "physical_name"]
+# Nullable dtypes: unresolved rows are <NA>, and every partition writes the same schema
+RESULT_COLUMNS = {"logical_name": "string", "attribute_id": "Int64", "version": "Int64", "data_type": "string"}
+_SEP = "\x1f"
+# Unresolved entities listed in report.json
+MAX_REPORTED = 100
+
+def read_table(path: str, fmt: str | None = None, blocksize: str = "64MB"):
+    import dask.dataframe as dd
+    fmt = fmt or ("parquet" if path.rstrip("/").endswith(".parquet") else "csv")
+    if fmt == "parquet": return dd.read_parquet(path)
+    return dd.read_csv(path, dtype=str, blocksize=blocksize, keep_default_na=False)
+
+def fill_namespace(df: pd.DataFrame, default: str) -> pd.DataFrame:
+    """Blank or missing namespace cells -> `default`."""
+    ns = df["namespace"]
+    blank = ns.isna() | (ns.astype(str).str.strip() == "")
+    return df.assign(namespace=ns.astype(object).where(~blank, default))
+
+def _keys(df: pd.DataFrame, ignore_case: bool) -> pd.Series:
+    keys = df["namespace"].astype(str) + _SEP + df["entity"].astype(str) + _SEP + df["physical_name"].astype(str)
+    return keys.str.lower() if ignore_case else keys
+
+def index_catalog(rows: pd.DataFrame, ignore_case: bool = False) -> pd.DataFrame:
+    """Catalog rows -> RESULT_COLUMNS indexed by the joined lookup key (unique; first row wins)."""
+    rows = rows.copy()
+    if "id" in rows and "attribute_id" not in rows: rows = rows.rename(columns={"id": "attribute_id"})
+    if "is_active" in rows: rows = rows[rows["is_active"].astype(str).str.lower().isin(("true", "1", "t"))]
+    for c, dtype in RESULT_COLUMNS.items():
+        if c not in rows: rows[c] = None
+        rows[c] = (pd.to_numeric(rows[c]) if dtype == "Int64" else rows[c]).astype(dtype)
+    out = rows[list(RESULT_COLUMNS)].set_index(_keys(rows, ignore_case).rename("key"))
+    return out[~out.index.duplicated(keep="first")]
+
+async def fetch_catalog(namespaces: list[str]) -> pd.DataFrame:
+    import asyncpg
+    from api.app.repo.db import asyncpg_connect_kwargs
+    conn = await asyncpg.connect(**asyncpg_connect_kwargs())
+    try:
+        rows = await conn.fetch(
+            "SELECT namespace, entity, physical_name, logical_name, id, version, data_type "
+            "FROM meta.attribute WHERE is_active AND namespace = ANY($1::text[])", namespaces)
+    finally:
+        await conn.close()
+    return pd.DataFrame.from_records([dict(r) for r in rows],
+                                     columns=["namespace", "entity", "physical_name", "logical_name", "id", "version", "data_type"])
+
+def read_catalog(path: str) -> pd.DataFrame:
+    if path.rstrip("/").endswith(".parquet"): return pd.read_parquet(path)
+    return pd.read_csv(path, dtype=str, keep_default_na=False)
+
+def translate_partition(df: pd.DataFrame, catalog: pd.DataFrame, ignore_case: bool) -> pd.DataFrame:
+    """Runs on a worker: resolve one inventory partition against the broadcast catalog.
+
+    The catalog's index keeps its hash table between partitions on the same worker.
+    """
+    pos = catalog.index.get_indexer(_keys(df, ignore_case))
+    out = df.reset_index(drop=True)
+    for c in RESULT_COLUMNS:
+        # -1 (not in the catalog) becomes <NA>
+        out[c] = pd.Series(catalog[c].array.take(pos, allow_fill=True), index=out.index)
+    out["resolved"] = pos >= 0
+    return out
+
+def _meta(inventory) -> pd.DataFrame:
+    meta = inventory._meta.copy()
+    for c, dtype in RESULT_COLUMNS.items(): meta[c] = pd.Series(dtype=dtype)
+    meta["resolved"] = pd.Series(dtype=bool)
+    return meta
+
+def _write(ddf, path: str, fmt: str):
+    if fmt == "csv": return ddf.to_csv(os.path.join(path, "part-*.csv"), index=False, compute=False)
+    return ddf.to_parquet(path, write_index=False, compute=False)
+
+def run_translate(client, path: str, out: str, fmt: str | None = None, out_format: str = "parquet",
+                  catalog_path: str | None = None, namespace: str | None = None, ignore_case: bool = False,
+                  blocksize: str = "64MB") -> dict:
+    import dask
+    started = time.monotonic()
+    inventory = read_table(path, fmt, blocksize)
+    missing = [c for c in ("entity", "physical_name") if c not in inventory.columns]
+    if missing: raise ValueError(f"inventory lacks column(s) {missing}")
+    namespace = namespace or settings.default_namespace
+    if "namespace" not in inventory.columns: inventory = inventory.assign(namespace=namespace)
+    else: inventory = inventory.map_partitions(fill_namespace, namespace, meta=inventory._meta)
+
+    if catalog_path: rows = read_catalog(catalog_path)
+    else: rows = asyncio.run(fetch_catalog(sorted(inventory["namespace"].astype(str).unique().compute())))
+    catalog = index_catalog(rows, ignore_case)
+    log.info("Catalog: %s entries", len(catalog))
+    # One copy per worker instead of one per task
+    [catalog_future] = client.scatter([catalog], broadcast=True)
+
+    translated = inventory.map_partitions(translate_partition, catalog_future, ignore_case, meta=_meta(inventory)).persist()
+    unresolved = (translated[~translated["resolved"]][KEY].assign(occurrences=1)
+                  .groupby(KEY).occurrences.sum().reset_index())
+    by_entity = unresolved.groupby(["namespace", "entity"]).agg({"physical_name": "count", "occurrences": "sum"})
+
+    os.makedirs(out, exist_ok=True)
+    n_rows, n_resolved, n_unresolved_names, top, *_ = dask.compute(
+        translated.shape[0], translated["resolved"].sum(), unresolved.shape[0],
+        by_entity.nlargest(MAX_REPORTED, "occurrences"),
+        _write(translated, os.path.join(out, "translated"), out_format),
+        _write(unresolved, os.path.join(out, "unresolved"), out_format))
+    report = {
+        "rows": int(n_rows),
+        "resolved": int(n_resolved),
+        "unresolved": int(n_rows - n_resolved),
+        "unresolved_distinct": int(n_unresolved_names),
+        "catalog_entries": len(catalog),
+        "elapsed_sec": round(time.monotonic() - started, 2),
+        "top_unresolved_entities": [{"namespace": ns, "entity": ent, "names": int(r.physical_name),
+                                     "occurrences": int(r.occurrences)} for (ns, ent), r in top.iterrows()],
+        "out": out,
+    }
+    with open(os.path.join(out, "report.json"), "w") as f: json.dump(report, f, indent=2)
+    return report
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    ap.add_argument("path")
+    ap.add_argument("--out", required=True)
+    ap.add_argument("--format", choices=["csv", "parquet"])
+    ap.add_argument("--out-format", default="parquet", choices=["csv", "parquet"])
+    ap.add_argument("--catalog", help="catalog export (CSV/Parquet) instead of Postgres")
+    ap.add_argument("--namespace", help="namespace for rows without one (no namespace column, or a blank cell)")
+    ap.add_argument("--ignore-case", action="store_true", help="match entity/physical names case-insensitively")
+    ap.add_argument("--blocksize", default="64MB")
+    args = ap.parse_args(argv)
+    logging.basicConfig(level=logging.INFO)
+    client = DaskConfig().client()
+    try:
+        report = run_translate(client, args.path, args.out, args.format, args.out_format, args.catalog,
+                               args.namespace, args.ignore_case, args.blocksize)
+    finally:
+        client.close()
+    print(json.dumps(report, indent=2, default=str))
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
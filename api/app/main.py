@@ -1,9 +1,36 @@
-from fastapi import FastAPI, Request
+from contextlib import asynccontextmanager
+import time
+import structlog
+from fastapi import Depends, FastAPI, Request, Response
 from fastapi.responses import ORJSONResponse
-from api.app.routers import convert, attributes, search, cache
+from api.app.routers import convert, attributes, search, cache, admin
+from api.app.services.cache import cache as attr_cache
+from api.app.services.snapshot import snapshot
+from api.app.services.catalog import catalog
+from api.app.services.warmup import warmup
+from api.app.services.admission import admission
+from api.app.services import metrics, timing
 from api.app.config import settings
 
-app = FastAPI(title="semantic-service", default_response_class=ORJSONResponse)
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    metrics.reap_dead_workers()
+    # Per-worker subscriber that keeps the in-process L1 coherent across workers/pods
+    await attr_cache.start_listener()
+    # No-op unless SNAPSHOT_MODE=true; loads the catalog before the worker accepts traffic
+    await snapshot.start()
+    # No-op unless CATALOG_MODE=true; maps the compiled catalog (compiling it if none exists yet)
+    await catalog.start()
+    # Runs in the background; /readyz turns ready when it is done or WARMUP_DEADLINE_SEC passed
+    await warmup.start()
+    yield
+    await warmup.stop()
+    await catalog.stop()
+    await snapshot.stop()
+    await attr_cache.stop_listener()
+
+app = FastAPI(title="semantic-service", default_response_class=ORJSONResponse, lifespan=lifespan)
+timing_log = structlog.get_logger("api.timing")
 
 @app.middleware("http")
 async def add_version_header(request: Request, call_next):
@@ -11,10 +38,51 @@ async def add_version_header(request: Request, call_next):
     resp.headers["X-Semantic-Version"] = settings.semantic_version
     return resp
 
-app.include_router(convert.router)
-app.include_router(search.router)
-app.include_router(attributes.router)
+@app.middleware("http")
+async def observe_latency(request: Request, call_next):
+    start = time.perf_counter()
+    stages = timing.begin()
+    status = 500
+    try:
+        resp = await call_next(request)
+        status = resp.status_code
+        # Streaming bodies are produced after this point; their header only covers the time to first byte
+        if settings.server_timing: resp.headers["Server-Timing"] = timing.server_timing(stages, time.perf_counter() - start)
+        return resp
+    finally:
+        elapsed = time.perf_counter() - start
+        # Label by route template (not raw path) to keep cardinality bounded
+        route = getattr(request.scope.get("route"), "path", "unmatched")
+        metrics.HTTP_LATENCY.labels(request.method, route, str(status)).observe(elapsed)
+        if 0 <= settings.timing_log_min_ms <= elapsed * 1000:
+            timing_log.info("request_timing", method=request.method, route=route, status=status,
+                            total_ms=round(elapsed * 1000, 2),
+                            **{f"{k}_ms": round(v[0] * 1000, 2) for k, v in stages.items()},
+                            **{f"{k}_calls": v[1] for k, v in stages.items()})
+
+# Per-route concurrency limits (ADMISSION_ROUTE_*); the admin/cache routes stay reachable under load
+limited = [Depends(admission.route)]
+app.include_router(convert.router, dependencies=limited)
+app.include_router(search.router, dependencies=limited)
+app.include_router(attributes.router, dependencies=limited)
 app.include_router(cache.router)
+app.include_router(admin.router)
 
 @app.get("/healthz")
 def healthz(): return {"ok": True}
+
+@app.get("/readyz")
+def readyz():
+    """Readiness (not liveness): 503 while this worker is still warming up."""
+    status = warmup.status()
+    return status if status["ready"] else ORJSONResponse(status, status_code=503)
+
+@app.get("/admission")
+def admission_state():
+    """This worker's limiter state (limits, in use, waiting, rejections) and whether it is degraded."""
+    return admission.status()
+
+@app.get("/metrics", include_in_schema=False)
+def prometheus_metrics():
+    body, content_type = metrics.render()
+    return Response(body, media_type=content_type)
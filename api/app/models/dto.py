@@ -1,5 +1,5 @@
 from pydantic import BaseModel, Field
-from typing import List, Optional
+from typing import List, Literal, Optional
 from enum import Enum as PyEnum
 
 class AttrCategory(PyEnum):
@@ -19,6 +19,15 @@ class ConvertLogiReq(BaseModel):
     entity: str
     logical_names: List[str]
 
+class ConvertGroup(BaseModel):
+    namespace: str = Field(default="default")
+    entity: str
+    direction: Literal["physical_to_logical", "logical_to_physical"]
+    names: List[str]
+
+class ConvertBatchReq(BaseModel):
+    groups: List[ConvertGroup]
+
 class AttributeIn(BaseModel):
     namespace: str = "default"
     entity: str
@@ -42,3 +51,5 @@ class AttributeOut(AttributeIn):
 class SearchResp(BaseModel):
     items: List[AttributeOut]
     total: int | None = None
+    # Keyset cursor for the next page (mode=fts); None on the last page
+    next_cursor: str | None = None
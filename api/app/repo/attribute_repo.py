@@ -1,8 +1,21 @@
 from sqlalchemy.ext.asyncio import AsyncSession
-from sqlalchemy import select, update, delete, or_, tuple_
+from sqlalchemy import select, update, delete, or_, and_, tuple_, any_, literal, literal_column, func, cast, Float, Text
+from sqlalchemy.dialects.postgresql import ARRAY
 import sqlalchemy
 from api.app.repo.db import Attribute
+from api.app.models.dto import AttributeOut
+from api.app.services.timing import stage
 from typing import Sequence
+import base64
+import json
+import asyncpg
+
+# Must stay textually identical to the ix_attr_search_tsv expression in migrations/001_init.sql,
+# otherwise the planner cannot use the GIN index (the config name must be a literal, not a bind param).
+_SEARCH_TSV = literal_column(
+    "to_tsvector('simple', coalesce(namespace,'') || ' ' || coalesce(entity,'') || ' ' || "
+    "coalesce(logical_name,'') || ' ' || coalesce(physical_name,'') || ' ' || coalesce(description,''))"
+)
 
 class DuplicateError(Exception):
     """Raised when one or more rows would violate unique constraints."""
@@ -23,8 +36,49 @@ def _normalize_row(r: dict) -> dict:
         if hasattr(cat, "value"):
             cat = cat.value
         r2["category"] = str(cat).strip()
+    # The ORM attribute for the `metadata` column is `meta` (`metadata` is reserved on declarative classes)
+    if "metadata" in r2: r2["meta"] = r2.pop("metadata")
     return r2
 
+def encode_cursor(rank: float, id_: int, total: int | None) -> str:
+    """Opaque keyset cursor: the (rank, id) of the last row served plus the first page's total."""
+    return base64.urlsafe_b64encode(json.dumps([rank, id_, total]).encode()).decode()
+
+def decode_cursor(cursor: str) -> tuple[float, int, int | None]:
+    try:
+        rank, id_, total = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+        return float(rank), int(id_), (None if total is None else int(total))
+    except Exception as e:
+        raise ValueError(f"Invalid cursor: {cursor!r}") from e
+
+def to_payload(row: Attribute) -> dict:
+    """JSON-serializable dict for an ORM row, in the same shape the create route caches."""
+    data = dict(row.__dict__)
+    # the ORM maps the `metadata` column to `meta` (the name is reserved on declarative classes)
+    if "meta" in data: data["metadata"] = data.pop("meta") or {}
+    for f in ("synonyms", "tags"): data[f] = data.get(f) or []
+    return AttributeOut(**data).model_dump(mode="json")
+
+# Columns of the cache/response payload, in AttributeOut field order (no hash/updated_at)
+_PAYLOAD_COLUMNS = (
+    Attribute.namespace, Attribute.entity, Attribute.category, Attribute.logical_name, Attribute.physical_name,
+    Attribute.data_type, Attribute.description, Attribute.source_system, Attribute.created_by, Attribute.updated_by,
+    Attribute.synonyms, Attribute.tags, Attribute.is_active, Attribute.meta, Attribute.id, Attribute.version,
+)
+PAYLOAD_FIELDS = tuple("metadata" if c.key == "meta" else c.key for c in _PAYLOAD_COLUMNS)
+
+def row_to_payload(row) -> dict:
+    """Payload dict from a Core row of `_PAYLOAD_COLUMNS`: no ORM instance, identity map or pydantic pass.
+
+    The driver already returns plain types (enum as str, JSONB decoded, TEXT[] as list); NULL
+    synonyms/tags/metadata become []/[]/{} as in `to_payload`.
+    """
+    out = dict(zip(PAYLOAD_FIELDS, row))
+    out["synonyms"] = out["synonyms"] or []
+    out["tags"] = out["tags"] or []
+    out["metadata"] = out["metadata"] or {}
+    return out
+
 class AttributeRepo:
     def __init__(self, session: AsyncSession):
         self.session = session
@@ -47,6 +101,39 @@ class AttributeRepo:
         ).limit(1)
         return (await self.session.execute(q)).scalars().first()
 
+    async def lookup_physical_many(self, ns: str, entity: str, physicals: list[str]) -> list[dict]:
+        """Active rows of one entity with any of `physicals`, in one round trip, as payload dicts
+        straight from Core rows (see `row_to_payload`)."""
+        if not physicals: return []
+        q = select(*_PAYLOAD_COLUMNS).where(
+            Attribute.namespace == ns,
+            Attribute.entity == entity,
+            # A single array parameter keeps the statement text stable across batch sizes
+            Attribute.physical_name == any_(literal(physicals, ARRAY(Text))),
+            Attribute.is_active == True
+        )
+        rows = (await self.session.execute(q)).all()
+        with stage("orm"):
+            return [row_to_payload(r) for r in rows]
+
+    async def lookup_logical_many(self, ns: str, entity: str, logicals: list[str]) -> list[dict]:
+        """Active rows of one entity whose logical name or any synonym is in `logicals`, as payload dicts.
+
+        Synonyms match with `synonyms && :names` (served by ix_attr_synonyms_gin). Rows come back
+        ordered by id so callers resolve a synonym shared by several rows deterministically.
+        """
+        if not logicals: return []
+        names = literal(logicals, ARRAY(Text))
+        q = select(*_PAYLOAD_COLUMNS).where(
+            Attribute.namespace == ns,
+            Attribute.entity == entity,
+            or_(Attribute.logical_name == any_(names), Attribute.synonyms.overlap(names)),
+            Attribute.is_active == True
+        ).order_by(Attribute.id)
+        rows = (await self.session.execute(q)).all()
+        with stage("orm"):
+            return [row_to_payload(r) for r in rows]
+
     async def bulk_insert(self, rows: list[dict]) -> Sequence[Attribute]:
         # Normalize rows so category is a plain string (DB enum expects that form)
         normalized = [_normalize_row(r) for r in rows]
@@ -78,8 +165,23 @@ class AttributeRepo:
         await self.session.flush()
         return objs
 
+    async def bulk_upsert(self, rows: list[dict], on_conflict: str = "skip"):
+        """High-throughput ingest (COPY into a staging table + INSERT ... ON CONFLICT).
+
+        Runs on the session's own connection/transaction; see `repo.bulk.copy_upsert`
+        for the conflict policies and the per-row outcome report.
+        """
+        from api.app.repo.bulk import copy_upsert
+        normalized = [_normalize_row(r) for r in rows]
+        conn = await self.session.connection()
+        try:
+            raw = await conn.get_raw_connection()
+            return await copy_upsert(raw.driver_connection, normalized, on_conflict)
+        except asyncpg.exceptions.UndefinedTableError as e:
+            raise MigrationError(str(e))
+
     async def update(self, id_: int, payload: dict) -> int:
-        res = await self.session.execute(update(Attribute).where(Attribute.id == id_).values(**payload))
+        res = await self.session.execute(update(Attribute).where(Attribute.id == id_).values(**_normalize_row(payload)))
         return res.rowcount or 0
 
     async def delete(self, id_: int) -> int:
@@ -87,7 +189,12 @@ class AttributeRepo:
         return res.rowcount or 0
 
     async def search(self, ns: str | None, entity: str | None, q: str | None, by: str, limit: int, offset: int):
-        stmt = select(Attribute).where(Attribute.is_active == True)
+        """Substring (ILIKE) search with LIMIT/OFFSET paging. Returns (rows, total).
+
+        The total comes from a window count in the same query; it is None when the
+        offset is past the last match.
+        """
+        stmt = select(Attribute, func.count().over().label("total")).where(Attribute.is_active == True)
         if ns: stmt = stmt.where(Attribute.namespace == ns)
         if entity: stmt = stmt.where(Attribute.entity == entity)
         if q:
@@ -98,9 +205,38 @@ class AttributeRepo:
             else:
                 stmt = stmt.where(or_(Attribute.logical_name.ilike(f"%{q}%"),
                                       Attribute.physical_name.ilike(f"%{q}%")))
-        stmt = stmt.limit(limit).offset(offset)
-        res = await self.session.execute(stmt)
-        return res.scalars().all()
+        stmt = stmt.order_by(Attribute.id).limit(limit).offset(offset)
+        res = (await self.session.execute(stmt)).all()
+        total = res[0].total if res else (0 if offset == 0 else None)
+        return [r[0] for r in res], total
+
+    async def search_fts(self, ns: str | None, entity: str | None, q: str, limit: int, cursor: str | None = None):
+        """Ranked full-text search over ix_attr_search_tsv with keyset paging.
+
+        Returns (rows, total, next_cursor). Rows are ordered by ts_rank desc, id asc;
+        `cursor` continues after the last row of the previous page, so deep pages cost
+        the same as the first. The exact total is computed once (window count on the
+        first page) and carried forward in the cursor.
+        """
+        tsq = func.websearch_to_tsquery(literal_column("'simple'"), q)
+        rank = cast(func.ts_rank(_SEARCH_TSV, tsq), Float)
+        first_page = cursor is None
+        cols = [Attribute, rank.label("rank")]
+        if first_page: cols.append(func.count().over().label("total"))
+        stmt = select(*cols).where(Attribute.is_active == True, _SEARCH_TSV.bool_op("@@")(tsq))
+        if ns: stmt = stmt.where(Attribute.namespace == ns)
+        if entity: stmt = stmt.where(Attribute.entity == entity)
+        total = None
+        if not first_page:
+            last_rank, last_id, total = decode_cursor(cursor)
+            stmt = stmt.where(or_(rank < last_rank, and_(rank == last_rank, Attribute.id > last_id)))
+        # fetch one extra row to know whether another page exists
+        stmt = stmt.order_by(rank.desc(), Attribute.id).limit(limit + 1)
+        res = (await self.session.execute(stmt)).all()
+        if first_page: total = res[0].total if res else 0
+        page, more = res[:limit], len(res) > limit
+        next_cursor = encode_cursor(page[-1].rank, page[-1][0].id, total) if more else None
+        return [r[0] for r in page], total, next_cursor
 
     async def list_active(self, ns: str | None = None, entity: str | None = None):
         """Return all active attributes, optionally filtered by namespace and/or entity.
@@ -113,3 +249,18 @@ class AttributeRepo:
             stmt = stmt.where(Attribute.entity == entity)
         res = await self.session.execute(stmt)
         return res.scalars().all()
+
+    async def stream_active(self, ns: str | None = None, entity: str | None = None, chunk_size: int = 2000):
+        """Yield active attributes as payload dicts, `chunk_size` rows at a time.
+
+        Rows come through a server-side cursor as plain Core rows (nothing enters the
+        identity map), so memory stays bounded regardless of catalog size.
+        """
+        stmt = select(*_PAYLOAD_COLUMNS).where(Attribute.is_active == True).order_by(Attribute.id)
+        if ns:
+            stmt = stmt.where(Attribute.namespace == ns)
+        if entity:
+            stmt = stmt.where(Attribute.entity == entity)
+        result = await self.session.stream(stmt.execution_options(yield_per=chunk_size))
+        async for part in result.partitions():
+            yield [row_to_payload(r) for r in part]
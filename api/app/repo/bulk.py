@@ -0,0 +1,174 @@
+"""COPY-based bulk ingest for meta.attribute.
+
+Rows are COPYed into a per-transaction temp staging table, classified against both
+unique indexes (namespace, entity, physical_name) / (namespace, entity, logical_name)
+in one query, and written with a single INSERT ... SELECT ... ON CONFLICT.
+Works on a raw asyncpg connection so offline jobs can use it without the app's engine.
+"""
+from dataclasses import dataclass, field
+import json
+import asyncpg
+
+CONFLICT_POLICIES = ("skip", "update", "fail")
+
+_STAGE = "_attr_stage"
+_STAGE_COLUMNS = ("row_no", "namespace", "entity", "category", "logical_name", "physical_name", "data_type",
+                  "description", "source_system", "created_by", "updated_by", "synonyms", "tags", "is_active",
+                  "metadata")
+
+_CREATE_STAGE = f"""
+CREATE TEMP TABLE IF NOT EXISTS {_STAGE} (
+  row_no INTEGER NOT NULL, namespace TEXT, entity TEXT, category TEXT, logical_name TEXT, physical_name TEXT,
+  data_type TEXT, description TEXT, source_system TEXT, created_by TEXT, updated_by TEXT, synonyms TEXT[],
+  tags TEXT, is_active BOOLEAN, metadata TEXT
+) ON COMMIT DROP
+"""
+
+# One row per staged row: its rank among in-batch duplicates on each unique key and
+# the ids of existing rows holding its physical / logical name.
+_CLASSIFY = f"""
+SELECT s.row_no,
+       row_number() OVER (PARTITION BY s.namespace, s.entity, s.physical_name ORDER BY s.row_no) AS rn_p,
+       row_number() OVER (PARTITION BY s.namespace, s.entity, s.logical_name ORDER BY s.row_no) AS rn_l,
+       p.id AS phys_id, l.id AS logi_id, p.logical_name AS old_logical, p.synonyms AS old_synonyms
+FROM {_STAGE} s
+LEFT JOIN meta.attribute p ON p.namespace = s.namespace AND p.entity = s.entity AND p.physical_name = s.physical_name
+LEFT JOIN meta.attribute l ON l.namespace = s.namespace AND l.entity = s.entity AND l.logical_name = s.logical_name
+"""
+
+_INSERT = f"""
+INSERT INTO meta.attribute AS a (namespace, entity, category, logical_name, physical_name, data_type, description,
+                                 source_system, created_by, updated_by, synonyms, tags, is_active, metadata, version)
+SELECT namespace, entity, category::meta.attr_category, logical_name, physical_name, data_type, description,
+       source_system, created_by, updated_by, synonyms, tags::jsonb, is_active, metadata::jsonb, 1
+FROM {_STAGE} WHERE row_no = ANY($1::int[])
+"""
+
+_ON_CONFLICT = {
+    # No target: covers both unique indexes (rows inserted concurrently since classification are skipped)
+    "skip": "ON CONFLICT DO NOTHING",
+    # Rows whose content is unchanged are left alone (and not returned)
+    "update": """
+ON CONFLICT (namespace, entity, physical_name) DO UPDATE SET
+  category = EXCLUDED.category, logical_name = EXCLUDED.logical_name, data_type = EXCLUDED.data_type,
+  description = EXCLUDED.description, source_system = EXCLUDED.source_system, updated_by = EXCLUDED.updated_by,
+  synonyms = EXCLUDED.synonyms, tags = EXCLUDED.tags, is_active = EXCLUDED.is_active, metadata = EXCLUDED.metadata,
+  version = a.version + 1, updated_at = now()
+WHERE (a.category, a.logical_name, a.data_type, a.description, a.source_system, a.synonyms, a.tags, a.is_active, a.metadata)
+      IS DISTINCT FROM
+      (EXCLUDED.category, EXCLUDED.logical_name, EXCLUDED.data_type, EXCLUDED.description, EXCLUDED.source_system,
+       EXCLUDED.synonyms, EXCLUDED.tags, EXCLUDED.is_active, EXCLUDED.metadata)
+""",
+}
+
+def payload_columns(alias: str = "") -> str:
+    """SELECT/RETURNING list producing the cache payload shape (jsonb/enum as text for decoding)."""
+    a = f"{alias}." if alias else ""
+    return (f"{a}id, {a}namespace, {a}entity, {a}category::text AS category, {a}logical_name, {a}physical_name, "
+            f"{a}data_type, {a}description, {a}source_system, {a}created_by, {a}updated_by, {a}synonyms, "
+            f"{a}tags::text AS tags, {a}is_active, {a}version, {a}metadata::text AS metadata")
+
+_RETURNING = f"RETURNING {payload_columns('a')}, (a.xmax = 0) AS inserted"
+
+@dataclass
+class BulkResult:
+    # One entry per input row, in input order: {"row", "status", "id"?, "reason"?}
+    outcomes: list[dict] = field(default_factory=list)
+    # Cache payloads for every inserted/updated row
+    payloads: list[dict] = field(default_factory=list)
+    # (namespace, entity, physical, old_logical, old_synonyms) of updated rows whose previous keys must be invalidated
+    stale: list[tuple] = field(default_factory=list)
+
+    @property
+    def counts(self) -> dict:
+        out: dict[str, int] = {}
+        for o in self.outcomes: out[o["status"]] = out.get(o["status"], 0) + 1
+        return out
+
+def _stage_record(i: int, r: dict) -> tuple:
+    meta = r.get("meta", r.get("metadata")) or {}
+    return (i, r.get("namespace") or "default", r.get("entity"), r.get("category") or "entity", r.get("logical_name"),
+            r.get("physical_name"), r.get("data_type"), r.get("description"), r.get("source_system"),
+            r.get("created_by") or "System", r.get("updated_by") or "System", list(r.get("synonyms") or []),
+            json.dumps(r.get("tags") or []), r.get("is_active", True), json.dumps(meta))
+
+def payload_from_record(rec) -> dict:
+    """Decode a row selected with `payload_columns()` into a cache payload."""
+    d = dict(rec)
+    d.pop("inserted", None)
+    d["tags"] = json.loads(d["tags"]) if d["tags"] else []
+    d["metadata"] = json.loads(d["metadata"]) if d["metadata"] else {}
+    d["synonyms"] = list(d["synonyms"] or [])
+    return d
+
+async def copy_upsert(conn: asyncpg.Connection, rows: list[dict], on_conflict: str = "skip") -> BulkResult:
+    """Load normalized rows (see `_normalize_row`) with COPY + INSERT ... ON CONFLICT.
+
+    Must run inside a transaction (the staging table is dropped on commit).
+    `on_conflict`:
+      - "skip":   rows whose physical or logical name already exists are reported as `skipped`
+      - "update": rows matching an existing physical name update it (`updated`, or `unchanged`);
+                  a logical name held by a different attribute is a `conflict`
+      - "fail":   any existing or in-batch duplicate raises DuplicateError and nothing is written
+    In-batch duplicates (same key twice in `rows`) keep the first occurrence; the rest are `duplicate`.
+    """
+    # Imported here so offline workers can use this module without pulling in the ORM layer eagerly
+    from api.app.repo.attribute_repo import DuplicateError
+
+    if on_conflict not in CONFLICT_POLICIES:
+        raise ValueError(f"on_conflict must be one of {CONFLICT_POLICIES}, got {on_conflict!r}")
+    result = BulkResult()
+    if not rows: return result
+
+    await conn.execute(_CREATE_STAGE)
+    await conn.execute(f"TRUNCATE {_STAGE}")
+    await conn.copy_records_to_table(_STAGE, records=[_stage_record(i, r) for i, r in enumerate(rows)],
+                                     columns=_STAGE_COLUMNS)
+
+    outcomes: list[dict] = [{"row": i} for i in range(len(rows))]
+    write: list[int] = []
+    dups: list[tuple] = []
+    for c in await conn.fetch(_CLASSIFY):
+        i, o = c["row_no"], outcomes[c["row_no"]]
+        if c["rn_p"] > 1 or c["rn_l"] > 1:
+            o.update(status="duplicate", reason="repeats an earlier row in this batch")
+        elif c["phys_id"] is None and c["logi_id"] is None:
+            write.append(i)
+            continue
+        elif on_conflict == "update" and c["phys_id"] is not None and c["logi_id"] in (None, c["phys_id"]):
+            write.append(i)
+            r, old_syns = rows[i], list(c["old_synonyms"] or [])
+            if c["old_logical"] != r.get("logical_name") or old_syns != list(r.get("synonyms") or []):
+                result.stale.append((r.get("namespace") or "default", r.get("entity"), r.get("physical_name"),
+                                     c["old_logical"], old_syns))
+            continue
+        elif c["phys_id"] is not None and on_conflict != "update":
+            o.update(status="skipped", id=c["phys_id"], reason="physical_name already exists")
+        else:
+            o.update(status="conflict" if on_conflict != "skip" else "skipped", id=c["logi_id"],
+                     reason="logical_name already used by another attribute")
+        r = rows[i]
+        dups.append((r.get("namespace") or "default", r.get("entity"), r.get("physical_name")))
+
+    if on_conflict == "fail" and dups:
+        raise DuplicateError(dups)
+
+    if write:
+        stmt = _INSERT + _ON_CONFLICT.get(on_conflict, "") + _RETURNING
+        returned = {}
+        for rec in await conn.fetch(stmt, write):
+            returned[(rec["namespace"], rec["entity"], rec["physical_name"])] = rec
+        for i in write:
+            r = rows[i]
+            rec = returned.get((r.get("namespace") or "default", r.get("entity"), r.get("physical_name")))
+            if rec is None:
+                # update: content identical; skip: inserted concurrently by someone else
+                outcomes[i].update(status="unchanged" if on_conflict == "update" else "skipped")
+                continue
+            outcomes[i].update(status="inserted" if rec["inserted"] else "updated", id=rec["id"])
+            result.payloads.append(payload_from_record(rec))
+    # Stale keys only matter for rows that were actually rewritten
+    updated = {(p["namespace"], p["entity"], p["physical_name"]) for p in result.payloads}
+    result.stale = [s for s in result.stale if s[:3] in updated]
+    result.outcomes = outcomes
+    return result
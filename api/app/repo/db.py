@@ -1,92 +1,167 @@
 from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker, AsyncSession
-from sqlalchemy.orm import DeclarativeBase, Mapped, mapped_column
-from sqlalchemy import String, Text, Boolean, Integer
+from sqlalchemy.orm import DeclarativeBase, Mapped, Session, mapped_column
+from sqlalchemy import String, Text, Boolean, Integer, DateTime, event, func
 from sqlalchemy.dialects.postgresql import ARRAY, JSONB, ENUM as PG_ENUM
 from api.app.config import settings
+from api.app.services.metrics import instrument_pool
+from api.app.services.timing import instrument_engine
 from typing import AsyncGenerator
+from datetime import datetime
 from urllib.parse import urlsplit, urlunsplit, parse_qsl, urlencode
 import logging
+import time
 
 logger = logging.getLogger(__name__)
 
-# Handle sslmode/ssl and timeout query params for asyncpg: asyncpg.connect expects
-# proper python types (bool/number), but query params from the URL are strings.
-# We'll remove these params from the URL and forward them via connect_args.
-raw_db_url = settings.database_url or ""
-connect_args: dict | None = None
-try:
-    parts = urlsplit(raw_db_url)
-    if parts.query:
-        qs = dict(parse_qsl(parts.query, keep_blank_values=True))
-        # Extract known connect args we want to convert
-        sslmode = qs.pop("sslmode", None)
-        ssl = qs.pop("ssl", None)
-        timeout = qs.pop("timeout", None)
-
-        tmp_connect_args: dict = {}
-        if sslmode is not None:
-            # interpret common sslmode values
-            val = sslmode.lower()
-            if val in ("disable", "false", "0", "no"):
-                tmp_connect_args["ssl"] = False
-            elif val in ("require", "verify-ca", "verify-full", "true", "1", "yes"):
-                tmp_connect_args["ssl"] = True
-            else:
-                # for values like 'prefer' or 'allow' do not force an ssl arg
-                pass
-        elif ssl is not None:
-            if ssl.lower() in ("false", "0", "no"):
-                tmp_connect_args["ssl"] = False
-            elif ssl.lower() in ("true", "1", "yes"):
-                tmp_connect_args["ssl"] = True
-            # otherwise leave it out
-
-        if timeout is not None:
-            try:
-                # accept integer or float
-                if "." in timeout:
-                    tmp_connect_args["timeout"] = float(timeout)
+def _split_url(url: str) -> tuple[str, dict | None]:
+    """Move sslmode/ssl and timeout query params out of a DSN and into asyncpg connect args.
+
+    asyncpg.connect expects proper python types (bool/number), but query params from the URL are strings.
+    """
+    connect_args: dict | None = None
+    try:
+        parts = urlsplit(url)
+        if parts.query:
+            qs = dict(parse_qsl(parts.query, keep_blank_values=True))
+            # Extract known connect args we want to convert
+            sslmode = qs.pop("sslmode", None)
+            ssl = qs.pop("ssl", None)
+            timeout = qs.pop("timeout", None)
+
+            tmp_connect_args: dict = {}
+            if sslmode is not None:
+                # interpret common sslmode values
+                val = sslmode.lower()
+                if val in ("disable", "false", "0", "no"):
+                    tmp_connect_args["ssl"] = False
+                elif val in ("require", "verify-ca", "verify-full", "true", "1", "yes"):
+                    tmp_connect_args["ssl"] = True
                 else:
-                    tmp_connect_args["timeout"] = int(timeout)
-            except Exception:
-                # ignore invalid timeout value and let asyncpg use its default
-                logger.warning("Invalid timeout value in DATABASE_URL query params: %r", timeout)
-
-        # Rebuild URL without the consumed query params
-        new_query = urlencode(qs, doseq=True)
-        parts = parts._replace(query=new_query)
-        raw_db_url = urlunsplit(parts)
-
-        connect_args = tmp_connect_args or None
-except Exception as exc:
-    # if anything goes wrong parsing, fall back to using raw_db_url without connect_args
-    logger.exception("Failed to parse DATABASE_URL query params: %s", exc)
-    connect_args = None
-
-# Log sanitized connection info to help debugging (do NOT log credentials)
-try:
-    safe_url = raw_db_url
-    # remove password if present
-    if "@" in safe_url and "://" in safe_url:
-        prefix, rest = safe_url.split("@", 1)
-        if ":" in prefix:
-            scheme_and_user = prefix.split("//", 1)[0]
-            userinfo = prefix.split("//", 1)[1]
+                    # for values like 'prefer' or 'allow' do not force an ssl arg
+                    pass
+            elif ssl is not None:
+                if ssl.lower() in ("false", "0", "no"):
+                    tmp_connect_args["ssl"] = False
+                elif ssl.lower() in ("true", "1", "yes"):
+                    tmp_connect_args["ssl"] = True
+                # otherwise leave it out
+
+            if timeout is not None:
+                try:
+                    # accept integer or float
+                    if "." in timeout:
+                        tmp_connect_args["timeout"] = float(timeout)
+                    else:
+                        tmp_connect_args["timeout"] = int(timeout)
+                except Exception:
+                    # ignore invalid timeout value and let asyncpg use its default
+                    logger.warning("Invalid timeout value in database URL query params: %r", timeout)
+
+            # Rebuild URL without the consumed query params
+            url = urlunsplit(parts._replace(query=urlencode(qs, doseq=True)))
+            connect_args = tmp_connect_args or None
+    except Exception as exc:
+        # if anything goes wrong parsing, fall back to using the raw url without connect_args
+        logger.exception("Failed to parse database URL query params: %s", exc)
+        connect_args = None
+    return url, connect_args
+
+def _safe_url(url: str) -> str:
+    """The URL with its password masked, for logging (do NOT log credentials)."""
+    try:
+        if "@" in url and "://" in url:
+            prefix, rest = url.split("@", 1)
+            scheme_and_user, userinfo = prefix.split("//", 1)
             if ":" in userinfo:
-                user = userinfo.split(":")[0]
-                safe_url = f"{scheme_and_user}//{user}:*****@{rest}"
-    logger.info("Using DB URL: %s; connect_args keys: %s", safe_url, list(connect_args.keys()) if connect_args else None)
-except Exception:
-    # ignore any issues building safe_url
-    pass
-
-if connect_args:
-    engine = create_async_engine(raw_db_url, pool_pre_ping=True, pool_size=10, max_overflow=20, connect_args=connect_args)
-else:
-    engine = create_async_engine(raw_db_url, pool_pre_ping=True, pool_size=10, max_overflow=20)
+                return f"{scheme_and_user}//{userinfo.split(':')[0]}:*****@{rest}"
+    except Exception:
+        pass
+    return url
+
+def _create_engine(url: str, name: str):
+    url, args = _split_url(url)
+    logger.info("Using DB URL (%s): %s; connect_args keys: %s", name, _safe_url(url), list(args) if args else None)
+    # statement_cache_size is asyncpg's, prepared_statement_cache_size SQLAlchemy's; 0 for both behind pgbouncer
+    args = {**(args or {}), "statement_cache_size": settings.db_statement_cache_size,
+            "prepared_statement_cache_size": settings.db_statement_cache_size}
+    engine = create_async_engine(url, pool_pre_ping=settings.db_pool_pre_ping, pool_size=settings.db_pool_size,
+                                 max_overflow=settings.db_max_overflow, pool_recycle=settings.db_pool_recycle_seconds,
+                                 connect_args=args)
+    # Checked-out / overflow gauges for sizing pool_size, max_overflow and the worker count
+    instrument_pool(engine, name)
+    instrument_engine(engine)
+    return engine
 
+raw_db_url, connect_args = _split_url(settings.database_url or "")
+engine = _create_engine(settings.database_url or "", "primary")
 SessionLocal = async_sessionmaker(engine, expire_on_commit=False)
 
+class _Replicas:
+    """Round-robin over the read engines; one that fails to connect sits out for DB_REPLICA_COOLDOWN_SECONDS."""
+    def __init__(self, engines: list):
+        self.engines = engines
+        self._down_until = [0.0] * len(engines)
+        self._next = 0
+        for i, e in enumerate(engines):
+            event.listen(e.sync_engine, "do_connect", self._on_connect(i))
+            event.listen(e.sync_engine, "handle_error", self._on_error(i))
+
+    def _on_connect(self, i: int):
+        # Refused / timed-out connects raise OSError-style exceptions that never reach handle_error
+        def connect(dialect, conn_rec, cargs, cparams):
+            try:
+                return dialect.connect(*cargs, **cparams)
+            except Exception:
+                self.mark_down(i)
+                raise
+        return connect
+
+    def _on_error(self, i: int):
+        def handle(ctx):
+            # A connection lost mid-query; a pre-ping disconnect is retried by the pool on its own
+            if ctx.is_disconnect and not ctx.is_pre_ping: self.mark_down(i)
+        return handle
+
+    def mark_down(self, i: int):
+        if self._down_until[i] <= time.monotonic():
+            logger.warning("Read replica %d unavailable; routing reads elsewhere for %ss",
+                           i, settings.db_replica_cooldown_seconds)
+        self._down_until[i] = time.monotonic() + settings.db_replica_cooldown_seconds
+
+    def pick(self):
+        """Next healthy read engine, or the primary when none is."""
+        now = time.monotonic()
+        for _ in range(len(self.engines)):
+            i = self._next
+            self._next = (i + 1) % len(self.engines)
+            if self._down_until[i] <= now: return self.engines[i]
+        return engine
+
+replicas = _Replicas([_create_engine(u, f"replica-{i}") for i, u in enumerate(settings.database_read_urls)])
+
+class _ReadSession(Session):
+    # Bound lazily: a session that never queries (all cache hits) never checks out a connection
+    _read_bind = None
+
+    def get_bind(self, mapper=None, clause=None, **kw):
+        if self._read_bind is None: self._read_bind = replicas.pick().sync_engine
+        return self._read_bind
+
+# Reads whose result is not cached (search, GET by id): they may see replica lag. Writes and every
+# lookup that fills a cache (convert misses, negative entries, warmup, rebuilds) stay on SessionLocal,
+# since a lagging row cached under the generation its write already bumped would outlive the lag.
+# Without DATABASE_READ_URLS every read session is bound to the primary.
+ReadSessionLocal = async_sessionmaker(sync_session_class=_ReadSession, expire_on_commit=False)
+
+def asyncpg_connect_kwargs() -> dict:
+    """DSN + connect args for a raw asyncpg connection (LISTEN/NOTIFY, COPY, offline jobs).
+
+    asyncpg does not understand SQLAlchemy's `postgresql+asyncpg` scheme, so strip the driver suffix.
+    """
+    parts = urlsplit(raw_db_url)
+    dsn = urlunsplit(parts._replace(scheme=parts.scheme.split("+", 1)[0]))
+    return {"dsn": dsn, **(connect_args or {})}
+
 class Base(DeclarativeBase): ...
 class Attribute(Base):
     __tablename__ = "attribute"
@@ -111,7 +186,13 @@ class Attribute(Base):
     is_active: Mapped[bool] = mapped_column(Boolean, default=True)
     version: Mapped[int] = mapped_column(Integer, default=1)
     meta: Mapped[dict] = mapped_column("metadata", JSONB, default=dict)
+    # Maintained by the DB (default + trigger in 002_change_notify.sql); used for incremental catch-up
+    updated_at: Mapped[datetime] = mapped_column(DateTime(timezone=True), server_default=func.now())
 
 async def get_session() -> AsyncGenerator[AsyncSession, None]:
     async with SessionLocal() as session:
         yield session
+
+async def get_read_session() -> AsyncGenerator[AsyncSession, None]:
+    async with ReadSessionLocal() as session:
+        yield session
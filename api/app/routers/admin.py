@@ -0,0 +1,26 @@
+import hmac
+import os
+from fastapi import APIRouter, Depends, Header, HTTPException
+from fastapi.responses import PlainTextResponse
+from api.app.config import settings
+from api.app.services import profiler
+
+def require_admin(x_admin_token: str | None = Header(None)):
+    if not settings.admin_token: raise HTTPException(403, "Admin endpoints are disabled (set ADMIN_TOKEN)")
+    if not hmac.compare_digest(x_admin_token or "", settings.admin_token): raise HTTPException(401, "Invalid admin token")
+
+router = APIRouter(prefix="/v1/admin", tags=["admin"], dependencies=[Depends(require_admin)])
+
+@router.get("/profile", response_class=PlainTextResponse)
+async def profile(seconds: float = 10, interval_ms: float = 5):
+    """Sample-profile live traffic in the worker that serves this request for `seconds`.
+
+    Returns collapsed stacks (`frame;frame count` per line), ready for flamegraph.pl or speedscope.
+    Only one profile runs per worker at a time; `X-Worker-Pid` tells which worker was sampled.
+    """
+    if not 0 < seconds <= settings.profile_max_seconds:
+        raise HTTPException(400, f"seconds must be in (0, {settings.profile_max_seconds}]")
+    if not 1 <= interval_ms <= 1000: raise HTTPException(400, "interval_ms must be in [1, 1000]")
+    if profiler.busy(): raise HTTPException(409, "A profile is already running in this worker")
+    stacks, samples = await profiler.profile(seconds, interval_ms / 1000)
+    return PlainTextResponse(stacks, headers={"X-Profile-Samples": str(samples), "X-Worker-Pid": str(os.getpid())})
@@ -1,8 +1,10 @@
 from fastapi import APIRouter, Depends, HTTPException
+import asyncpg
 from sqlalchemy.ext.asyncio import AsyncSession
 from api.app.models.dto import AttributeIn, AttributeOut
-from api.app.repo.db import get_session, Attribute
-from api.app.repo.attribute_repo import AttributeRepo, DuplicateError, MigrationError
+from api.app.repo.db import get_session, get_read_session, Attribute
+from api.app.repo.attribute_repo import AttributeRepo, DuplicateError, MigrationError, to_payload
+from api.app.repo.bulk import CONFLICT_POLICIES
 from api.app.services.cache import cache
 import sqlalchemy
 
@@ -29,34 +31,81 @@ async def create(attrs: list[AttributeIn], session: AsyncSession = Depends(get_s
         msg = str(getattr(e, 'orig', e))
         raise HTTPException(status_code=409, detail=f"Duplicate attribute insertion: {msg}")
 
-    outs: list[AttributeOut] = []
-    for r in rows:
-        # Build a Pydantic output model from the SQLAlchemy object and cache a serializable dict
-        out = AttributeOut(**r.__dict__)
-        await cache.set_both(out.model_dump(mode="json"))
-        outs.append(out)
+    # Cache serializable dicts (validated through AttributeOut) in one pipeline
+    outs = [to_payload(r) for r in rows]
+    await cache.set_many(outs)
     return outs
 
+@router.post("/bulk")
+async def bulk_ingest(attrs: list[AttributeIn], on_conflict: str = "skip", report: str = "problems",
+                      session: AsyncSession = Depends(get_session)):
+    """Bulk ingest via COPY + INSERT ... ON CONFLICT, for loads far beyond what `POST /v1/attributes` handles.
+
+    `on_conflict`: `skip` (default), `update` or `fail` (409, nothing written).
+    `report`: `all` returns an outcome for every row, `problems` (default) only rows that were
+    not inserted/updated, `none` only the counts.
+    """
+    if on_conflict not in CONFLICT_POLICIES:
+        raise HTTPException(400, f"on_conflict must be one of {list(CONFLICT_POLICIES)}")
+    if report not in ("all", "problems", "none"):
+        raise HTTPException(400, "report must be one of ['all', 'problems', 'none']")
+    repo = AttributeRepo(session)
+    try:
+        result = await repo.bulk_upsert([a.model_dump() for a in attrs], on_conflict)
+        await session.commit()
+    except MigrationError as e:
+        await session.rollback()
+        raise HTTPException(status_code=500, detail=("Database schema not found: meta.attribute. "
+                                                     "Ensure migrations have been applied and retry. "
+                                                     f"(orig: {str(e)})"))
+    except DuplicateError as e:
+        await session.rollback()
+        raise HTTPException(status_code=409, detail=f"Duplicate attribute(s): {e.duplicates}")
+    except (sqlalchemy.exc.IntegrityError, asyncpg.exceptions.UniqueViolationError) as e:
+        # A concurrent writer took a key between classification and insert
+        await session.rollback()
+        raise HTTPException(status_code=409, detail=f"Duplicate attribute insertion: {getattr(e, 'orig', e)}")
+
+    # Drop keys of renamed attributes first, then cache the new state in pipelined batches
+    await cache.invalidate_many(result.stale)
+    inactive = [(p["namespace"], p["entity"], p["physical_name"], p["logical_name"], p["synonyms"])
+                for p in result.payloads if not p["is_active"]]
+    await cache.invalidate_many(inactive)
+    await cache.set_many([p for p in result.payloads if p["is_active"]])
+
+    out: dict = {"counts": result.counts}
+    if report == "all": out["rows"] = result.outcomes
+    elif report == "problems": out["rows"] = [o for o in result.outcomes if o["status"] not in ("inserted", "updated")]
+    return out
+
 @router.get("/{id}", response_model=AttributeOut)
-async def get_one(id: int, session: AsyncSession = Depends(get_session)):
+async def get_one(id: int, session: AsyncSession = Depends(get_read_session)):
     obj = await session.get(Attribute, id)
     if not obj: raise HTTPException(404, "Not found")
-    return AttributeOut(**obj.__dict__)
+    return to_payload(obj)
 
 @router.put("/{id}")
 async def update(id: int, payload: AttributeIn, session: AsyncSession = Depends(get_session)):
+    # Keys cached under the previous names/synonyms must go too, not just the new ones
+    old = await session.get(Attribute, id)
+    if not old: raise HTTPException(404, "Not found")
+    old_keys = (old.namespace, old.entity, old.physical_name, old.logical_name, list(old.synonyms or []))
     repo = AttributeRepo(session)
     count = await repo.update(id, payload.model_dump())
     await session.commit()
     if count == 0: raise HTTPException(404, "Not found")
-    await cache.invalidate(payload.namespace, payload.entity, payload.physical_name, payload.logical_name)
+    # Old and new names in one pipeline: with two calls, a read between them could see the old keys gone and
+    # the generation bumped while the new names still hold stale entries, and cache a response under it
+    await cache.invalidate_many([old_keys, (payload.namespace, payload.entity, payload.physical_name,
+                                            payload.logical_name, payload.synonyms)])
     return {"updated": count}
 
 @router.delete("/{id}")
 async def delete(id: int, session: AsyncSession = Depends(get_session)):
     obj = await session.get(Attribute, id)
     if not obj: raise HTTPException(404, "Not found")
-    await cache.invalidate(obj.namespace, obj.entity, obj.physical_name, obj.logical_name)
     await session.delete(obj)
     await session.commit()
+    # After the commit: the invalidation also bumps the namespace generation, which must not precede the write
+    await cache.invalidate(obj.namespace, obj.entity, obj.physical_name, obj.logical_name, obj.synonyms)
     return {"deleted": 1}
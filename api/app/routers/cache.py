@@ -1,38 +1,71 @@
-from fastapi import APIRouter, Depends
-from sqlalchemy.ext.asyncio import AsyncSession
+from fastapi import APIRouter, HTTPException
+from api.app.config import settings
 from api.app.repo.attribute_repo import AttributeRepo
-from api.app.repo.db import get_session
+from api.app.repo.db import SessionLocal
 from api.app.services.cache import cache
+from api.app.services.jobs import jobs, Job
+from api.app.services.snapshot import snapshot
+from api.app.services.catalog import catalog, compile_catalog
 from typing import Optional
 
 router = APIRouter(prefix="/v1/cache", tags=["cache"])
 
-@router.post("/refresh")
-async def refresh_cache(namespace: Optional[str] = None, entity: Optional[str] = None, session: AsyncSession = Depends(get_session)):
+async def _refresh(job: Job):
+    """Stream active rows through a server-side cursor and write each chunk to Redis in one pipeline."""
+    ns, entity, chunk_size = job.params["namespace"], job.params["entity"], job.params["chunk_size"]
+    # Own session: the request that started the job has already returned
+    async with SessionLocal() as session:
+        async for chunk in AttributeRepo(session).stream_active(ns, entity, chunk_size):
+            # Per-chunk key lists would flood pub/sub on a full refresh; peers are cleared once at the end
+            if await cache.set_many(chunk, notify=False): job.processed += len(chunk)
+            else: job.failed += len(chunk)
+            await jobs.publish(job)
+    await cache.clear_l1()
+    # A refresh is how out-of-band DB changes reach the cache; ETags and cached responses must follow
+    await cache.bump_generations([ns] if ns is not None else None)
+
+@router.post("/refresh", status_code=202)
+async def refresh_cache(namespace: Optional[str] = None, entity: Optional[str] = None, chunk_size: Optional[int] = None):
     """Refresh cache entries from the database. Both `namespace` and `entity` are optional filters.
 
     If neither param is provided all active attributes will be refreshed.
-    Returns a summary: number of refreshed entries and list of example keys refreshed.
+    The refresh runs as a background job; poll the returned `status_url` for progress and throughput.
+    """
+    params = {"namespace": namespace, "entity": entity, "chunk_size": chunk_size or settings.refresh_chunk_size}
+    job = jobs.start("cache_refresh", params, _refresh)
+    return {"job_id": job.id, "status": job.status, "status_url": f"/v1/cache/jobs/{job.id}"}
+
+@router.get("/jobs/{job_id}")
+async def job_status(job_id: str):
+    """Progress of a background job: status, rows processed/failed, elapsed time and rows/sec."""
+    status = await jobs.get(job_id)
+    if status is None: raise HTTPException(404, "Job not found")
+    return status
+
+@router.get("/snapshot")
+async def snapshot_status():
+    """Snapshot-mode status: generation, row count and approximate memory footprint."""
+    return snapshot.status()
+
+async def _compile(job: Job):
+    # A compile on request is for changes the write paths didn't see. Bumping the write generation makes
+    # every host's workers recompile their own CATALOG_DIR too (and drops ETags built on the old data).
+    await cache.bump_generations()
+    result = await compile_catalog()
+    job.processed = result["rows"]
+    # Map it here right away; other workers pick it up within CATALOG_POLL_SECONDS
+    if catalog.enabled: catalog.reload()
+
+@router.post("/catalog/compile", status_code=202)
+async def compile_catalog_job():
+    """Compile the active catalog into a new memory-mapped generation (see CATALOG_MODE) as a background job.
+
+    Workers on other hosts (with their own CATALOG_DIR) compile theirs within CATALOG_RECOMPILE_SECONDS.
     """
-    repo = AttributeRepo(session)
-    rows = await repo.list_active(namespace, entity)
-    if not rows:
-        return {"refreshed": 0, "sample": []}
-
-    refreshed = 0
-    sample = []
-    # Refresh each attribute in DB and update cache (best-effort)
-    for r in rows:
-        d = r.__dict__.copy()
-        # ensure serializable fields are present; cache.set_both expects keys
-        try:
-            await cache.set_both(d)
-            refreshed += 1
-            if len(sample) < 10:
-                sample.append({"namespace": d.get("namespace"), "entity": d.get("entity"), "physical_name": d.get("physical_name"), "logical_name": d.get("logical_name")})
-        except Exception as e:
-            # don't fail the whole operation for single-key errors
-            # but surface a warning in the response
-            sample.append({"error": str(e), "namespace": d.get("namespace"), "entity": d.get("entity")})
-
-    return {"refreshed": refreshed, "sample": sample}
+    job = jobs.start("catalog_compile", {"dir": settings.catalog_dir}, _compile)
+    return {"job_id": job.id, "status": job.status, "status_url": f"/v1/cache/jobs/{job.id}"}
+
+@router.get("/catalog")
+async def catalog_status():
+    """Catalog-mode status: mapped generation, rows, entities and file size."""
+    return catalog.status()
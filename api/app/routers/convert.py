@@ -1,15 +1,135 @@
-from fastapi import APIRouter, Depends
+import orjson
+from fastapi import APIRouter, Depends, HTTPException, Request
+from fastapi.responses import StreamingResponse
 from sqlalchemy.ext.asyncio import AsyncSession
-from api.app.models.dto import ConvertPhysReq, ConvertLogiReq
-from api.app.repo.db import get_session
-from api.app.services.attribute_service import physical_to_logical, logical_to_physical
+from starlette.background import BackgroundTask
+from api.app.config import settings
+from api.app.models.dto import ConvertPhysReq, ConvertLogiReq, ConvertBatchReq
+from api.app.repo.db import get_session, SessionLocal
+from api.app.services.admission import admission
+from api.app.services.attribute_service import physical_to_logical, logical_to_physical, convert_batch, local_source
+from api.app.services.conditional import conditional
 
 router = APIRouter(prefix="/v1/convert", tags=["convert"])
 
+NDJSON = "application/x-ndjson"
+# The first streamed chunk is small so results start flowing quickly; later chunks double up to chunk_size
+_FIRST_STREAM_CHUNK = 50
+
+class _DuplexStream(StreamingResponse):
+    """StreamingResponse for endpoints that keep reading the request body while responding.
+
+    The stock one also listens on `receive` for a disconnect, which would steal body chunks
+    from the reader; here a disconnect surfaces as a failed `send` instead.
+    """
+    async def __call__(self, scope, receive, send):
+        try:
+            await self.stream_response(send)
+        finally:
+            # Also after a failed send: the background task may be releasing an admission slot
+            if self.background is not None: await self.background()
+
+def _check_batch(n: int):
+    if n > settings.max_batch:
+        raise HTTPException(413, f"{n} names requested; the limit is {settings.max_batch} per request "
+                                 f"(use the /stream variant for larger lists)")
+
+def _key(req):
+    # A snapshot / compiled catalog changes on its own schedule, so results also depend on its generation
+    tier, local = local_source()
+    return [req.model_dump(), tier, local.generation if local is not None else None]
+
 @router.post("/physical-to-logical")
-async def phys_to_logi(req: ConvertPhysReq, session: AsyncSession = Depends(get_session)):
-    return await physical_to_logical(session, req.namespace, req.entity, req.physical_names)
+async def phys_to_logi(req: ConvertPhysReq, request: Request, session: AsyncSession = Depends(get_session)):
+    _check_batch(len(req.physical_names))
+    return await conditional(request, [req.namespace], _key(req),
+                             lambda: physical_to_logical(session, req.namespace, req.entity, req.physical_names))
 
 @router.post("/logical-to-physical")
-async def logi_to_phys(req: ConvertLogiReq, session: AsyncSession = Depends(get_session)):
-    return await logical_to_physical(session, req.namespace, req.entity, req.logical_names)
+async def logi_to_phys(req: ConvertLogiReq, request: Request, session: AsyncSession = Depends(get_session)):
+    _check_batch(len(req.logical_names))
+    return await conditional(request, [req.namespace], _key(req),
+                             lambda: logical_to_physical(session, req.namespace, req.entity, req.logical_names))
+
+async def _read_names(request: Request):
+    """Yield (line number, names or error) from an NDJSON body without buffering it.
+
+    Each line is a JSON string (one name) or a JSON array of names (a chunk).
+    """
+    buf, line_no = b"", 0
+    async for piece in request.stream():
+        buf += piece
+        *lines, buf = buf.split(b"\n")
+        for line in lines:
+            line_no += 1
+            yield line_no, _parse_line(line)
+    if buf.strip():
+        yield line_no + 1, _parse_line(buf)
+
+def _parse_line(line: bytes):
+    if not line.strip(): return []
+    try:
+        v = orjson.loads(line)
+    except orjson.JSONDecodeError as e:
+        return ValueError(f"invalid JSON: {e}")
+    if isinstance(v, str): return [v]
+    if isinstance(v, list) and all(isinstance(x, str) for x in v): return v
+    return ValueError("expected a name or an array of names")
+
+async def _stream(request: Request, convert, ns: str, entity: str, chunk_size: int):
+    """Resolve names chunk by chunk and emit one NDJSON line per name as soon as its chunk is done."""
+    chunk_size = max(1, min(chunk_size, settings.max_batch))
+    limit = min(_FIRST_STREAM_CHUNK, chunk_size)
+    pending: list[str] = []
+    # Own session: request-scoped dependencies are closed before a streaming body is sent
+    async with SessionLocal() as session:
+        async def flush():
+            found = await convert(session, ns, entity, pending)
+            out = b"".join(orjson.dumps({"name": n, "result": found.get(n)}) + b"\n" for n in pending)
+            pending.clear()
+            return out
+
+        async for line_no, names in _read_names(request):
+            if isinstance(names, Exception):
+                # Names read before the bad line come out before its error: output stays in input order
+                if pending: yield await flush()
+                yield orjson.dumps({"line": line_no, "error": str(names)}) + b"\n"
+                continue
+            for n in names:
+                pending.append(n)
+                if len(pending) >= limit:
+                    yield await flush()
+                    limit = min(limit * 2, chunk_size)
+        if pending: yield await flush()
+
+async def _stream_response(request: Request, convert, ns: str, entity: str, chunk_size: int):
+    # The route's admission slot is held until the body is done, not just until this returns
+    slot = await admission.hold_route(request)
+    return _DuplexStream(_stream(request, convert, ns, entity, chunk_size), media_type=NDJSON,
+                         background=BackgroundTask(slot.aclose))
+
+@router.post("/physical-to-logical/stream")
+@admission.in_body
+async def phys_to_logi_stream(request: Request, entity: str, namespace: str = "default", chunk_size: int = 1000):
+    """Streaming variant for arbitrarily long lists: NDJSON in (a name or an array of names per line),
+    NDJSON out (`{"name", "result"}` per input name, in input order). Memory use is bounded by `chunk_size`.
+    A malformed line is reported as `{"line", "error"}` in its place in that order and otherwise skipped."""
+    return await _stream_response(request, physical_to_logical, namespace, entity, chunk_size)
+
+@router.post("/logical-to-physical/stream")
+@admission.in_body
+async def logi_to_phys_stream(request: Request, entity: str, namespace: str = "default", chunk_size: int = 1000):
+    """Streaming variant of `/logical-to-physical`; same input/output format as `/physical-to-logical/stream`."""
+    return await _stream_response(request, logical_to_physical, namespace, entity, chunk_size)
+
+@router.post("/batch")
+async def batch(req: ConvertBatchReq, request: Request):
+    """Convert many (namespace, entity, direction, names) groups in one call; results per group, in order.
+
+    At most `MAX_BATCH` names in total across all groups.
+    """
+    _check_batch(sum(len(g.names) for g in req.groups))
+
+    async def run():
+        return {"groups": await convert_batch(req.groups)}
+    return await conditional(request, sorted({g.namespace for g in req.groups}), _key(req), run)
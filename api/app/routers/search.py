@@ -1,15 +1,41 @@
-from fastapi import APIRouter, Depends
+from fastapi import APIRouter, Depends, HTTPException, Query, Request
 from sqlalchemy.ext.asyncio import AsyncSession
-from api.app.repo.attribute_repo import AttributeRepo
+from api.app.repo.attribute_repo import AttributeRepo, to_payload
 from api.app.models.dto import SearchResp
-from api.app.repo.db import get_session
+from api.app.repo.db import get_read_session, replicas
+from api.app.services.admission import admission
+from api.app.services.conditional import conditional
+from api.app.services.timing import stage
 
 router = APIRouter(prefix="/v1/attributes", tags=["search"])
 
 @router.get("/search", response_model=SearchResp)
-async def search(namespace: str | None = None, entity: str | None = None, q: str | None = None,
-                 by: str = "both", limit: int = 50, offset: int = 0,
-                 session: AsyncSession = Depends(get_session)):
+async def search(request: Request, namespace: str | None = None, entity: str | None = None, q: str | None = None,
+                 by: str = "both", limit: int = Query(50, ge=1, le=1000), offset: int = Query(0, ge=0),
+                 mode: str = "like", cursor: str | None = None,
+                 session: AsyncSession = Depends(get_read_session)):
+    """Search attributes.
+
+    - `mode=like` (default): substring match on logical/physical name (`by`), paged with `offset`.
+    - `mode=fts`: ranked full-text match of `q` over namespace, entity, names and description,
+      paged with the returned `next_cursor` (`offset` and `by` are ignored).
+    """
+    if mode == "fts" and not q: raise HTTPException(400, "q is required for mode=fts")
+    if mode not in ("like", "fts"): raise HTTPException(400, f"Unknown search mode: {mode}")
     repo = AttributeRepo(session)
-    rows = await repo.search(namespace, entity, q, by, limit, offset)
-    return SearchResp(items=[r.__dict__ for r in rows], total=None)
+
+    async def run():
+        async with admission.db(namespace):
+            if mode == "fts":
+                try:
+                    rows, total, next_cursor = await repo.search_fts(namespace, entity, q, limit, cursor)
+                except ValueError as e:
+                    raise HTTPException(400, str(e))
+                with stage("orm"):
+                    return SearchResp(items=[to_payload(r) for r in rows], total=total, next_cursor=next_cursor)
+            rows, total = await repo.search(namespace, entity, q, by, limit, offset)
+            with stage("orm"):
+                return SearchResp(items=[to_payload(r) for r in rows], total=total)
+    # The query string is part of the ETag already. A replica can lag behind the generation a write
+    # already bumped, so replica results are never cached under it.
+    return await conditional(request, [namespace], None, run, cacheable=not replicas.engines)
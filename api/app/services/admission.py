@@ -0,0 +1,161 @@
+"""Admission control: concurrency limits with bounded wait queues, per route, per namespace and
+in front of the database.
+
+A request that finds its limiter full waits in that limiter's queue for at most
+ADMISSION_MAX_WAIT_MS; when the queue is full too, or the wait runs out, it is rejected at once
+(503, or 429 for a namespace over its share) with `Retry-After`, instead of queueing on the
+SQLAlchemy pool until it times out.
+
+When the database limiter rejects (or a pool checkout times out) the worker goes degraded for
+ADMISSION_DEGRADED_SECONDS: conversions still answer from the snapshot / catalog / L1 / Redis,
+but anything that needs the database only gets in if a slot is free right away.
+"""
+import asyncio
+import logging
+import math
+import time
+from contextlib import AsyncExitStack, asynccontextmanager
+from fastapi import HTTPException, Request
+from sqlalchemy.exc import TimeoutError as PoolTimeout
+from api.app.config import settings
+from api.app.services.metrics import ADMISSION
+from api.app.services.timing import stage
+
+log = logging.getLogger(__name__)
+
+class Overloaded(HTTPException):
+    def __init__(self, status_code: int, detail: str, retry_after: float):
+        super().__init__(status_code, detail, headers={"Retry-After": str(max(1, math.ceil(retry_after)))})
+
+class Limiter:
+    """At most `limit` holders at once, at most `queue` more waiting (`limit <= 0`: unlimited)."""
+    def __init__(self, kind: str, name: str, limit: int, queue: int, status_code: int = 503):
+        self.kind, self.name = kind, name
+        self.limit, self.queue = limit, max(0, queue)
+        self.status_code = status_code
+        self._sem = asyncio.Semaphore(max(1, limit))
+        self.active = self.waiting = 0
+        self.admitted = self.queued = self.rejected = self.timeouts = 0
+
+    def _reject(self, result: str):
+        if result == "timeout": self.timeouts += 1
+        else: self.rejected += 1
+        ADMISSION.labels(self.kind, result).inc()
+        raise Overloaded(self.status_code, f"Too many concurrent requests ({self.kind} {self.name})",
+                         settings.admission_max_wait_ms / 1000)
+
+    @asynccontextmanager
+    async def slot(self, queue: bool = True):
+        if self.limit <= 0:
+            yield
+            return
+        if self._sem.locked():
+            if not queue or self.waiting >= self.queue: self._reject("rejected")
+            self.waiting += 1
+            self.queued += 1
+            try:
+                with stage("admission"):
+                    await asyncio.wait_for(self._sem.acquire(), settings.admission_max_wait_ms / 1000)
+            except asyncio.TimeoutError:
+                self._reject("timeout")
+            finally:
+                self.waiting -= 1
+            ADMISSION.labels(self.kind, "queued").inc()
+        else:
+            await self._sem.acquire()
+            ADMISSION.labels(self.kind, "admitted").inc()
+        self.admitted += 1
+        self.active += 1
+        try:
+            yield
+        finally:
+            self.active -= 1
+            self._sem.release()
+
+    def status(self) -> dict:
+        return {"limit": self.limit, "queue": self.queue, "active": self.active, "waiting": self.waiting,
+                "admitted": self.admitted, "queued": self.queued, "rejected": self.rejected, "timeouts": self.timeouts}
+
+class Admission:
+    def __init__(self):
+        db_limit = settings.admission_db_concurrency
+        if db_limit is None: db_limit = settings.db_pool_size + settings.db_max_overflow
+        self.db_limiter = Limiter("db", "pool", db_limit, settings.admission_queue)
+        self.routes: dict[str, Limiter] = {}
+        self.namespaces: dict[str, Limiter] = {}
+        self.degraded_until = 0.0
+        self._in_body: set = set()
+
+    @property
+    def degraded(self) -> bool: return time.monotonic() < self.degraded_until
+
+    def _degrade(self, why: str):
+        if not self.degraded: log.warning("Database saturated (%s); serving cache hits only for %ss", why,
+                                          settings.admission_degraded_seconds)
+        self.degraded_until = time.monotonic() + settings.admission_degraded_seconds
+
+    def route_limiter(self, path: str) -> Limiter:
+        lim = self.routes.get(path)
+        if lim is None:
+            limit = settings.admission_route_limits.get(path, settings.admission_route_concurrency)
+            lim = self.routes[path] = Limiter("route", path, limit, settings.admission_queue)
+        return lim
+
+    def namespace_limiter(self, ns: str) -> Limiter:
+        lim = self.namespaces.get(ns)
+        if lim is None:
+            limit = settings.admission_namespace_limits.get(ns, settings.admission_namespace_concurrency)
+            lim = self.namespaces[ns] = Limiter("namespace", ns, limit, settings.admission_queue, status_code=429)
+        return lim
+
+    def in_body(self, endpoint):
+        """Mark a streaming endpoint: it takes its route slot itself with `hold_route`.
+
+        A yield dependency exits before a StreamingResponse body runs, so `route` would release
+        the slot while the work is still to come.
+        """
+        self._in_body.add(endpoint)
+        return endpoint
+
+    def _route_limiter(self, request: Request) -> Limiter:
+        route = request.scope.get("route")
+        return self.route_limiter(getattr(route, "path", request.url.path))
+
+    async def route(self, request: Request):
+        """Router dependency: holds a slot of the matched route's limiter for the request."""
+        if getattr(request.scope.get("route"), "endpoint", None) in self._in_body:
+            yield
+            return
+        async with self._route_limiter(request).slot():
+            yield
+
+    async def hold_route(self, request: Request) -> AsyncExitStack:
+        """Take the request's route slot until the returned stack is closed (e.g. after the streamed body)."""
+        stack = AsyncExitStack()
+        await stack.enter_async_context(self._route_limiter(request).slot())
+        return stack
+
+    @asynccontextmanager
+    async def db(self, ns: str | None, queue: bool = True):
+        """Guard a database round trip on behalf of namespace `ns`."""
+        queue = queue and not self.degraded
+        async with self.namespace_limiter(ns or "*").slot(queue):
+            try:
+                async with self.db_limiter.slot(queue):
+                    yield
+            except Overloaded as e:
+                self._degrade("no free database slot")
+                # While degraded, come back when that is over
+                e.headers["Retry-After"] = str(max(1, math.ceil(self.degraded_until - time.monotonic())))
+                raise
+            except PoolTimeout as e:
+                self._degrade("pool checkout timed out")
+                raise Overloaded(503, "Database connection pool exhausted", settings.admission_degraded_seconds) from e
+
+    def status(self) -> dict:
+        return {"degraded": self.degraded, "degraded_for_sec": round(max(0.0, self.degraded_until - time.monotonic()), 3),
+                "max_wait_ms": settings.admission_max_wait_ms, "db": self.db_limiter.status(),
+                "routes": {k: v.status() for k, v in self.routes.items()},
+                "namespaces": {k: v.status() for k, v in self.namespaces.items()}}
+
+admission = Admission()
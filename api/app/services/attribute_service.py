@@ -1,32 +1,258 @@
-from typing import List, Dict
+import asyncio
+import logging
+import time
+from typing import Awaitable, Callable, List, Dict
 from sqlalchemy.ext.asyncio import AsyncSession
+from api.app.config import settings
 from api.app.repo.attribute_repo import AttributeRepo
+from api.app.repo.db import SessionLocal
 from api.app.services.cache import cache
+from api.app.services.admission import admission
+from api.app.services.batcher import MicroBatcher
+from api.app.services.metrics import BATCH_SIZE, COALESCED, DB_BATCH_CALLERS, EARLY_REFRESH, record_lookups
+from api.app.services.singleflight import SingleFlight
+from api.app.services.catalog import catalog
+from api.app.services.snapshot import snapshot
+from api.app.services.warmup import warmup
+
+log = logging.getLogger(__name__)
+
+# Cache misses in flight in this worker, keyed by (index, ns, entity, name)
+_flights = SingleFlight()
+# Strong references to background early-refresh tasks
+_refreshes: set[asyncio.Task] = set()
+
+Loader = Callable[[List[str]], Awaitable[Dict[str, dict | None]]]
+
+async def _fill(index: str, ns: str, entity: str, names: List[str], load: Loader, recheck: Loader) -> Dict[str, dict | None]:
+    """Resolve cache misses with one DB lookup per key, however many callers miss it at once.
+
+    Concurrent callers in this worker share the leader's lookup. With SINGLEFLIGHT_LOCK_MS > 0
+    the leader also takes a short Redis lock per name; names locked by another worker are
+    waited for (until the lock is released or expires) and then re-read from the cache.
+    """
+    async def leader(keys):
+        todo = [k[3] for k in keys]
+        found: Dict[str, dict | None] = {}
+        locked: List[str] = []
+        try:
+            if settings.singleflight_lock_ms > 0:
+                owned = await cache.acquire_fill_locks(index, ns, entity, todo, settings.singleflight_lock_ms)
+                locked = [n for n, ok in zip(todo, owned) if ok]
+                others = [n for n, ok in zip(todo, owned) if not ok]
+                if others:
+                    hits = {n: p for n, p in (await _await_peers(index, ns, entity, others, recheck)).items() if p}
+                    COALESCED.labels(index, "peer").inc(len(hits))
+                    found.update(hits)
+                    todo = locked + [n for n in others if n not in hits]
+            if todo: found.update(await load(todo))
+        finally:
+            if locked: await cache.release_fill_locks(index, ns, entity, locked)
+        return {k: found.get(k[3]) for k in keys}
+
+    res, coalesced = await _flights.do_many([(index, ns, entity, n) for n in names], leader)
+    if coalesced: COALESCED.labels(index, "worker").inc(coalesced)
+    return {k[3]: v for k, v in res.items()}
+
+async def _fill_or_negative(index: str, ns: str, entity: str, misses: List[str], out: Dict[str, dict | None],
+                            load: Loader, recheck: Loader):
+    """Fill `out` for cache misses: names cached as unknown cost no DB round trip; names the DB
+    doesn't know either are remembered as unknown."""
+    unknown, token = await cache.get_missing(index, ns, entity, misses)
+    todo = [n for n, neg in zip(misses, unknown) if not neg]
+    if not todo: return
+    found = await _fill(index, ns, entity, todo, load, recheck)
+    out.update(found)
+    await cache.set_missing(index, ns, entity, [n for n in todo if not found.get(n)], token)
+
+async def _await_peers(index, ns, entity, names, recheck: Loader) -> Dict[str, dict | None]:
+    deadline = time.monotonic() + settings.singleflight_lock_ms / 1000
+    while time.monotonic() < deadline and any(await cache.fill_locks_held(index, ns, entity, names)):
+        await asyncio.sleep(0.02)
+    return await recheck(names)
+
+def _refresh_early(ns: str, entity: str, payloads: List[dict]):
+    """Rewrite entries close to expiry in the background; the caller already has its (valid) result."""
+    names = list(dict.fromkeys(p["physical_name"] for p in payloads))
+    names = [n for n in names if ("phys", ns, entity, n) not in _flights]
+    # Entries are still valid: don't add to the load of a saturated database
+    if not names or admission.degraded: return
+    EARLY_REFRESH.inc(len(names))
+
+    async def run():
+        try:
+            # Own session: the request's session is closed once it returns. Never queues for a slot.
+            async with admission.db(ns, queue=False), SessionLocal() as session:
+                await _fill("phys", ns, entity, names, lambda todo: _load_phys(session, ns, entity, todo),
+                            lambda todo: _cached_phys(ns, entity, todo))
+        except Exception as e:
+            log.warning("Early cache refresh failed for %s/%s: %s", ns, entity, e)
+
+    task = asyncio.create_task(run())
+    _refreshes.add(task)
+    task.add_done_callback(_refreshes.discard)
+
+async def _run_batch(key, names) -> Dict[str, dict | None]:
+    index, ns, entity = key
+    # Own session: the batch outlives whichever request opened it
+    async with admission.db(ns), SessionLocal() as session:
+        return await _BATCH_LOADERS[index](session, ns, entity, names)
+
+def _batch_flushed(key, callers: int, names: int):
+    DB_BATCH_CALLERS.labels(key[0]).observe(callers)
+    if callers > 1: COALESCED.labels(key[0], "batch").inc(names)
+
+# Misses of concurrent requests for the same (index, ns, entity) share one set-based query
+_batcher = MicroBatcher(_run_batch, settings.miss_batch_window_ms, settings.miss_batch_max_names, _batch_flushed)
+
+def _db_loader(index: str, session: AsyncSession, ns: str, entity: str) -> Loader:
+    """Loader for cache misses: through the micro-batcher, or on the caller's session when it is off."""
+    if _batcher.enabled: return lambda todo: _batcher.load((index, ns, entity), todo)
+
+    async def load(todo):
+        async with admission.db(ns):
+            return await _BATCH_LOADERS[index](session, ns, entity, todo)
+    return load
+
+async def _cached_phys(ns, entity, names) -> Dict[str, dict | None]:
+    return dict(zip(names, await cache.get_phys_many(ns, entity, names)))
+
+async def _load_phys(session: AsyncSession, ns, entity, names) -> Dict[str, dict | None]:
+    epoch = cache.l1_epoch
+    found = {p["physical_name"]: p for p in await AttributeRepo(session).lookup_physical_many(ns, entity, names)}
+    record_lookups("phys", "db", len(found), len(names) - len(found))
+    await cache.set_many(found.values(), notify=False, epoch=epoch)
+    return found
+
+def local_source():
+    """(tier, source) serving conversions from memory instead of Redis/DB, if any: the compiled catalog or the snapshot."""
+    if catalog.ready: return "catalog", catalog
+    if snapshot.ready: return "snapshot", snapshot
+    return None, None
 
 async def physical_to_logical(session: AsyncSession, ns: str, entity: str, physical_names: List[str]) -> Dict[str, dict | None]:
-    repo = AttributeRepo(session)
+    names = list(dict.fromkeys(physical_names))
+    BATCH_SIZE.labels("physical_to_logical").observe(len(names))
+    warmup.record(ns, entity, len(names))
+    out: Dict[str, dict | None] = {}
+    tier, local = local_source()
+    if local is not None:
+        out = dict(zip(names, local.get_phys_many(ns, entity, names)))
+        hits = sum(1 for v in out.values() if v)
+        record_lookups("phys", tier, hits, len(out) - hits)
+        # The snapshot follows every write; the compiled catalog only the next compile, so its misses
+        # (names created since) go on to Redis/DB
+        names = [p for p, hit in out.items() if not hit]
+        if tier == "snapshot" or not names: return out
+    due: List[int] = []
+    cached = await cache.get_phys_many(ns, entity, names, due=due)
+    if due: _refresh_early(ns, entity, [cached[i] for i in due])
+    out.update(zip(names, cached))
+    misses = [p for p in names if not out[p]]
+    if misses:
+        await _fill_or_negative("phys", ns, entity, misses, out, _db_loader("phys", session, ns, entity),
+                                lambda todo: _cached_phys(ns, entity, todo))
+    return out
+
+def _synonym_hit(payload: dict) -> dict:
+    """Mark a result that was resolved through `synonyms` rather than `logical_name`."""
+    return payload | {"matched_by": "synonym"}
+
+def _resolve_synonyms(out: Dict[str, dict | None], names: List[str], hits) -> List[str]:
+    """Fill `out` with synonym hits for `names`; return the names that are still unresolved."""
+    for n, hit in zip(names, hits):
+        if hit: out[n] = _synonym_hit(hit)
+    return [n for n in names if not out[n]]
+
+async def _cached_logi(ns, entity, names, due: List[dict] | None = None) -> Dict[str, dict | None]:
+    """Logical index first, then the synonym index for what is left."""
+    logi_due: List[int] = []
+    hits = await cache.get_logi_many(ns, entity, names, due=logi_due)
+    out: Dict[str, dict | None] = dict(zip(names, hits))
+    misses = [l for l, hit in out.items() if not hit]
+    syn_hits, syn_due = [], []
+    if misses:
+        syn_hits = await cache.get_syn_many(ns, entity, misses, due=syn_due)
+        _resolve_synonyms(out, misses, syn_hits)
+    if due is not None:
+        due.extend(hits[i] for i in logi_due)
+        due.extend(syn_hits[i] for i in syn_due)
+    return out
+
+async def _load_logi(session: AsyncSession, ns, entity, names) -> Dict[str, dict | None]:
+    epoch = cache.l1_epoch
+    payloads = await AttributeRepo(session).lookup_logical_many(ns, entity, names)
+    by_logi = {p["logical_name"]: p for p in payloads}
+    by_syn: Dict[str, dict] = {}
+    for p in payloads:
+        for syn in p["synonyms"] or (): by_syn.setdefault(syn, p)
     out: Dict[str, dict | None] = {}
-    misses: list[str] = []
-    for p in physical_names:
-        hit = await cache.get_phys(ns, entity, p)
-        if hit: out[p] = hit
-        else: misses.append(p)
-    for p in misses:
-        row = await repo.get_by_physical(ns, entity, p)
-        out[p] = row.__dict__ if row else None
-        if row: await cache.set_both(row.__dict__)
+    for l in names:
+        if l in by_logi: out[l] = by_logi[l]
+        elif l in by_syn: out[l] = _synonym_hit(by_syn[l])
+        else: out[l] = None
+    resolved = sum(1 for l in names if out[l])
+    record_lookups("logi", "db", resolved, len(names) - resolved)
+    await cache.set_many(payloads, notify=False, epoch=epoch)
     return out
 
 async def logical_to_physical(session: AsyncSession, ns: str, entity: str, logical_names: List[str]) -> Dict[str, dict | None]:
-    repo = AttributeRepo(session)
+    """Resolve logical names, falling back to attribute synonyms (business aliases).
+
+    An exact `logical_name` match always wins over a synonym; synonym matches carry
+    `"matched_by": "synonym"`.
+    """
+    names = list(dict.fromkeys(logical_names))
+    BATCH_SIZE.labels("logical_to_physical").observe(len(names))
+    warmup.record(ns, entity, len(names))
     out: Dict[str, dict | None] = {}
-    misses: list[str] = []
-    for l in logical_names:
-        hit = await cache.get_logi(ns, entity, l)
-        if hit: out[l] = hit
-        else: misses.append(l)
-    for l in misses:
-        row = await repo.get_by_logical(ns, entity, l)
-        out[l] = row.__dict__ if row else None
-        if row: await cache.set_both(row.__dict__)
+    tier, local = local_source()
+    if local is not None:
+        out = dict(zip(names, local.get_logi_many(ns, entity, names)))
+        misses = [l for l, hit in out.items() if not hit]
+        record_lookups("logi", tier, len(names) - len(misses), len(misses))
+        if misses:
+            left = _resolve_synonyms(out, misses, local.get_syn_many(ns, entity, misses))
+            record_lookups("syn", tier, len(misses) - len(left), len(left))
+            misses = left
+        # As in physical_to_logical: catalog misses go on to Redis/DB
+        names = misses
+        if tier == "snapshot" or not names: return out
+    due: List[dict] = []
+    out.update(await _cached_logi(ns, entity, names, due))
+    if due: _refresh_early(ns, entity, due)
+    misses = [l for l in names if not out[l]]
+    if misses:
+        await _fill_or_negative("logi", ns, entity, misses, out, _db_loader("logi", session, ns, entity),
+                                lambda todo: _cached_logi(ns, entity, todo))
+    return out
+
+_BATCH_LOADERS = {"phys": _load_phys, "logi": _load_logi}
+_CONVERTERS = {"physical_to_logical": physical_to_logical, "logical_to_physical": logical_to_physical}
+
+async def convert_batch(groups) -> List[dict]:
+    """Resolve many (namespace, entity, direction, names) groups, results in request order.
+
+    Groups for the same (namespace, entity, direction) are merged into one lookup, so they
+    share a single cache round trip and DB query. Distinct lookups run concurrently, at most
+    CONVERT_BATCH_CONCURRENCY at a time, each on its own session (a session is not safe to
+    share between tasks, and a pooled connection is only checked out on a cache miss).
+    """
+    merged: Dict[tuple, List[str]] = {}
+    for g in groups:
+        merged.setdefault((g.namespace, g.entity, g.direction), []).extend(g.names)
+    sem = asyncio.Semaphore(max(1, settings.convert_batch_concurrency))
+
+    async def run(key, names):
+        ns, entity, direction = key
+        async with sem:
+            async with SessionLocal() as session:
+                return key, await _CONVERTERS[direction](session, ns, entity, names)
+
+    resolved = dict(await asyncio.gather(*(run(k, names) for k, names in merged.items())))
+    out = []
+    for g in groups:
+        found = resolved[(g.namespace, g.entity, g.direction)]
+        out.append({"namespace": g.namespace, "entity": g.entity, "direction": g.direction,
+                    "results": {n: found.get(n) for n in g.names}})
     return out
@@ -0,0 +1,79 @@
+import asyncio
+import contextvars
+from typing import Awaitable, Callable, Hashable, Iterable
+from api.app.services.timing import begin, merge, stage
+
+class _Batch:
+    __slots__ = ("names", "callers", "future", "timer", "timings")
+
+    def __init__(self, loop):
+        self.names: dict = {}
+        self.callers = 0
+        self.future: asyncio.Future = loop.create_future()
+        self.timer: asyncio.TimerHandle | None = None
+        self.timings: dict = {}
+
+class MicroBatcher:
+    """Merges concurrent loads for the same key (e.g. (index, namespace, entity)) within this worker.
+
+    The first caller opens a batch and waits up to `window_ms`; names other callers ask for
+    meanwhile join it. The batch then runs as one `run(key, names) -> {name: value}` call, on its
+    own task so a cancelled caller doesn't cancel it for the others. A batch is sent early once it
+    holds `max_names`. With `window_ms <= 0` every call goes straight to `run`.
+    """
+    def __init__(self, run: Callable[[Hashable, list], Awaitable[dict]], window_ms: float, max_names: int,
+                 on_flush: Callable[[Hashable, int, int], None] | None = None):
+        self._run = run
+        self.window = window_ms / 1000
+        self.max_names = max(1, max_names)
+        self._on_flush = on_flush
+        self._open: dict[Hashable, _Batch] = {}
+        # Strong references to running batches
+        self._tasks: set[asyncio.Task] = set()
+
+    @property
+    def enabled(self) -> bool: return self.window > 0
+
+    def __len__(self): return len(self._open)
+
+    async def load(self, key: Hashable, names: Iterable) -> dict:
+        names = list(names)
+        if not self.enabled: return await self._run(key, names)
+        batch = self._open.get(key)
+        if batch is None:
+            loop = asyncio.get_running_loop()
+            batch = self._open[key] = _Batch(loop)
+            batch.timer = loop.call_later(self.window, self._flush, key, batch)
+        batch.names.update(dict.fromkeys(names))
+        batch.callers += 1
+        if len(batch.names) >= self.max_names: self._flush(key, batch)
+        # shield: a cancelled caller must not cancel the shared result
+        with stage("batch"):
+            try:
+                found = await asyncio.shield(batch.future)
+            finally:
+                # The batch recorded its db/orm time in its own context; each request waited for all of it
+                merge(batch.timings)
+        return {n: found.get(n) for n in names}
+
+    def _flush(self, key, batch: _Batch):
+        if self._open.get(key) is not batch: return  # already sent
+        del self._open[key]
+        batch.timer.cancel()
+        if self._on_flush: self._on_flush(key, batch.callers, len(batch.names))
+        # Fresh context: the batch serves several requests, not just the one that opened it
+        task = asyncio.create_task(self._send(key, batch), context=contextvars.Context())
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+    async def _send(self, key, batch: _Batch):
+        batch.timings = begin()
+        try:
+            batch.future.set_result(await self._run(key, list(batch.names)))
+        except asyncio.CancelledError:
+            batch.future.cancel()
+            raise
+        except Exception as e:
+            batch.future.set_exception(e)
+            # Callers re-raise it; don't log "exception was never retrieved" if they all left
+            batch.future.exception()
@@ -1,5 +1,11 @@
-import json, asyncio
+import asyncio
 import logging
+import math
+import random
+import time
+import uuid
+from collections import OrderedDict
+import orjson
 from redis.asyncio import Redis
 # redis exceptions location may differ across redis-py versions; try both
 try:
@@ -7,16 +13,137 @@ try:
 except Exception:
     from redis.asyncio import exceptions as redis_exceptions
 from api.app.config import settings
+from api.app.services.metrics import record_lookups, redis_error
+from api.app.services.timing import timed
 
 log = logging.getLogger(__name__)
 
 def _k_phys(ns, ent, phys): return f"attr:by_phys:{ns}:{ent}:{phys}"
 def _k_logi(ns, ent, logi): return f"attr:by_logi:{ns}:{ent}:{logi}"
+def _k_syn(ns, ent, syn): return f"attr:by_syn:{ns}:{ent}:{syn}"
+# Compact layout: each record stored once per entity hash (field = id), plus one name -> id hash per index
+def _k_rec(ns, ent): return f"attr:rec:{ns}:{ent}"
+def _k_idx(index, ns, ent): return f"attr:idx:{index}:{ns}:{ent}"
+def _k_lock(index, ns, ent, name): return f"attr:lock:{index}:{ns}:{ent}:{name}"
+# Negative cache: one Redis set of unknown names per (index, namespace, entity); index is
+# "phys" or "logi" (a logical miss means neither logical_name nor any synonym matched)
+def _k_neg(index, ns, ent): return f"attr:neg:{index}:{ns}:{ent}"
+# Bumped by every write to the entity, so a negative result computed before the write is not stored after it
+def _k_neg_gen(ns, ent): return f"attr:neg_gen:{ns}:{ent}"
+# Write generation of a namespace (None: of the whole catalog); ETags and cached responses are keyed by it
+def _k_gen(ns=None): return "attr:gen" if ns is None else f"attr:gen:{ns}"
+def _k_resp(digest): return f"attr:resp:{digest}"
+
+# L1 value for "known not to exist"
+_NEGATIVE = True
+
+LAYOUTS = ("legacy", "dual", "compact")
+_L1_KEY = {"phys": _k_phys, "logi": _k_logi, "syn": _k_syn}
+# Payload field a record must have for the looked-up name (compact index entries may lag an update)
+_NAME_FIELD = {"phys": "physical_name", "logi": "logical_name"}
+
+def _negative_members(ns, ent, phys, logi, synonyms=()) -> list[tuple[str, str]]:
+    """(set key, member) of every negative entry that a row with these names invalidates."""
+    return ([(_k_neg("phys", ns, ent), phys), (_k_neg("logi", ns, ent), logi)]
+            + [(_k_neg("logi", ns, ent), s) for s in synonyms or ()])
+
+# Resolve names through a compact index hash and return the records, in one round trip
+_COMPACT_GET = """
+local out = {}
+for i, name in ipairs(ARGV) do
+  local id = redis.call('HGET', KEYS[1], name)
+  out[i] = id and redis.call('HGET', KEYS[2], id) or false
+end
+return out
+"""
+
+# Deletes each lock only if this worker still owns it (it may have expired and been re-taken)
+_RELEASE_LOCKS = """
+local n = 0
+for _, k in ipairs(KEYS) do
+  if redis.call('GET', k) == ARGV[1] then n = n + redis.call('DEL', k) end
+end
+return n
+"""
+
+def entity_key_prefixes(ns, ent) -> dict[str, str]:
+    """Key prefix of each per-name index for one (namespace, entity), e.g. for SCAN-based audits (legacy layout)."""
+    return {"phys": _k_phys(ns, ent, ""), "logi": _k_logi(ns, ent, ""), "syn": _k_syn(ns, ent, "")}
+
+def entity_hash_keys(ns, ent) -> dict[str, str]:
+    """The hashes holding one (namespace, entity) in the compact layout: records by id and name -> id per index."""
+    return {"rec": _k_rec(ns, ent), "phys": _k_idx("phys", ns, ent), "logi": _k_idx("logi", ns, ent),
+            "syn": _k_idx("syn", ns, ent)}
+
+def namespace_key_prefixes(ns=None) -> dict[str, list[str]]:
+    """Prefixes of every key holding entries of namespace `ns` (None: any namespace), for SCANs:
+    "legacy" per-name keys and "compact" entity hashes."""
+    scope = "" if ns is None else f"{ns}:"
+    return {"legacy": [f"attr:by_{index}:{scope}" for index in ("phys", "logi", "syn")],
+            "compact": [f"attr:rec:{scope}"] + [f"attr:idx:{index}:{scope}" for index in ("phys", "logi", "syn")]}
+
+def name_key(index, ns, ent, name) -> str:
+    """Key of one name in `index` (phys/logi/syn): its Redis key in the legacy layout, its L1 key in every layout."""
+    return _L1_KEY[index](ns, ent, name)
+
+def _matches(index, name, payload) -> bool:
+    if index == "syn": return name in (payload.get("synonyms") or ())
+    return payload.get(_NAME_FIELD[index]) == name
+
+def payload_keys(payload) -> list[str]:
+    """Every key a payload is cached under: physical, logical and one per synonym."""
+    ns, ent = payload["namespace"], payload["entity"]
+    keys = [_k_phys(ns, ent, payload["physical_name"]), _k_logi(ns, ent, payload["logical_name"])]
+    keys.extend(_k_syn(ns, ent, s) for s in payload.get("synonyms") or ())
+    return keys
+
+def _row_names(payload) -> tuple:
+    return (payload["namespace"], payload["entity"], payload["physical_name"], payload["logical_name"],
+            payload.get("synonyms") or ())
+
+class LocalCache:
+    """Bounded in-process LRU with a per-entry TTL (the L1 in front of Redis).
+
+    Not thread-safe by design: it is only touched from the worker's event loop.
+    """
+    def __init__(self, max_entries: int, ttl: float):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._data: OrderedDict[str, tuple[float, dict]] = OrderedDict()
+
+    def __len__(self): return len(self._data)
+
+    def get(self, key):
+        item = self._data.get(key)
+        if item is None: return None
+        expires, value = item
+        if expires < time.monotonic():
+            del self._data[key]
+            return None
+        self._data.move_to_end(key)
+        return value
+
+    def set(self, key, value, ttl: float | None = None):
+        self._data[key] = (time.monotonic() + (self.ttl if ttl is None else ttl), value)
+        self._data.move_to_end(key)
+        while len(self._data) > self.max_entries:
+            self._data.popitem(last=False)
+
+    def discard(self, keys):
+        for k in keys: self._data.pop(k, None)
+
+    def clear(self): self._data.clear()
 
 class Cache:
     def __init__(self):
         self.enabled = settings.enable_cache and settings.redis_url is not None
         self.ttl = settings.cache_ttl_seconds
+        self.ttl_jitter = settings.cache_ttl_jitter
+        self.early_refresh = settings.cache_early_refresh_seconds
+        self.negative_ttl = settings.negative_cache_ttl_seconds
+        self.layout = settings.cache_layout if settings.cache_layout in LAYOUTS else "legacy"
+        # Cleared if the server rejects scripting; compact reads then take two round trips
+        self._lua = True
         self.redis: Redis | None = None
         if self.enabled:
             try:
@@ -24,55 +151,528 @@ class Cache:
             except Exception as e:
                 log.warning("Failed to create Redis client: %s", e)
                 self.redis = None
+        self.l1: LocalCache | None = None
+        if self.enabled and settings.l1_enabled:
+            self.l1 = LocalCache(settings.l1_max_entries, settings.l1_ttl_seconds)
+        # Identifies this worker's own invalidation messages so it can skip them
+        self.origin = uuid.uuid4().hex
+        self.channel = settings.cache_invalidation_channel
+        self._listener: asyncio.Task | None = None
+        # Bumped whenever the L1 drops entries; a Redis read that raced with an
+        # invalidation must not repopulate the L1 with what it read
+        self._l1_epoch = 0
+
+    @property
+    def l1_epoch(self) -> int:
+        """Take it before a DB read whose rows go to `set_many(..., epoch=...)`."""
+        return self._l1_epoch
 
     async def get_phys(self, ns, ent, phys):
-        if not self.redis: return None
+        return (await self._get_many("phys", ns, ent, [phys]))[0]
+
+    async def get_logi(self, ns, ent, logi):
+        return (await self._get_many("logi", ns, ent, [logi]))[0]
+
+    @timed("cache")
+    async def get_phys_many(self, ns, ent, phys_names, due=None):
+        """Batched `get_phys`: one Redis round trip, returns one entry (or None) per input name.
+
+        If a `due` list is given, the positions of Redis hits that should be refreshed
+        early (see `_refresh_due`) are appended to it.
+        """
+        return await self._get_many("phys", ns, ent, phys_names, due)
+
+    @timed("cache")
+    async def get_logi_many(self, ns, ent, logi_names, due=None):
+        """Batched `get_logi`: one Redis round trip, returns one entry (or None) per input name."""
+        return await self._get_many("logi", ns, ent, logi_names, due)
+
+    @timed("cache")
+    async def get_syn_many(self, ns, ent, synonyms, due=None):
+        """Look names up in the synonym index (the full payload of the attribute owning the synonym)."""
+        return await self._get_many("syn", ns, ent, synonyms, due)
+
+    async def get_entity(self, ns, ent) -> list[dict] | None:
+        """Every cached record of one (namespace, entity) with a single HGETALL.
+
+        Only the compact/dual layouts keep records per entity; returns None for legacy.
+        """
+        if not self.redis or self.layout == "legacy": return None
         try:
-            raw = await self.redis.get(_k_phys(ns, ent, phys))
-            return json.loads(raw) if raw else None
-        except redis_exceptions.ConnectionError as e:
-            log.warning("Redis connection error on get_phys: %s", e)
-            return None
+            return [orjson.loads(v) for v in (await self.redis.hgetall(_k_rec(ns, ent))).values()]
         except Exception as e:
-            log.exception("Redis get_phys unexpected error: %s", e)
+            redis_error("get_entity", e)
+            log.warning("Redis error reading entity %s/%s: %s", ns, ent, e)
             return None
 
-    async def get_logi(self, ns, ent, logi):
-        if not self.redis: return None
+    def _refresh_due(self, pttl_ms) -> bool:
+        """Probabilistic early expiration: the closer a key is to expiring, the likelier a
+        read triggers a refresh, so hot keys are rewritten before they expire and only
+        one of many concurrent readers (on average) does it."""
+        if pttl_ms is None or pttl_ms < 0: return False
+        return pttl_ms / 1000 < -self.early_refresh * math.log(1.0 - random.random())
+
+    def _expiry(self) -> int:
+        """TTL with random jitter so keys written together (bulk loads, refreshes) don't expire together."""
+        return self.ttl + random.randint(0, int(self.ttl * self.ttl_jitter)) if self.ttl_jitter > 0 else self.ttl
+
+    async def _get_many(self, index, ns, ent, names, due=None):
+        keys = [_L1_KEY[index](ns, ent, n) for n in names]
+        out = [self.l1.get(k) for k in keys] if self.l1 is not None else [None] * len(keys)
+        # Only the L1 misses go to Redis
+        pending = [i for i, hit in enumerate(out) if hit is None]
+        if self.l1 is not None: record_lookups(index, "l1", len(keys) - len(pending), len(pending))
+        if not self.redis or not pending: return out
+        epoch = self._l1_epoch
+        op = f"get_{index}_many"
+        track = due is not None and self.early_refresh > 0
         try:
-            raw = await self.redis.get(_k_logi(ns, ent, logi))
-            return json.loads(raw) if raw else None
+            if self.layout == "legacy":
+                raws, ttls = await self._fetch_legacy([keys[i] for i in pending], track)
+            else:
+                raws, ttls = await self._fetch_compact(index, ns, ent, [names[i] for i in pending], track)
+                if self.layout == "dual" and not all(raws):
+                    # Rollout: entries written before the compact layout was enabled
+                    rest = [n for n, raw in enumerate(raws) if not raw]
+                    more, more_ttls = await self._fetch_legacy([keys[pending[n]] for n in rest], track)
+                    for n, raw, ttl in zip(rest, more, more_ttls):
+                        raws[n], ttls[n] = raw, ttl
         except redis_exceptions.ConnectionError as e:
-            log.warning("Redis connection error on get_logi: %s", e)
+            redis_error(op, e)
+            log.warning("Redis connection error on %s: %s", op, e)
+            return out
+        except Exception as e:
+            redis_error(op, e)
+            log.exception("Redis %s unexpected error: %s", op, e)
+            return out
+        hits = 0
+        for n, (i, raw) in enumerate(zip(pending, raws)):
+            if not raw: continue
+            payload = orjson.loads(raw)
+            if not _matches(index, names[i], payload): continue
+            out[i] = self._fill_l1(keys[i], payload, epoch)
+            hits += 1
+            if track and self._refresh_due(ttls[n]): due.append(i)
+        record_lookups(index, "redis", hits, len(pending) - hits)
+        return out
+
+    async def _fetch_legacy(self, keys, track):
+        """MGET of per-name keys; with `track`, their remaining TTLs in the same round trip."""
+        if not track: return list(await self.redis.mget(keys)), [None] * len(keys)
+        pipe = self.redis.pipeline(transaction=False)
+        pipe.mget(keys)
+        for k in keys: pipe.pttl(k)
+        raws, *ttls = await pipe.execute()
+        return list(raws), ttls
+
+    async def _fetch_compact(self, index, ns, ent, names, track):
+        """Records for `names` through the entity's index hash (one EVAL, or two HMGETs without scripting)."""
+        idx, rec = _k_idx(index, ns, ent), _k_rec(ns, ent)
+        raws = None
+        if self._lua:
+            try:
+                pipe = self.redis.pipeline(transaction=False)
+                pipe.eval(_COMPACT_GET, 2, idx, rec, *names)
+                if track: pipe.pttl(rec)
+                res = await pipe.execute()
+                raws, ttl = list(res[0]), (res[1] if track else None)
+            except redis_exceptions.ResponseError as e:
+                if "unknown command" not in str(e).lower(): raise
+                log.warning("Redis scripting unavailable, compact reads fall back to two round trips")
+                self._lua = False
+        if raws is None:
+            ids = await self.redis.hmget(idx, names)
+            found = [i for i in ids if i]
+            pipe = self.redis.pipeline(transaction=False)
+            if found: pipe.hmget(rec, found)
+            if track: pipe.pttl(rec)
+            res = await pipe.execute() if found or track else []
+            by_id = dict(zip(found, res[0])) if found else {}
+            raws, ttl = [by_id.get(i) if i else None for i in ids], (res[-1] if track else None)
+        return raws, [ttl] * len(names)
+
+    def _fill_l1(self, key, value, epoch=None):
+        if self.l1 is not None and (epoch is None or epoch == self._l1_epoch): self.l1.set(key, value)
+        return value
+
+    def _drop_l1(self, keys=None):
+        self._l1_epoch += 1
+        if keys is None: self.l1.clear()
+        else: self.l1.discard(keys)
+
+    async def set_both(self, payload):
+        await self.set_many([payload])
+
+    @timed("cache")
+    async def set_many(self, payloads, notify: bool = True, epoch: int | None = None) -> bool:
+        """Write every key of every payload in one pipelined round trip.
+
+        `notify=False` skips the cross-worker invalidation broadcast; use it when
+        filling the cache from the DB on a read miss (nothing changed, so peers'
+        L1 entries are still valid). Otherwise the payloads' names are also removed
+        from the negative cache. With `epoch` (`l1_epoch` taken before the DB read),
+        the L1 is not filled if an invalidation happened since: the rows may predate it.
+        Returns False if the Redis write failed.
+        """
+        entries = []
+        for payload in payloads:
+            keys = payload_keys(payload)
+            for k in keys: self._fill_l1(k, payload, epoch)
+            entries.append((keys, payload))
+        if notify: self._drop_l1_negatives([_row_names(p) for _, p in entries])
+        if not self.redis or not entries: return True
+        try:
+            # Bounded pipelines so a very large batch doesn't build one giant request/reply
+            step = settings.cache_pipeline_chunk
+            for start in range(0, len(entries), step):
+                part = entries[start:start + step]
+                pipe = self.redis.pipeline(transaction=False)
+                if self.layout != "compact":
+                    for keys, payload in part:
+                        raw, ex = orjson.dumps(payload), self._expiry()
+                        for k in keys: pipe.set(k, raw, ex=ex)
+                if self.layout != "legacy": self._queue_compact_set(pipe, [p for _, p in part])
+                neg_keys = self._queue_forget_missing(pipe, [_row_names(p) for _, p in part]) if notify else []
+                gen_keys = self._queue_bump(pipe, {p["namespace"] for _, p in part}) if notify else []
+                await pipe.execute()
+                if notify:
+                    self._drop_l1_generations(gen_keys)
+                    await self._publish([k for keys, _ in part for k in keys] + neg_keys + gen_keys)
+            return True
+        except redis_exceptions.ConnectionError as e:
+            redis_error("set_many", e)
+            log.warning("Redis connection error on set_many: %s", e)
+        except Exception as e:
+            redis_error("set_many", e)
+            log.exception("Unexpected error writing to Redis cache: %s", e)
+        return False
+
+    def _queue_compact_set(self, pipe, payloads):
+        """Queue one HSET per hash for the records and their name -> id index entries."""
+        by_entity: dict[tuple, dict[str, dict]] = {}
+        for p in payloads:
+            h = by_entity.setdefault((p["namespace"], p["entity"]), {"rec": {}, "phys": {}, "logi": {}, "syn": {}})
+            h["rec"][p["id"]] = orjson.dumps(p)
+            h["phys"][p["physical_name"]] = p["id"]
+            h["logi"][p["logical_name"]] = p["id"]
+            for syn in p.get("synonyms") or (): h["syn"][syn] = p["id"]
+        for (ns, ent), hashes in by_entity.items():
+            ex = self._expiry()
+            for name, key in entity_hash_keys(ns, ent).items():
+                if not hashes[name]: continue
+                pipe.hset(key, mapping=hashes[name])
+                # One TTL per hash: refreshed by every write to the entity
+                pipe.expire(key, ex)
+
+    async def _queue_compact_delete(self, pipe, entries):
+        """Queue removal of the index entries and records of `entries` ((ns, ent, phys, logi, synonyms)).
+
+        Record ids are looked up through the index first (one extra round trip).
+        """
+        lookups = []
+        look = self.redis.pipeline(transaction=False)
+        for ns, ent, phys, logi, syns in entries:
+            names = {"phys": [phys], "logi": [logi], "syn": list(syns or ())}
+            for index, fields in names.items():
+                if not fields: continue
+                key = _k_idx(index, ns, ent)
+                look.hmget(key, fields)
+                lookups.append((ns, ent, key, fields))
+        ids_per_lookup = await look.execute() if lookups else []
+        for (ns, ent, key, fields), ids in zip(lookups, ids_per_lookup):
+            pipe.hdel(key, *fields)
+            ids = [i for i in ids if i]
+            if ids: pipe.hdel(_k_rec(ns, ent), *ids)
+
+    @timed("cache")
+    async def get_missing(self, index, ns, ent, names) -> tuple[list[bool], tuple]:
+        """Which `names` are cached as unknown; one SMISMEMBER for the L1 misses.
+
+        Also returns a token to pass to `set_missing` after the DB lookup, so that a
+        negative result is not stored if the entity was written in the meantime.
+        """
+        set_key = _k_neg(index, ns, ent)
+        out = [self.l1.get(f"{set_key}:{n}") is not None for n in names] if self.l1 is not None else [False] * len(names)
+        epoch = self._l1_epoch
+        pending = [i for i, hit in enumerate(out) if not hit]
+        gen = None
+        if self.redis and self.negative_ttl > 0:
+            try:
+                pipe = self.redis.pipeline(transaction=False)
+                pipe.get(_k_neg_gen(ns, ent))
+                if pending: pipe.smismember(set_key, [names[i] for i in pending])
+                gen, *member = await pipe.execute()
+                for i, m in zip(pending, member[0] if member else ()):
+                    if m:
+                        out[i] = True
+                        self._fill_l1_negative(f"{set_key}:{names[i]}", epoch)
+            except Exception as e:
+                redis_error("get_missing", e)
+                log.warning("Redis error reading negative cache: %s", e)
+                return out, (False, epoch)
+        hits = sum(out)
+        record_lookups(index, "negative", hits, len(names) - hits)
+        return out, (gen, epoch)
+
+    @timed("cache")
+    async def set_missing(self, index, ns, ent, names, token):
+        """Cache `names` as unknown for NEGATIVE_CACHE_TTL_SECONDS (the set expires as a whole)."""
+        if not names or self.negative_ttl <= 0: return
+        gen, epoch = token
+        set_key = _k_neg(index, ns, ent)
+        for n in names: self._fill_l1_negative(f"{set_key}:{n}", epoch)
+        # gen False: Redis failed while reading, don't trust it now
+        if not self.redis or gen is False: return
+        gen_key = _k_neg_gen(ns, ent)
+        try:
+            async with self.redis.pipeline(transaction=True) as pipe:
+                await pipe.watch(gen_key)
+                if await pipe.get(gen_key) != gen: return
+                pipe.multi()
+                pipe.sadd(set_key, *names)
+                # NX: new members don't extend the life of the set, so nothing outlives the TTL by much
+                pipe.expire(set_key, int(self.negative_ttl), nx=True)
+                await pipe.execute()
+        except redis_exceptions.WatchError:
+            pass
+        except Exception as e:
+            redis_error("set_missing", e)
+            log.warning("Redis error writing negative cache: %s", e)
+
+    def _fill_l1_negative(self, key, epoch):
+        if self.l1 is not None and epoch == self._l1_epoch:
+            self.l1.set(key, _NEGATIVE, ttl=min(self.l1.ttl, self.negative_ttl))
+
+    def _drop_l1_negatives(self, names):
+        if self.l1 is None or not names: return
+        self._drop_l1([f"{k}:{m}" for entry in names for k, m in _negative_members(*entry)])
+
+    def _queue_forget_missing(self, pipe, names) -> list[str]:
+        """Queue removal of `names` from the negative sets; returns the L1 keys peers must drop."""
+        l1_keys, gens = [], set()
+        for entry in names:
+            for set_key, member in _negative_members(*entry):
+                pipe.srem(set_key, member)
+                l1_keys.append(f"{set_key}:{member}")
+            gens.add(_k_neg_gen(entry[0], entry[1]))
+        for g in gens: pipe.incr(g)
+        return l1_keys
+
+    @timed("cache")
+    async def generations(self, namespaces) -> list[int] | None:
+        """Current write generation of each namespace (None: the whole catalog), or None without Redis."""
+        keys = [_k_gen(ns) for ns in namespaces]
+        out = [self.l1.get(k) for k in keys] if self.l1 is not None else [None] * len(keys)
+        epoch = self._l1_epoch
+        todo = [i for i, g in enumerate(out) if g is None]
+        if not todo: return out
+        if not self.redis: return None
+        try:
+            pipe = self.redis.pipeline(transaction=False)
+            for i in todo: self._queue_init_generation(pipe, keys[i]).get(keys[i])
+            res = await pipe.execute()
+        except Exception as e:
+            redis_error("generation", e)
+            log.warning("Redis error reading write generations: %s", e)
             return None
+        for j, i in enumerate(todo): out[i] = self._fill_l1(keys[i], int(res[2 * j + 1]), epoch)
+        return out
+
+    async def bump_generations(self, namespaces=None):
+        """Invalidate ETags and cached responses for `namespaces` (None: every namespace) after
+        changes the write paths don't see, e.g. SQL run directly against the DB."""
+        if not self.redis: return
+        try:
+            if namespaces is None:
+                keys = {_k_gen()}
+                async for k in self.redis.scan_iter(match=_k_gen("*"), count=1000):
+                    keys.add(k.decode() if isinstance(k, bytes) else k)
+                pipe = self.redis.pipeline(transaction=False)
+                for k in keys: self._queue_init_generation(pipe, k).incr(k)
+                keys = list(keys)
+            else:
+                pipe = self.redis.pipeline(transaction=False)
+                keys = self._queue_bump(pipe, namespaces)
+            await pipe.execute()
+            self._drop_l1_generations(keys)
+            await self._publish(keys)
         except Exception as e:
-            log.exception("Redis get_logi unexpected error: %s", e)
+            redis_error("generation", e)
+            log.warning("Failed to bump write generations: %s", e)
+
+    @staticmethod
+    def _queue_init_generation(pipe, key):
+        # Start from the clock rather than 0: a counter lost to eviction must not repeat old values (and ETags)
+        return pipe.set(key, time.time_ns(), nx=True)
+
+    def _queue_bump(self, pipe, namespaces) -> list[str]:
+        """Queue increments of the generations of `namespaces` and of the whole catalog; returns their keys."""
+        keys = [_k_gen(ns) for ns in set(namespaces)] + [_k_gen()]
+        for k in keys: self._queue_init_generation(pipe, k).incr(k)
+        return keys
+
+    def _drop_l1_generations(self, keys):
+        if self.l1 is not None and keys: self._drop_l1(keys)
+
+    @timed("cache")
+    async def get_response(self, digest) -> bytes | None:
+        key = _k_resp(digest)
+        body = self.l1.get(key) if self.l1 is not None else None
+        if body is not None or not self.redis: return body
+        try:
+            body = await self.redis.get(key)
+        except Exception as e:
+            redis_error("get_response", e)
+            log.warning("Redis error reading cached response: %s", e)
             return None
+        return self._fill_l1(key, body) if body is not None else None
 
-    async def set_both(self, payload):
+    @timed("cache")
+    async def set_response(self, digest, body: bytes, ttl: float):
+        """Cache a rendered response; it is never invalidated, the digest changes with the generation."""
+        key = _k_resp(digest)
+        if self.l1 is not None: self.l1.set(key, body, ttl=min(self.l1.ttl, ttl))
         if not self.redis: return
-        ns, ent = payload["namespace"], payload["entity"]
-        phys, logi = payload["physical_name"], payload["logical_name"]
-        raw = json.dumps(payload)
         try:
-            await asyncio.gather(
-                self.redis.set(_k_phys(ns, ent, phys), raw, ex=self.ttl),
-                self.redis.set(_k_logi(ns, ent, logi), raw, ex=self.ttl)
-            )
+            await self.redis.set(key, body, px=int(ttl * 1000))
+        except Exception as e:
+            redis_error("set_response", e)
+            log.warning("Redis error caching response: %s", e)
+
+    async def acquire_fill_locks(self, index, ns, ent, names, ttl_ms: int) -> list[bool]:
+        """Try to become the worker that loads each name from the DB (SET NX PX, one round trip).
+
+        Without Redis every lock is "acquired": there is nobody to coordinate with.
+        """
+        if not self.redis or not names: return [True] * len(names)
+        try:
+            pipe = self.redis.pipeline(transaction=False)
+            for n in names: pipe.set(_k_lock(index, ns, ent, n), self.origin, nx=True, px=ttl_ms)
+            return [bool(r) for r in await pipe.execute()]
+        except Exception as e:
+            redis_error("lock", e)
+            log.warning("Failed to take cache fill locks: %s", e)
+            return [True] * len(names)
+
+    async def fill_locks_held(self, index, ns, ent, names) -> list[bool]:
+        if not self.redis or not names: return [False] * len(names)
+        try:
+            pipe = self.redis.pipeline(transaction=False)
+            for n in names: pipe.exists(_k_lock(index, ns, ent, n))
+            return [bool(r) for r in await pipe.execute()]
+        except Exception as e:
+            redis_error("lock", e)
+            return [False] * len(names)
+
+    async def release_fill_locks(self, index, ns, ent, names):
+        if not self.redis or not names: return
+        try:
+            await self.redis.eval(_RELEASE_LOCKS, len(names), *[_k_lock(index, ns, ent, n) for n in names], self.origin)
+        except Exception as e:
+            # They expire on their own shortly
+            redis_error("unlock", e)
+            log.warning("Failed to release cache fill locks: %s", e)
+
+    async def invalidate(self, ns, ent, phys, logi, synonyms=()):
+        await self.invalidate_many([(ns, ent, phys, logi, synonyms)])
+
+    async def invalidate_many(self, entries):
+        """Batched `invalidate`: `entries` are (ns, ent, phys, logi, synonyms) tuples, deleted in one round trip
+        (two for the compact layout, which resolves record ids first).
+
+        The names are also removed from the negative cache: an invalidation means they may exist now.
+        """
+        if not entries: return
+        keys = [k for ns, ent, phys, logi, syns in entries
+                for k in [_k_phys(ns, ent, phys), _k_logi(ns, ent, logi)] + [_k_syn(ns, ent, s) for s in syns or ()]]
+        if self.l1 is not None: self._drop_l1(keys)
+        self._drop_l1_negatives(entries)
+        if not self.redis: return
+        try:
+            pipe = self.redis.pipeline(transaction=False)
+            if self.layout != "compact": pipe.delete(*keys)
+            if self.layout != "legacy": await self._queue_compact_delete(pipe, entries)
+            neg_keys = self._queue_forget_missing(pipe, entries)
+            gen_keys = self._queue_bump(pipe, {e[0] for e in entries})
+            await pipe.execute()
+            self._drop_l1_generations(gen_keys)
+            await self._publish(keys + neg_keys + gen_keys)
         except redis_exceptions.ConnectionError as e:
-            # Don't let cache failures break the request path
-            log.warning("Redis connection error on set_both: %s", e)
+            redis_error("delete", e)
+            log.warning("Redis connection error on invalidate: %s", e)
         except Exception as e:
-            log.exception("Unexpected error writing to Redis cache: %s", e)
+            redis_error("delete", e)
+            log.exception("Unexpected error deleting Redis keys: %s", e)
 
-    async def invalidate(self, ns, ent, phys, logi):
+    async def delete_keys(self, keys):
+        """Delete raw cache keys everywhere (Redis and every worker's L1)."""
+        if not keys: return
+        if self.l1 is not None: self._drop_l1(keys)
         if not self.redis: return
         try:
-            await self.redis.delete(_k_phys(ns, ent, phys))
-            await self.redis.delete(_k_logi(ns, ent, logi))
+            await self.redis.delete(*keys)
+            await self._publish(keys)
         except redis_exceptions.ConnectionError as e:
+            redis_error("delete", e)
             log.warning("Redis connection error on invalidate: %s", e)
         except Exception as e:
+            redis_error("delete", e)
             log.exception("Unexpected error deleting Redis keys: %s", e)
 
+    async def _publish(self, keys):
+        """Tell the other workers/pods to drop `keys` from their L1 (`None` drops everything)."""
+        if self.l1 is None: return
+        msg = {"origin": self.origin, "all": True} if keys is None else {"origin": self.origin, "keys": list(keys)}
+        await self.redis.publish(self.channel, orjson.dumps(msg))
+
+    async def clear_l1(self):
+        """Drop every worker's L1 (after bulk rewrites, where per-key messages would be huge)."""
+        if self.l1 is None: return
+        self._drop_l1()
+        if not self.redis: return
+        try:
+            await self._publish(None)
+        except Exception as e:
+            redis_error("publish", e)
+            log.warning("Failed to broadcast L1 clear: %s", e)
+
+    async def start_listener(self):
+        """Start the background pub/sub subscriber that applies peers' L1 invalidations."""
+        if self.l1 is not None and self.redis and self._listener is None:
+            self._listener = asyncio.create_task(self._listen())
+
+    async def stop_listener(self):
+        if self._listener is None: return
+        self._listener.cancel()
+        try:
+            await self._listener
+        except asyncio.CancelledError:
+            pass
+        self._listener = None
+
+    async def _listen(self):
+        while True:
+            pubsub = self.redis.pubsub(ignore_subscribe_messages=True)
+            try:
+                await pubsub.subscribe(self.channel)
+                # Anything published while we were not subscribed is lost, so start clean
+                self._drop_l1()
+                async for msg in pubsub.listen():
+                    if msg.get("type") != "message": continue
+                    try:
+                        data = orjson.loads(msg["data"])
+                    except (TypeError, ValueError):
+                        continue
+                    if data.get("origin") == self.origin: continue
+                    self._drop_l1(None if data.get("all") else (data.get("keys") or ()))
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                redis_error("subscribe", e)
+                log.warning("Cache invalidation listener error, resubscribing: %s", e)
+                self._drop_l1()
+                await asyncio.sleep(1)
+            finally:
+                await pubsub.aclose()
+
 cache = Cache()
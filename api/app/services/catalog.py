@@ -0,0 +1,356 @@
+"""Compiled catalog: the active attributes in one read-only file that every worker mmaps (CATALOG_MODE=true).
+
+Unlike a snapshot, the catalog is not copied into each worker: the OS page cache holds one copy
+that all workers on the host share, and opening a generation costs an mmap, not a DB load.
+
+File layout (little endian; sections 8-byte aligned):
+  header      magic, format version, generation, write generation it includes, row count,
+              (offset, count) of each section below
+  str_offsets uint32[n+1]  start of string i in str_blob; strings are interned and sorted by UTF-8 bytes,
+                           so comparing string ids compares the strings
+  str_blob    UTF-8 bytes
+  records     RECORD per active attribute: id, version and string ids of every payload field
+              (synonyms/tags/metadata as JSON text)
+  dir_keys    uint64 (namespace id << 32 | entity id), sorted: one per (namespace, entity)
+  dir_vals    uint32[6] per entity: [start, end) into idx_* for the phys, logi and syn indexes
+  idx_keys    uint32 name string ids, sorted within each entity's index slice
+  idx_vals    uint32 record number of each name
+
+A lookup is a binary search for the name's string id, one for the entity and one in the
+entity's index slice: O(log n), no hashing or per-worker structures.
+
+Generations are published into CATALOG_DIR as `catalog-{generation}.bin`. The `current` symlink
+is then swapped with an atomic rename. Workers check it every CATALOG_POLL_SECONDS and map the
+new file. The file is compiled by `python -m api.app.jobs.compile_catalog` or
+`POST /v1/cache/catalog/compile`; the first worker to start with no catalog compiles one, and a
+worker that sees writes newer than the mapped file (the catalog-wide write generation in Redis)
+compiles the next one, at most every CATALOG_RECOMPILE_SECONDS.
+"""
+import asyncio
+import bisect
+import fcntl
+import functools
+import glob
+import logging
+import mmap
+import os
+import struct
+import time
+import orjson
+from api.app.config import settings
+
+log = logging.getLogger(__name__)
+
+MAGIC = b"ATTRCAT1"
+FORMAT_VERSION = 2
+NONE = 0xFFFFFFFF  # string id of a NULL field
+SECTIONS = ("str_offsets", "str_blob", "records", "dir_keys", "dir_vals", "idx_keys", "idx_vals")
+HEADER = struct.Struct("<8sIQQQ" + "QQ" * len(SECTIONS))
+# id, version, then string ids in this order
+STR_FIELDS = ("namespace", "entity", "category", "logical_name", "physical_name", "data_type", "description",
+              "source_system", "created_by", "updated_by", "synonyms", "tags", "metadata")
+RECORD = struct.Struct("<qI" + "I" * len(STR_FIELDS))
+_JSON_FIELDS = ("synonyms", "tags", "metadata")
+_INDEXES = ("phys", "logi", "syn")
+KEEP_GENERATIONS = 3
+STR_CACHE_SIZE = 4096
+
+def _align(n: int) -> int: return (n + 7) & ~7
+
+def compile_rows(rows, generation: int, writes: int = 0) -> bytes:
+    """Serialize `rows` (dicts with the payload fields; synonyms a list, tags/metadata JSON text) into the file format.
+
+    Rows must be ordered by id: a synonym shared by several rows resolves to the first one, as in snapshot mode.
+    `writes` is the write generation the rows were read at (0: unknown).
+    """
+    records = []
+    for r in rows:
+        vals = {f: r.get(f) for f in STR_FIELDS}
+        vals["synonyms"] = orjson.dumps(list(r.get("synonyms") or [])).decode()
+        vals["tags"] = r.get("tags") or "[]"
+        vals["metadata"] = r.get("metadata") or "{}"
+        records.append((r["id"], r["version"], vals))
+
+    strings = sorted({v for _, _, vals in records for v in vals.values() if v is not None} |
+                     {s for _, _, vals in records for s in orjson.loads(vals["synonyms"])},
+                     key=lambda s: s.encode())
+    sid = {s: i for i, s in enumerate(strings)}
+    encoded = [s.encode() for s in strings]
+    offsets, pos = [], 0
+    for b in encoded:
+        offsets.append(pos)
+        pos += len(b)
+    offsets.append(pos)
+
+    entities: dict[tuple[int, int], dict[str, dict[int, int]]] = {}
+    rec_bytes = bytearray()
+    for n, (id_, version, vals) in enumerate(records):
+        rec_bytes += RECORD.pack(id_, version, *(NONE if vals[f] is None else sid[vals[f]] for f in STR_FIELDS))
+        idx = entities.setdefault((sid[vals["namespace"]], sid[vals["entity"]]), {i: {} for i in _INDEXES})
+        idx["phys"].setdefault(sid[vals["physical_name"]], n)
+        idx["logi"].setdefault(sid[vals["logical_name"]], n)
+        for syn in orjson.loads(vals["synonyms"]): idx["syn"].setdefault(sid[syn], n)
+
+    dir_keys, dir_vals, idx_keys, idx_vals = [], [], [], []
+    for (ns, ent) in sorted(entities):
+        dir_keys.append(ns << 32 | ent)
+        for name in _INDEXES:
+            start = len(idx_keys)
+            for key in sorted(entities[(ns, ent)][name]):
+                idx_keys.append(key)
+                idx_vals.append(entities[(ns, ent)][name][key])
+            dir_vals += [start, len(idx_keys)]
+
+    bodies = {
+        "str_offsets": (struct.pack(f"<{len(offsets)}I", *offsets), len(offsets)),
+        "str_blob": (b"".join(encoded), pos),
+        "records": (bytes(rec_bytes), len(records)),
+        "dir_keys": (struct.pack(f"<{len(dir_keys)}Q", *dir_keys), len(dir_keys)),
+        "dir_vals": (struct.pack(f"<{len(dir_vals)}I", *dir_vals), len(dir_vals)),
+        "idx_keys": (struct.pack(f"<{len(idx_keys)}I", *idx_keys), len(idx_keys)),
+        "idx_vals": (struct.pack(f"<{len(idx_vals)}I", *idx_vals), len(idx_vals)),
+    }
+    out = bytearray(_align(HEADER.size))
+    table = []
+    for name in SECTIONS:
+        body, count = bodies[name]
+        table += [len(out), count]
+        out += body + b"\0" * (_align(len(body)) - len(body))
+    HEADER.pack_into(out, 0, MAGIC, FORMAT_VERSION, generation, writes, len(records), *table)
+    return bytes(out)
+
+class _Strings:
+    """The sorted string table as a sequence of bytes, for bisect."""
+    def __init__(self, offsets, blob):
+        self.offsets, self.blob = offsets, blob
+
+    def __len__(self): return len(self.offsets) - 1
+
+    def __getitem__(self, i): return bytes(self.blob[self.offsets[i]:self.offsets[i + 1]])
+
+class CatalogFile:
+    """One mapped generation. Lookups have the same shape as `Snapshot`'s."""
+    def __init__(self, path: str):
+        self.path = path
+        with open(path, "rb") as f:
+            self._mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, version, self.generation, self.writes, self.rows, *table = HEADER.unpack_from(self._mm, 0)
+        if magic != MAGIC or version != FORMAT_VERSION:
+            raise ValueError(f"{path}: not a compiled catalog (format {version})")
+        mv = memoryview(self._mm)
+        sec = {name: (table[2 * i], table[2 * i + 1]) for i, name in enumerate(SECTIONS)}
+
+        def view(name, fmt, width):
+            off, count = sec[name]
+            return mv[off:off + count * width].cast(fmt)
+        self._offsets = view("str_offsets", "I", 4)
+        self._blob = mv[sec["str_blob"][0]:sec["str_blob"][0] + sec["str_blob"][1]]
+        self._records = mv[sec["records"][0]:sec["records"][0] + sec["records"][1] * RECORD.size]
+        self._dir_keys = view("dir_keys", "Q", 8)
+        self._dir_vals = view("dir_vals", "I", 4)
+        self._idx_keys = view("idx_keys", "I", 4)
+        self._idx_vals = view("idx_vals", "I", 4)
+        self._strings = _Strings(self._offsets, self._blob)
+        self.entities = len(self._dir_keys)
+        self.size = len(self._mm)
+        # Namespaces, entities, categories, types, "[]"/"{}" repeat across records: a small per-worker memo
+        self._str = functools.lru_cache(maxsize=STR_CACHE_SIZE)(self._decode)
+
+    def _decode(self, i: int) -> str | None:
+        if i == NONE: return None
+        return str(self._blob[self._offsets[i]:self._offsets[i + 1]], "utf-8")
+
+    def _sid(self, s: str) -> int | None:
+        b = s.encode()
+        i = bisect.bisect_left(self._strings, b)
+        return i if i < len(self._strings) and self._strings[i] == b else None
+
+    def _slice(self, ns: str, ent: str, index: str) -> tuple[int, int] | None:
+        ns_id, ent_id = self._sid(ns), self._sid(ent)
+        if ns_id is None or ent_id is None: return None
+        key = ns_id << 32 | ent_id
+        i = bisect.bisect_left(self._dir_keys, key)
+        if i == len(self._dir_keys) or self._dir_keys[i] != key: return None
+        k = 6 * i + 2 * _INDEXES.index(index)
+        return self._dir_vals[k], self._dir_vals[k + 1]
+
+    def payload(self, n: int) -> dict:
+        id_, version, *ids = RECORD.unpack_from(self._records, n * RECORD.size)
+        out = dict(zip(STR_FIELDS, map(self._str, ids)))
+        for f in _JSON_FIELDS: out[f] = orjson.loads(out[f])
+        out.update(id=id_, version=version, is_active=True)
+        return out
+
+    def get_many(self, index: str, ns: str, ent: str, names) -> list[dict | None]:
+        bounds = self._slice(ns, ent, index)
+        if bounds is None: return [None] * len(names)
+        lo, hi = bounds
+        out = []
+        for name in names:
+            sid = self._sid(name)
+            i = bisect.bisect_left(self._idx_keys, sid, lo, hi) if sid is not None else hi
+            out.append(self.payload(self._idx_vals[i]) if i < hi and self._idx_keys[i] == sid else None)
+        return out
+
+    def close(self):
+        self._str.cache_clear()
+        for v in (self._offsets, self._blob, self._records, self._dir_keys, self._dir_vals, self._idx_keys, self._idx_vals):
+            v.release()
+        try:
+            self._mm.close()
+        except BufferError:
+            # A view is still alive somewhere; the mapping goes when it does
+            pass
+
+def _current_link(directory: str) -> str: return os.path.join(directory, "current")
+
+def publish(data: bytes, generation: int, directory: str | None = None) -> str:
+    """Write a compiled generation and point `current` at it atomically; prunes old generations."""
+    directory = directory or settings.catalog_dir
+    os.makedirs(directory, exist_ok=True)
+    name = f"catalog-{generation}.bin"
+    path = os.path.join(directory, name)
+    tmp = f"{path}.tmp.{os.getpid()}"
+    with open(tmp, "wb") as f:
+        f.write(data)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp, path)
+    link_tmp = f"{_current_link(directory)}.tmp.{os.getpid()}"
+    os.symlink(name, link_tmp)
+    os.replace(link_tmp, _current_link(directory))
+    # Workers still mapping a pruned file keep reading it; the inode lives until they unmap
+    old = sorted(glob.glob(os.path.join(directory, "catalog-*.bin")), key=os.path.getmtime)[:-KEEP_GENERATIONS]
+    for p in old:
+        if p != path: os.unlink(p)
+    return path
+
+def _published_writes(directory: str) -> int | None:
+    """Write generation of the file `current` points at; None if there is none this version can map."""
+    try:
+        with open(_current_link(directory), "rb") as f:
+            magic, version, _, writes, *_ = HEADER.unpack(f.read(HEADER.size))
+    except (OSError, struct.error):
+        return None
+    return writes if magic == MAGIC and version == FORMAT_VERSION else None
+
+async def write_generation() -> int:
+    """The catalog-wide write generation in Redis (0 without Redis): every write bumps it."""
+    from api.app.services.cache import cache
+    gens = await cache.generations([None])
+    return gens[0] if gens else 0
+
+async def compile_catalog(directory: str | None = None) -> dict:
+    """Read the active catalog from Postgres, compile it and publish a new generation."""
+    import asyncpg
+    from api.app.repo.bulk import payload_columns
+    from api.app.repo.db import asyncpg_connect_kwargs
+    started = time.monotonic()
+    # Read before the rows: a write landing during the read leaves the file behind, not marked current
+    writes = await write_generation()
+    conn = await asyncpg.connect(**asyncpg_connect_kwargs())
+    try:
+        rows = await conn.fetch(f"SELECT {payload_columns()} FROM meta.attribute WHERE is_active ORDER BY id")
+    finally:
+        await conn.close()
+    generation = time.time_ns()
+    # Sorting and packing are CPU-bound: keep them off the event loop
+    data = await asyncio.to_thread(compile_rows, [dict(r) for r in rows], generation, writes)
+    path = await asyncio.to_thread(publish, data, generation, directory)
+    log.info("Compiled catalog generation %s: %s rows, %s bytes in %.2fs", generation, len(rows), len(data),
+             time.monotonic() - started)
+    return {"generation": generation, "writes": writes, "rows": len(rows), "bytes": len(data), "path": path}
+
+class Catalog:
+    """The worker's view of the current compiled catalog (CATALOG_MODE=true)."""
+    def __init__(self):
+        self.enabled = settings.catalog_mode
+        self.file: CatalogFile | None = None
+        self._target: str | None = None
+        self._task: asyncio.Task | None = None
+
+    @property
+    def ready(self) -> bool: return self.file is not None
+
+    @property
+    def generation(self) -> int | None: return self.file.generation if self.file else None
+
+    def get_phys_many(self, ns, ent, names): return self.file.get_many("phys", ns, ent, names)
+
+    def get_logi_many(self, ns, ent, names): return self.file.get_many("logi", ns, ent, names)
+
+    def get_syn_many(self, ns, ent, names): return self.file.get_many("syn", ns, ent, names)
+
+    def reload(self) -> bool:
+        """Map the generation `current` points at, if it changed. Returns True on a swap."""
+        link = _current_link(settings.catalog_dir)
+        try:
+            target = os.readlink(link)
+        except OSError:
+            return False
+        if target == self._target: return False
+        fresh = CatalogFile(os.path.join(settings.catalog_dir, target))
+        # Lookups run synchronously on the event loop, so none is using the old mapping now
+        old, self.file, self._target = self.file, fresh, target
+        if old is not None: old.close()
+        log.info("Mapped catalog generation %s (%s rows, %s entities)", fresh.generation, fresh.rows, fresh.entities)
+        return True
+
+    async def _ensure_compiled(self, writes: int = 0):
+        """Compile unless the published file can be mapped and includes write generation `writes`.
+
+        One worker compiles; the others wait on the lock, then find its result and map that.
+        """
+        os.makedirs(settings.catalog_dir, exist_ok=True)
+        lock = open(os.path.join(settings.catalog_dir, ".compile.lock"), "w")
+        try:
+            await asyncio.to_thread(fcntl.flock, lock, fcntl.LOCK_EX)
+            published = _published_writes(settings.catalog_dir)
+            if published is None or published < writes: await compile_catalog()
+        finally:
+            lock.close()
+
+    async def _catch_up(self):
+        """Recompile once writes landed since the mapped file was read, and it is CATALOG_RECOMPILE_SECONDS old."""
+        f = self.file
+        if f is None or settings.catalog_recompile_seconds <= 0: return
+        if time.time() - f.generation / 1e9 < settings.catalog_recompile_seconds: return
+        writes = await write_generation()
+        if writes > f.writes: await self._ensure_compiled(writes)
+
+    async def start(self):
+        if not self.enabled or self._task is not None: return
+        try:
+            await self._ensure_compiled()
+            self.reload()
+        except Exception as e:
+            # Not fatal: conversions use the Redis/DB path until a generation can be mapped
+            log.warning("Could not map the compiled catalog: %s", e)
+        self._task = asyncio.create_task(self._run())
+
+    async def _run(self):
+        while True:
+            await asyncio.sleep(settings.catalog_poll_seconds)
+            try:
+                await self._catch_up()
+                self.reload()
+            except Exception as e:
+                log.warning("Could not refresh the compiled catalog: %s", e)
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    def status(self) -> dict:
+        f = self.file
+        return {"enabled": self.enabled, "ready": self.ready, "generation": f.generation if f else None,
+                "writes": f.writes if f else None,
+                "rows": f.rows if f else 0, "entities": f.entities if f else 0, "file_bytes": f.size if f else 0,
+                "path": f.path if f else None}
+
+catalog = Catalog()
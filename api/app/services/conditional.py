@@ -0,0 +1,64 @@
+"""ETags and a response cache for read endpoints.
+
+Every write bumps the write generation of its namespace (and of the whole catalog), see
+`Cache.generations`. A response is identified by the generations it depends on plus the
+request itself, so:
+  - a client repeating a request with `If-None-Match` gets a 304 until that namespace changes,
+    without any attribute lookup;
+  - the rendered body is cached under the same digest and never needs invalidating.
+"""
+import hashlib
+from typing import Awaitable, Callable, Iterable
+import orjson
+from fastapi import Request, Response
+from fastapi.encoders import jsonable_encoder
+from api.app.config import settings
+from api.app.services.cache import cache
+from api.app.services.metrics import RESPONSES
+from api.app.services.timing import stage
+
+def _digest(request: Request, generations, key) -> str:
+    h = hashlib.blake2b(digest_size=16)
+    h.update(orjson.dumps([settings.semantic_version, request.url.path, sorted(request.query_params.multi_items()),
+                           generations, key], default=str))
+    return h.hexdigest()
+
+def _matches(header: str | None, etag: str) -> bool:
+    if not header: return False
+    tags = [t.strip() for t in header.split(",")]
+    # Weak comparison (RFC 9110 13.1.2): W/"x" matches "x"
+    return "*" in tags or etag in (t[2:] if t.startswith("W/") else t for t in tags)
+
+def _render(result) -> bytes:
+    with stage("serialize"):
+        return orjson.dumps(jsonable_encoder(result))
+
+async def conditional(request: Request, namespaces: Iterable[str | None], key,
+                      compute: Callable[[], Awaitable], cacheable: bool = True) -> Response:
+    """Serve `compute()` as JSON with an ETag, answering 304 / from the response cache when possible.
+
+    `namespaces` are those the response reads (None: any namespace); `key` identifies the request body
+    (JSON-serializable, e.g. the parsed request model) and anything else the result depends on.
+    `cacheable=False` (a result read from a replica, which may predate the current generation) is
+    served without an ETag and never stored.
+    """
+    route = getattr(request.scope.get("route"), "path", request.url.path)
+    generations = await cache.generations(list(dict.fromkeys(namespaces))) if cacheable else None
+    if generations is None:
+        # No Redis: nothing shared to derive a cross-worker ETag from; replica read: nothing to pin it to
+        RESPONSES.labels(route, "uncached").inc()
+        return Response(_render(await compute()), media_type="application/json")
+
+    digest = _digest(request, generations, key)
+    headers = {"ETag": f'"{digest}"', "Cache-Control": "no-cache"}
+    if _matches(request.headers.get("if-none-match"), headers["ETag"]):
+        RESPONSES.labels(route, "not_modified").inc()
+        return Response(status_code=304, headers=headers)
+
+    ttl = settings.response_cache_ttl_seconds
+    body = await cache.get_response(digest) if ttl > 0 else None
+    RESPONSES.labels(route, "hit" if body is not None else "miss").inc()
+    if body is None:
+        body = _render(await compute())
+        if ttl > 0 and len(body) <= settings.response_cache_max_bytes: await cache.set_response(digest, body, ttl)
+    return Response(body, media_type="application/json", headers=headers)
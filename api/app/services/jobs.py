@@ -0,0 +1,92 @@
+import asyncio
+import json
+import logging
+import time
+import uuid
+from dataclasses import dataclass, field, asdict
+from typing import Awaitable, Callable
+from api.app.config import settings
+from api.app.services.cache import cache
+
+log = logging.getLogger(__name__)
+
+def _k_job(job_id): return f"attr:job:{job_id}"
+
+@dataclass
+class Job:
+    kind: str
+    params: dict
+    id: str = field(default_factory=lambda: uuid.uuid4().hex)
+    status: str = "pending"  # pending | running | succeeded | failed
+    processed: int = 0
+    failed: int = 0
+    started_at: float | None = None
+    finished_at: float | None = None
+    error: str | None = None
+
+    def to_dict(self) -> dict:
+        d = asdict(self)
+        end = self.finished_at or time.time()
+        elapsed = (end - self.started_at) if self.started_at else 0.0
+        d["elapsed_sec"] = round(elapsed, 3)
+        d["rows_per_sec"] = round(self.processed / elapsed, 1) if elapsed > 0 else None
+        return d
+
+class JobRegistry:
+    """Runs long admin operations as background tasks and tracks their progress.
+
+    Status is kept in this worker and mirrored to Redis (when available) so that
+    a status request landing on another worker/pod still finds the job.
+    """
+    max_retained = 100
+
+    def __init__(self):
+        self.jobs: dict[str, Job] = {}
+        self._tasks: set[asyncio.Task] = set()
+
+    def start(self, kind: str, params: dict, fn: Callable[[Job], Awaitable[None]]) -> Job:
+        job = Job(kind=kind, params=params)
+        self._prune()
+        self.jobs[job.id] = job
+        task = asyncio.create_task(self._run(job, fn))
+        # keep a strong reference until the task is done
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+        return job
+
+    def _prune(self):
+        # Finished jobs stay queryable through Redis; locally keep only the most recent ones
+        done = [j for j in self.jobs.values() if j.finished_at is not None]
+        for j in done[:max(0, len(self.jobs) - self.max_retained + 1)]:
+            del self.jobs[j.id]
+
+    async def _run(self, job: Job, fn):
+        job.status, job.started_at = "running", time.time()
+        await self.publish(job)
+        try:
+            await fn(job)
+            job.status = "succeeded"
+        except Exception as e:
+            log.exception("Job %s (%s) failed: %s", job.id, job.kind, e)
+            job.status, job.error = "failed", str(e)
+        job.finished_at = time.time()
+        await self.publish(job)
+
+    async def publish(self, job: Job):
+        if not cache.redis: return
+        try:
+            await cache.redis.set(_k_job(job.id), json.dumps(job.to_dict()), ex=settings.job_status_ttl_seconds)
+        except Exception as e:
+            log.warning("Failed to publish job status for %s: %s", job.id, e)
+
+    async def get(self, job_id: str) -> dict | None:
+        if job_id in self.jobs: return self.jobs[job_id].to_dict()
+        if not cache.redis: return None
+        try:
+            raw = await cache.redis.get(_k_job(job_id))
+        except Exception as e:
+            log.warning("Failed to read job status for %s: %s", job_id, e)
+            return None
+        return json.loads(raw) if raw else None
+
+jobs = JobRegistry()
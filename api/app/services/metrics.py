@@ -0,0 +1,103 @@
+"""Prometheus metrics for the API.
+
+Works under multi-process uvicorn when PROMETHEUS_MULTIPROC_DIR points at a directory
+shared by the workers (and emptied before they start; scripts/wait_for_db.py does that).
+Each worker then writes its samples there and `/metrics` aggregates all of them.
+"""
+import glob
+import os
+import re
+from prometheus_client import CollectorRegistry, Counter, Gauge, Histogram, REGISTRY, CONTENT_TYPE_LATEST, generate_latest
+
+MULTIPROC_DIR = os.getenv("PROMETHEUS_MULTIPROC_DIR")
+
+HTTP_LATENCY = Histogram(
+    "http_request_duration_seconds", "Request latency by route template",
+    ["method", "route", "status"],
+    buckets=(.001, .0025, .005, .01, .025, .05, .1, .25, .5, 1, 2.5, 5, 10),
+)
+
+# index: phys | logi | syn; tier: l1 | redis | db | negative | snapshot | catalog; result: hit | miss
+LOOKUPS = Counter("attr_lookups_total", "Name lookups per index and cache tier", ["index", "tier", "result"])
+
+BATCH_SIZE = Histogram(
+    "attr_convert_batch_size", "Distinct names per convert call", ["direction"],
+    buckets=(1, 5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000),
+)
+
+# source: worker (shared an in-flight lookup in this process) | batch (merged into another request's
+# query by the micro-batcher) | peer (another worker filled it)
+COALESCED = Counter("attr_fill_coalesced_total", "Cache misses served by another caller's DB lookup", ["index", "source"])
+DB_BATCH_CALLERS = Histogram(
+    "attr_db_batch_callers", "Convert calls merged into one micro-batched DB query", ["index"],
+    buckets=(1, 2, 4, 8, 16, 32, 64, 128),
+)
+EARLY_REFRESH = Counter("attr_early_refresh_total", "Entries refreshed ahead of TTL expiry")
+
+# result: not_modified (304) | hit | miss | uncached (no generation available)
+RESPONSES = Counter("http_conditional_responses_total", "Convert/search responses by ETag / response cache outcome",
+                    ["route", "result"])
+
+# limiter: route | namespace | db; result: admitted | queued (admitted after waiting) | rejected | timeout
+ADMISSION = Counter("admission_total", "Admission control decisions", ["limiter", "result"])
+
+REDIS_ERRORS = Counter("cache_redis_errors_total", "Redis failures swallowed by the cache layer", ["op", "kind"])
+
+# livesum: a worker's contribution disappears when it is marked dead; pool: primary | replica-N
+DB_POOL_CHECKED_OUT = Gauge("db_pool_checked_out", "Connections currently checked out of the SQLAlchemy pool",
+                            ["pool"], multiprocess_mode="livesum")
+DB_POOL_OVERFLOW = Gauge("db_pool_overflow", "Connections open beyond pool_size", ["pool"], multiprocess_mode="livesum")
+DB_POOL_SIZE = Gauge("db_pool_size", "Configured pool_size", ["pool"], multiprocess_mode="livesum")
+
+def record_lookups(index: str, tier: str, hits: int, misses: int):
+    if hits: LOOKUPS.labels(index, tier, "hit").inc(hits)
+    if misses: LOOKUPS.labels(index, tier, "miss").inc(misses)
+
+def redis_error(op: str, exc: Exception):
+    REDIS_ERRORS.labels(op, type(exc).__name__).inc()
+
+def instrument_pool(engine, name: str = "primary"):
+    """Track checked-out / overflow connections of an AsyncEngine's pool via pool events."""
+    from sqlalchemy import event
+    pool = engine.sync_engine.pool
+    if not hasattr(pool, "checkedout"): return  # NullPool/StaticPool: nothing to size
+
+    checked_out, overflow_gauge = DB_POOL_CHECKED_OUT.labels(name), DB_POOL_OVERFLOW.labels(name)
+    DB_POOL_SIZE.labels(name).set(pool.size())
+
+    def overflow():
+        # QueuePool.overflow() counts up from -pool_size
+        overflow_gauge.set(max(0, pool.overflow()))
+
+    @event.listens_for(pool, "checkout")
+    def _checkout(*_):
+        checked_out.inc()
+        overflow()
+
+    @event.listens_for(pool, "checkin")
+    def _checkin(*_):
+        # Fires before the connection is back in the pool, so count rather than read checkedout()
+        checked_out.dec()
+        overflow()
+
+def reap_dead_workers():
+    """Drop live gauges of worker processes that no longer exist (e.g. restarted by uvicorn)."""
+    if not MULTIPROC_DIR: return
+    from prometheus_client import multiprocess
+    pids = {int(m.group(1)) for f in glob.glob(os.path.join(MULTIPROC_DIR, "gauge_live*_*.db"))
+            if (m := re.search(r"_(\d+)\.db$", f))}
+    for pid in pids:
+        try:
+            os.kill(pid, 0)
+        except ProcessLookupError:
+            multiprocess.mark_process_dead(pid, MULTIPROC_DIR)
+        except PermissionError:
+            pass
+
+def render() -> tuple[bytes, str]:
+    if MULTIPROC_DIR:
+        from prometheus_client import multiprocess
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+        return generate_latest(registry), CONTENT_TYPE_LATEST
+    return generate_latest(REGISTRY), CONTENT_TYPE_LATEST
@@ -0,0 +1,53 @@
+"""On-demand sampling profiler for one worker.
+
+A helper thread samples the event loop thread's Python stack every `interval` seconds, for
+`seconds` seconds, and counts identical stacks. The result is in collapsed-stack format
+(`frame;frame;frame count` per line, root first): feed it to flamegraph.pl, speedscope or
+inferno as is. Frames are `function (path:first line)`, so samples merge per function.
+Time the loop spends waiting for I/O shows up under the selector's `select`.
+"""
+import asyncio
+import os
+import sys
+import threading
+import time
+from collections import Counter
+
+_lock = asyncio.Lock()
+
+def _label(code) -> str:
+    path = code.co_filename
+    # Paths relative to the interpreter's site-packages / the repo keep labels short
+    for root in sorted((p for p in sys.path if p), key=len, reverse=True):
+        if path.startswith(root + os.sep):
+            path = path[len(root) + 1:]
+            break
+    return f"{code.co_name} ({path}:{code.co_firstlineno})"
+
+def _sample(thread_id: int, seconds: float, interval: float) -> tuple[Counter, int]:
+    stacks: Counter = Counter()
+    labels: dict = {}
+    samples = 0
+    deadline = time.monotonic() + seconds
+    while time.monotonic() < deadline:
+        frame = sys._current_frames().get(thread_id)
+        if frame is None: break
+        codes = []
+        while frame is not None:
+            codes.append(frame.f_code)
+            frame = frame.f_back
+        stacks[tuple(reversed(codes))] += 1
+        samples += 1
+        time.sleep(interval)
+    out: Counter = Counter()
+    for codes, n in stacks.items():
+        out[";".join(labels.get(c) or labels.setdefault(c, _label(c)) for c in codes)] += n
+    return out, samples
+
+def busy() -> bool: return _lock.locked()
+
+async def profile(seconds: float, interval: float) -> tuple[str, int]:
+    """Sample this worker's event loop thread; returns (collapsed stacks, number of samples)."""
+    async with _lock:
+        stacks, samples = await asyncio.to_thread(_sample, threading.get_ident(), seconds, interval)
+    return "".join(f"{stack} {n}\n" for stack, n in stacks.most_common()), samples
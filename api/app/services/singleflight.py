@@ -0,0 +1,64 @@
+import asyncio
+from typing import Awaitable, Callable, Hashable, Iterable
+
+# Result of a flight whose leader was cancelled: its waiters load for themselves
+_CANCELLED = object()
+
+class _Error:
+    """Result of a flight whose loader raised: its waiters raise the same error."""
+    __slots__ = ("error",)
+
+    def __init__(self, error: Exception): self.error = error
+
+class SingleFlight:
+    """Coalesces concurrent loads of the same keys within this worker.
+
+    The first caller for a key (the leader) runs the loader; callers arriving while
+    it is in flight await the leader's result instead of loading again. If the loader
+    raises, they raise the same exception rather than retry one by one against a failing
+    backend; if the leader is cancelled, they load for themselves.
+    """
+    def __init__(self):
+        self._calls: dict[Hashable, asyncio.Future] = {}
+
+    def __contains__(self, key): return key in self._calls
+
+    def __len__(self): return len(self._calls)
+
+    async def do_many(self, keys: Iterable[Hashable],
+                      loader: Callable[[list], Awaitable[dict]]) -> tuple[dict, int]:
+        """Resolve `keys`, calling `loader(keys_nobody_is_loading) -> {key: value}` at most once.
+
+        Returns ({key: value or None}, number of keys served by another caller's flight).
+        """
+        keys = list(keys)
+        loop = asyncio.get_running_loop()
+        waiting = {k: self._calls[k] for k in keys if k in self._calls}
+        mine = {k: loop.create_future() for k in keys if k not in waiting}
+        self._calls.update(mine)
+        out: dict = {}
+        failed = _CANCELLED
+        try:
+            if mine: out.update(await loader(list(mine)))
+            failed = None
+        except Exception as e:
+            failed = _Error(e)
+            raise
+        finally:
+            for k, f in mine.items():
+                self._calls.pop(k, None)
+                f.set_result(out.get(k) if failed is None else failed)
+
+        retry = []
+        for k, f in waiting.items():
+            # shield: a cancelled waiter must not cancel the shared future
+            res = await asyncio.shield(f)
+            if res is _CANCELLED: retry.append(k)
+            elif isinstance(res, _Error): raise res.error
+            else: out[k] = res
+        coalesced = len(waiting) - len(retry)
+        if retry:
+            more, n = await self.do_many(retry, loader)
+            out.update(more)
+            coalesced += n
+        return out, coalesced
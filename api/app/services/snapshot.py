@@ -0,0 +1,238 @@
+import asyncio
+import json
+import logging
+import sys
+import time
+from datetime import datetime, timedelta
+import asyncpg
+from sqlalchemy import select
+from api.app.config import settings
+from api.app.repo.attribute_repo import to_payload
+from api.app.repo.db import Attribute, SessionLocal, asyncpg_connect_kwargs
+
+log = logging.getLogger(__name__)
+
+# Hardcoded in the triggers of migrations/002_change_notify.sql
+NOTIFY_CHANNEL = "meta_attribute_changed"
+
+class EntityIndex:
+    """Bidirectional name -> payload maps (plus synonym -> payload) for one (namespace, entity)."""
+    __slots__ = ("by_phys", "by_logi", "by_syn")
+
+    def __init__(self):
+        self.by_phys: dict[str, dict] = {}
+        self.by_logi: dict[str, dict] = {}
+        self.by_syn: dict[str, dict] = {}
+
+class Snapshot:
+    """Full in-memory copy of the active catalog (SNAPSHOT_MODE=true).
+
+    Loaded once at startup, then kept current by an incremental catch-up on
+    `updated_at` that is woken up early by Postgres NOTIFY (see
+    migrations/002_change_notify.sql). Hard deletes arrive through NOTIFY; while LISTEN is
+    down, each poll also compares the active ids with the DB's to find them.
+    All mutation happens on the event loop, so lookups never see a half-applied row.
+    """
+    def __init__(self):
+        self.enabled = settings.snapshot_mode
+        self.ready = False
+        self.generation = 0
+        self.indexes: dict[tuple[str, str], EntityIndex] = {}
+        self.by_id: dict[int, dict] = {}
+        self.high_water: datetime | None = None
+        self.loaded_at: float | None = None
+        self.refreshed_at: float | None = None
+        # Measured once per full load: walking every entry is too slow for each status request
+        self.memory_bytes = 0
+        self._wake = asyncio.Event()
+        self._task: asyncio.Task | None = None
+        self._conn: asyncpg.Connection | None = None
+
+    # -- lookups (hot path, synchronous) --
+    def get_phys_many(self, ns, ent, names):
+        idx = self.indexes.get((ns, ent))
+        return [idx.by_phys.get(n) for n in names] if idx else [None] * len(names)
+
+    def get_logi_many(self, ns, ent, names):
+        idx = self.indexes.get((ns, ent))
+        return [idx.by_logi.get(n) for n in names] if idx else [None] * len(names)
+
+    def get_syn_many(self, ns, ent, names):
+        idx = self.indexes.get((ns, ent))
+        return [idx.by_syn.get(n) for n in names] if idx else [None] * len(names)
+
+    # -- mutation --
+    def _put(self, payload: dict):
+        self._drop(payload["id"])
+        key = (payload["namespace"], payload["entity"])
+        idx = self.indexes.get(key)
+        if idx is None: idx = self.indexes[key] = EntityIndex()
+        idx.by_phys[payload["physical_name"]] = payload
+        idx.by_logi[payload["logical_name"]] = payload
+        # A synonym shared by several rows resolves to the first one loaded
+        for syn in payload.get("synonyms") or (): idx.by_syn.setdefault(syn, payload)
+        self.by_id[payload["id"]] = payload
+
+    def _drop(self, id_: int):
+        old = self.by_id.pop(id_, None)
+        if old is None: return
+        key = (old["namespace"], old["entity"])
+        idx = self.indexes.get(key)
+        if idx is None: return
+        # Only remove index entries that still point at this row
+        if idx.by_phys.get(old["physical_name"]) is old: del idx.by_phys[old["physical_name"]]
+        if idx.by_logi.get(old["logical_name"]) is old: del idx.by_logi[old["logical_name"]]
+        for syn in old.get("synonyms") or ():
+            if idx.by_syn.get(syn) is old: del idx.by_syn[syn]
+        if not idx.by_phys and not idx.by_logi: del self.indexes[key]
+
+    def _apply(self, rows) -> int:
+        applied = 0
+        for r in rows:
+            if r.updated_at is not None and (self.high_water is None or r.updated_at > self.high_water):
+                self.high_water = r.updated_at
+            if r.is_active: self._put(to_payload(r))
+            else: self._drop(r.id)
+            applied += 1
+        return applied
+
+    async def load(self):
+        """(Re)build the whole snapshot, streaming rows through a server-side cursor."""
+        fresh = Snapshot()
+        stmt = select(Attribute).where(Attribute.is_active == True).execution_options(yield_per=5000)
+        async with SessionLocal() as session:
+            result = await session.stream(stmt)
+            async for part in result.scalars().partitions():
+                fresh._apply(part)
+                # drop the ORM instances of this chunk so memory stays bounded
+                session.expunge_all()
+        self.indexes, self.by_id, self.high_water = fresh.indexes, fresh.by_id, fresh.high_water
+        self.memory_bytes = _deep_sizeof(self.indexes)
+        self.generation += 1
+        self.loaded_at = self.refreshed_at = time.time()
+        self.ready = True
+        log.info("Snapshot generation %s loaded: %s rows, %s entities", self.generation, len(self.by_id), len(self.indexes))
+
+    async def catch_up(self) -> int:
+        """Apply rows changed since the high-water mark (with an overlap for late commits)."""
+        if self.high_water is None:
+            await self.load()
+            return len(self.by_id)
+        since = self.high_water - timedelta(seconds=settings.snapshot_overlap_seconds)
+        stmt = select(Attribute).where(Attribute.updated_at > since).order_by(Attribute.updated_at)
+        async with SessionLocal() as session:
+            rows = (await session.execute(stmt)).scalars().all()
+        # Rows inside the overlap window are re-applied; only count a generation bump for real changes
+        changed = [r for r in rows if self._changed(r)]
+        applied = self._apply(changed)
+        if applied: self.generation += 1
+        self.refreshed_at = time.time()
+        return applied
+
+    async def sweep_deletes(self) -> int:
+        """Drop rows that are no longer in the DB (hard deletes leave no `updated_at` to catch up on)."""
+        async with SessionLocal() as session:
+            live = set((await session.execute(select(Attribute.id).where(Attribute.is_active == True))).scalars())
+        # Rows added since that query are not in by_id yet, so everything missing from `live` is gone
+        gone = [i for i in self.by_id if i not in live]
+        for i in gone: self._drop(i)
+        if gone: self.generation += 1
+        return len(gone)
+
+    def _changed(self, row) -> bool:
+        cur = self.by_id.get(row.id)
+        if cur is None: return bool(row.is_active)
+        return not row.is_active or cur.get("version") != row.version or to_payload(row) != cur
+
+    def _on_notify(self, conn, pid, channel, payload):
+        try:
+            msg = json.loads(payload)
+        except ValueError:
+            msg = {}
+        if msg.get("op") == "DELETE" and msg.get("id") is not None:
+            if msg["id"] in self.by_id:
+                self._drop(msg["id"])
+                self.generation += 1
+        else:
+            self._wake.set()
+
+    async def _listen(self):
+        if self._conn is not None and not self._conn.is_closed(): return
+        try:
+            self._conn = await asyncpg.connect(**asyncpg_connect_kwargs())
+            await self._conn.add_listener(NOTIFY_CHANNEL, self._on_notify)
+        except Exception as e:
+            # Polling alone converges for inserts/updates; _run sweeps for deletes until LISTEN is back
+            log.warning("Snapshot LISTEN unavailable, relying on polling: %s", e)
+            self._conn = None
+
+    async def _run(self):
+        while True:
+            try:
+                await asyncio.wait_for(self._wake.wait(), timeout=settings.snapshot_poll_seconds)
+            except asyncio.TimeoutError:
+                pass
+            self._wake.clear()
+            try:
+                reconnect = self._conn is None or self._conn.is_closed()
+                await self._listen()
+                # NOTIFYs sent while we were disconnected are lost: a full reload is the only safe catch-up
+                if reconnect and self._conn is not None: await self.load()
+                else:
+                    await self.catch_up()
+                    # No DELETE notifications without LISTEN
+                    if self._conn is None: await self.sweep_deletes()
+            except Exception as e:
+                log.warning("Snapshot refresh failed: %s", e)
+
+    async def start(self):
+        if not self.enabled or self._task is not None: return
+        await self._listen()
+        try:
+            await self.load()
+        except Exception as e:
+            # Not fatal: conversions use the Redis/DB path until a later load succeeds
+            log.warning("Initial snapshot load failed: %s", e)
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        if self._conn is not None:
+            await self._conn.close()
+            self._conn = None
+
+    def status(self) -> dict:
+        return {
+            "enabled": self.enabled,
+            "ready": self.ready,
+            "generation": self.generation,
+            "rows": len(self.by_id),
+            "entities": len(self.indexes),
+            "memory_bytes": self.memory_bytes,
+            "high_water": self.high_water.isoformat() if self.high_water else None,
+            "loaded_at": self.loaded_at,
+            "refreshed_at": self.refreshed_at,
+            "listening": self._conn is not None and not self._conn.is_closed(),
+        }
+
+def _deep_sizeof(obj, seen: set | None = None) -> int:
+    """Approximate retained size of the index structure; shared payloads are counted once."""
+    seen = set() if seen is None else seen
+    if id(obj) in seen: return 0
+    seen.add(id(obj))
+    size = sys.getsizeof(obj)
+    if isinstance(obj, dict):
+        size += sum(_deep_sizeof(k, seen) + _deep_sizeof(v, seen) for k, v in obj.items())
+    elif isinstance(obj, (list, tuple, set)):
+        size += sum(_deep_sizeof(v, seen) for v in obj)
+    elif isinstance(obj, EntityIndex):
+        size += sum(_deep_sizeof(getattr(obj, a), seen) for a in EntityIndex.__slots__)
+    return size
+
+snapshot = Snapshot()
@@ -0,0 +1,80 @@
+"""Per-request time spent in each stage, reported as `Server-Timing` and in timing logs.
+
+The middleware in main.py opens a record per request; code under it wraps its stages in
+`stage(name)` (or `@timed(name)`). Stages: cache (L1 + Redis), db (SQL statements, via engine
+events), orm (rows -> payload dicts), serialize (JSON encoding), admission (waiting for a slot)
+and batch (waiting for a micro-batched lookup). A micro-batch runs outside any request, so its
+own stages are added to every request that waited for it (`merge`). Durations of stages running
+concurrently within a request (e.g. batch groups) are summed.
+"""
+import functools
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+_current: ContextVar[dict | None] = ContextVar("timings", default=None)
+
+def begin() -> dict:
+    """Start recording for the current request; returns its {stage: [seconds, calls]} record."""
+    timings: dict = {}
+    _current.set(timings)
+    return timings
+
+def add(name: str, seconds: float):
+    timings = _current.get()
+    if timings is None: return
+    entry = timings.setdefault(name, [0.0, 0])
+    entry[0] += seconds
+    entry[1] += 1
+
+def merge(timings: dict):
+    """Add another record's stages (e.g. of a shared micro-batch) to the current request's."""
+    current = _current.get()
+    if current is None: return
+    for name, (secs, calls) in timings.items():
+        entry = current.setdefault(name, [0.0, 0])
+        entry[0] += secs
+        entry[1] += calls
+
+@contextmanager
+def stage(name: str):
+    if _current.get() is None:
+        yield
+        return
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        add(name, time.perf_counter() - start)
+
+def timed(name: str):
+    """`stage(name)` around every call of an async function."""
+    def wrap(fn):
+        @functools.wraps(fn)
+        async def inner(*args, **kwargs):
+            with stage(name):
+                return await fn(*args, **kwargs)
+        return inner
+    return wrap
+
+def server_timing(timings: dict, total: float) -> str:
+    parts = [f"{name};dur={secs * 1000:.2f}" for name, (secs, _) in timings.items()]
+    parts.append(f"total;dur={total * 1000:.2f}")
+    return ", ".join(parts)
+
+def instrument_engine(engine):
+    """Count the time of every SQL statement of an AsyncEngine as the `db` stage."""
+    from sqlalchemy import event
+
+    @event.listens_for(engine.sync_engine, "before_cursor_execute")
+    def _before(conn, *_):
+        conn.info.setdefault("timing_start", []).append(time.perf_counter())
+
+    @event.listens_for(engine.sync_engine, "after_cursor_execute")
+    def _after(conn, *_):
+        add("db", time.perf_counter() - conn.info["timing_start"].pop())
+
+    @event.listens_for(engine.sync_engine, "handle_error")
+    def _error(ctx):
+        starts = ctx.connection.info.get("timing_start") if ctx.connection is not None else None
+        if starts: add("db", time.perf_counter() - starts.pop())
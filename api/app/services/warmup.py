@@ -0,0 +1,181 @@
+"""Startup warm-up and readiness.
+
+On startup each worker opens DB (primary and replicas) and Redis connections and loads the
+hottest (namespace, entity) pairs into Redis and its L1, in the background. `/readyz` reports
+not-ready until that is done (or WARMUP_DEADLINE_SEC passed) and READINESS_DELAY_SEC elapsed.
+
+Hot entities are WARMUP_ENTITIES plus the WARMUP_TOP_N most converted ones of the last hour or two.
+Those come from access counts every worker aggregates in memory and flushes to hourly Redis
+sorted sets (`attr:hot:{hour}`).
+"""
+import asyncio
+import logging
+import time
+from collections import Counter
+from sqlalchemy import text
+from api.app.config import settings
+from api.app.repo.attribute_repo import AttributeRepo
+from api.app.repo.db import SessionLocal, engine, replicas
+from api.app.services.cache import cache
+from api.app.services.metrics import redis_error
+from api.app.services.catalog import catalog
+from api.app.services.snapshot import snapshot
+
+log = logging.getLogger(__name__)
+
+_HOT_BUCKET_SECONDS = 3600
+_SEP = "\x1f"  # namespace/entity separator in sorted-set members
+
+def _k_hot(bucket: int) -> str: return f"attr:hot:{bucket}"
+
+def configured_entities() -> list[tuple[str, str]]:
+    """WARMUP_ENTITIES: comma-separated `namespace/entity` (or just `entity`, in the default namespace)."""
+    out = []
+    for item in settings.warmup_entities:
+        ns, _, ent = item.rpartition("/")
+        out.append((ns or settings.default_namespace, ent))
+    return out
+
+class Warmup:
+    def __init__(self):
+        self.state = "pending"  # pending | warming | done | timed_out | failed
+        self.started_at = time.monotonic()
+        self.finished_at: float | None = None
+        self.entities = 0
+        self.rows = 0
+        self._hits: Counter = Counter()
+        self._task: asyncio.Task | None = None
+        self._flusher: asyncio.Task | None = None
+
+    @property
+    def ready(self) -> bool:
+        if time.monotonic() - self.started_at < settings.readiness_delay_sec: return False
+        return self.state in ("done", "timed_out", "failed")
+
+    def record(self, ns: str, entity: str, names: int):
+        """Count convert traffic per entity (in memory; flushed to Redis periodically).
+
+        Without a running flusher (no Redis, or HOT_STATS_FLUSH_SECONDS=0) nothing would ever drain
+        the counts, so none are kept.
+        """
+        if self._flusher is None: return
+        self._hits[(ns, entity)] += names
+
+    async def start(self):
+        self.started_at = time.monotonic()
+        self._task = asyncio.create_task(self._run())
+        if cache.redis and settings.hot_stats_flush_seconds > 0:
+            self._flusher = asyncio.create_task(self._flush_loop())
+
+    async def stop(self):
+        for task in (self._task, self._flusher):
+            if task is None: continue
+            task.cancel()
+            try:
+                await task
+            except asyncio.CancelledError:
+                pass
+        await self.flush()
+        self._flusher = None
+
+    async def _run(self):
+        self.state = "warming"
+        try:
+            await asyncio.wait_for(self._warm(), timeout=settings.warmup_deadline_sec)
+            self.state = "done"
+        except asyncio.TimeoutError:
+            # Serve anyway: a partially warm worker beats one that never becomes ready
+            self.state = "timed_out"
+            log.warning("Warm-up exceeded WARMUP_DEADLINE_SEC=%s; reporting ready", settings.warmup_deadline_sec)
+        except Exception as e:
+            self.state = "failed"
+            log.exception("Warm-up failed, reporting ready cold: %s", e)
+        self.finished_at = time.monotonic()
+        log.info("Warm-up %s in %.2fs: %s entities, %s rows", self.state, self.finished_at - self.started_at,
+                 self.entities, self.rows)
+
+    async def _warm(self):
+        await asyncio.gather(self._open_db(), self._open_redis())
+        # A snapshot / compiled catalog already holds everything conversions need
+        if snapshot.ready or catalog.ready or not cache.enabled: return
+        for ns, ent in await self.hot_entities():
+            await self._warm_entity(ns, ent)
+
+    async def _open_db(self):
+        """Fill each pool up to WARMUP_DB_CONNECTIONS so the first requests don't pay for connects."""
+        n = min(settings.warmup_db_connections, settings.db_pool_size)
+        if n <= 0: return
+
+        async def one(e):
+            async with e.connect() as conn:
+                await conn.execute(text("SELECT 1"))
+                # Hold it until all are open, otherwise the pool hands the same one back
+                await asyncio.sleep(0.05)
+
+        for e in [engine, *replicas.engines]:
+            results = await asyncio.gather(*(one(e) for _ in range(n)), return_exceptions=True)
+            errors = [r for r in results if isinstance(r, Exception)]
+            if errors: log.warning("Warm-up could not open %d/%d connections to %s: %s", len(errors), n, e.url.host, errors[0])
+
+    async def _open_redis(self):
+        if not cache.redis: return
+        try:
+            await asyncio.gather(*(cache.redis.ping() for _ in range(settings.warmup_redis_connections)))
+        except Exception as e:
+            redis_error("ping", e)
+            log.warning("Warm-up could not reach Redis: %s", e)
+
+    async def hot_entities(self) -> list[tuple[str, str]]:
+        out = list(dict.fromkeys(configured_entities()))
+        if settings.warmup_top_n <= 0 or not cache.redis: return out
+        bucket = int(time.time()) // _HOT_BUCKET_SECONDS
+        try:
+            ranked = await cache.redis.zunion([_k_hot(bucket), _k_hot(bucket - 1)], withscores=True)
+        except Exception as e:
+            redis_error("hot_entities", e)
+            log.warning("Could not read hot entity stats: %s", e)
+            return out
+        # zunion returns ascending scores
+        for member, _ in reversed(ranked[-settings.warmup_top_n:]):
+            ns, _, ent = (member.decode() if isinstance(member, bytes) else member).partition(_SEP)
+            if (ns, ent) not in out: out.append((ns, ent))
+        return out
+
+    async def _warm_entity(self, ns: str, ent: str):
+        loaded = 0
+        # The cursor reads one snapshot of the table, taken when the stream starts
+        epoch = cache.l1_epoch
+        async with SessionLocal() as session:
+            async for chunk in AttributeRepo(session).stream_active(ns, ent, settings.refresh_chunk_size):
+                chunk = chunk[:settings.warmup_max_names - loaded]
+                # notify=False: nothing changed, peers' L1 entries stay valid
+                await cache.set_many(chunk, notify=False, epoch=epoch)
+                loaded += len(chunk)
+                if loaded >= settings.warmup_max_names: break
+        self.entities += 1
+        self.rows += loaded
+
+    async def flush(self):
+        if not self._hits or not cache.redis: return
+        hits, self._hits = self._hits, Counter()
+        key = _k_hot(int(time.time()) // _HOT_BUCKET_SECONDS)
+        try:
+            pipe = cache.redis.pipeline(transaction=False)
+            for (ns, ent), n in hits.items(): pipe.zincrby(key, n, f"{ns}{_SEP}{ent}")
+            pipe.expire(key, 3 * _HOT_BUCKET_SECONDS)
+            await pipe.execute()
+        except Exception as e:
+            redis_error("hot_stats", e)
+            log.warning("Could not flush hot entity stats: %s", e)
+
+    async def _flush_loop(self):
+        while True:
+            await asyncio.sleep(settings.hot_stats_flush_seconds)
+            await self.flush()
+
+    def status(self) -> dict:
+        end = self.finished_at or time.monotonic()
+        return {"ready": self.ready, "warmup": self.state, "entities": self.entities, "rows": self.rows,
+                "elapsed_sec": round(end - self.started_at, 3)}
+
+warmup = Warmup()
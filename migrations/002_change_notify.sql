@@ -0,0 +1,43 @@
+-- Change tracking for meta.attribute, used by the in-memory snapshot (SNAPSHOT_MODE=true).
+-- Run after 001_init.sql (which recreates the table and therefore drops these triggers).
+-- The channel name must match NOTIFY_CHANNEL in api/app/services/snapshot.py.
+
+-- Keep updated_at current on every UPDATE so readers can catch up incrementally
+CREATE OR REPLACE FUNCTION meta.attribute_touch_updated_at() RETURNS trigger AS $$
+BEGIN
+    NEW.updated_at := now();
+    RETURN NEW;
+END$$ LANGUAGE plpgsql;
+
+DROP TRIGGER IF EXISTS trg_attribute_touch_updated_at ON meta.attribute;
+CREATE TRIGGER trg_attribute_touch_updated_at
+    BEFORE UPDATE ON meta.attribute
+    FOR EACH ROW EXECUTE FUNCTION meta.attribute_touch_updated_at();
+
+-- Inserts/updates: one notification per statement (bulk loads would otherwise send one per row).
+-- Listeners treat it as a wake-up and catch up on updated_at.
+CREATE OR REPLACE FUNCTION meta.attribute_notify_changed() RETURNS trigger AS $$
+BEGIN
+    PERFORM pg_notify('meta_attribute_changed', json_build_object('op', TG_OP)::text);
+    RETURN NULL;
+END$$ LANGUAGE plpgsql;
+
+DROP TRIGGER IF EXISTS trg_attribute_notify_changed ON meta.attribute;
+CREATE TRIGGER trg_attribute_notify_changed
+    AFTER INSERT OR UPDATE ON meta.attribute
+    FOR EACH STATEMENT EXECUTE FUNCTION meta.attribute_notify_changed();
+
+-- Deletes leave nothing behind to catch up on, so send the id of every deleted row
+CREATE OR REPLACE FUNCTION meta.attribute_notify_deleted() RETURNS trigger AS $$
+BEGIN
+    PERFORM pg_notify('meta_attribute_changed', json_build_object('op', TG_OP, 'id', OLD.id)::text);
+    RETURN OLD;
+END$$ LANGUAGE plpgsql;
+
+DROP TRIGGER IF EXISTS trg_attribute_notify_deleted ON meta.attribute;
+CREATE TRIGGER trg_attribute_notify_deleted
+    AFTER DELETE ON meta.attribute
+    FOR EACH ROW EXECUTE FUNCTION meta.attribute_notify_deleted();
+
+-- Supports the incremental catch-up query (updated_at > :since)
+CREATE INDEX IF NOT EXISTS ix_attr_updated_at ON meta.attribute (updated_at);
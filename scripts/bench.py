@@ -0,0 +1,342 @@
+"""Load-test and micro-benchmark suite for the API.
+
+Drives the app in-process (httpx ASGITransport, same event loop; no network or uvicorn in the
+numbers) or over HTTP against a running server, and reports p50/p95/p99 latency and requests/sec
+per scenario. Results are compared with a stored baseline; a scenario whose p95 grew or whose
+throughput dropped by more than `--threshold` is flagged and the exit code is 1.
+
+Scenarios:
+  convert_b{size}_h{hit}  physical -> logical for `size` names of one entity, `hit` percent of them
+                          from a pre-warmed hot set (the rest are cold rows, each used once)
+  convert_304             repeats one request with If-None-Match
+  search_like, search_fts substring / full-text search over the bench namespace
+  create_b100             POST /v1/attributes with 100 new attributes
+  bulk_b1000              POST /v1/attributes/bulk with 1000 new attributes
+  refresh                 POST /v1/cache/refresh for one entity, timed until the job finishes
+  micro                   in-process only, no I/O: L1 lookups, payload decode, ETag digest
+
+The catalog is synthetic: namespace `bench`, entities `e0000`.. of `--entity-size` attributes
+(physical `col_{i}`, logical `Column {i}`, synonym `syn_{i}`), loaded with COPY and skipped if present.
+Writes go to the `bench_w` namespace. Seeding and the in-process target need DATABASE_URL;
+`--fakeredis` replaces Redis in-process.
+
+Usage:
+  python scripts/bench.py [--target inproc|http] [--base-url http://localhost:8080] [--rows 100000]
+                          [--scenarios convert,search,...] [--duration 10] [--concurrency 16]
+                          [--baseline scripts/bench_baseline.json] [--save-baseline] [--threshold 0.15]
+"""
+import argparse
+import asyncio
+import json
+import math
+import os
+import platform
+import random
+import subprocess
+import sys
+import time
+import pathlib
+sys.path.insert(0, str(pathlib.Path('.').resolve()))
+
+NS, WRITE_NS = "bench", "bench_w"
+SEED_CHUNK = 50_000
+CONVERT_SIZES = (1, 100, 1000)
+HIT_RATIOS = (100, 90, 50)
+GROUPS = ("convert", "search", "create", "bulk", "refresh", "micro")
+
+def synthetic_rows(start: int, stop: int, entity_size: int) -> list[dict]:
+    return [{"namespace": NS, "entity": f"e{i // entity_size:04d}", "category": "entity",
+             "physical_name": f"col_{i}", "logical_name": f"Column {i}", "synonyms": [f"syn_{i}"],
+             "data_type": random.choice(("text", "int", "numeric", "date")),
+             "description": f"Synthetic attribute {i} for benchmarks", "source_system": "bench",
+             "tags": ["bench"], "is_active": True, "metadata": {}} for i in range(start, stop)]
+
+async def seed(rows: int, entity_size: int):
+    """Load the synthetic catalog (idempotent: existing rows are skipped)."""
+    import asyncpg
+    from api.app.repo.bulk import copy_upsert
+    from api.app.repo.db import asyncpg_connect_kwargs
+    conn = await asyncpg.connect(**asyncpg_connect_kwargs())
+    try:
+        have = await conn.fetchval("SELECT count(*) FROM meta.attribute WHERE namespace = $1", NS)
+        for start in range(have, rows, SEED_CHUNK):
+            async with conn.transaction():
+                await copy_upsert(conn, synthetic_rows(start, min(rows, start + SEED_CHUNK), entity_size), "skip")
+            print(f"seeded {min(rows, start + SEED_CHUNK)}/{rows}", file=sys.stderr)
+    finally:
+        await conn.close()
+
+def percentile(sorted_vals: list[float], p: float) -> float:
+    """Nearest-rank percentile of an ascending list."""
+    if not sorted_vals: return 0.0
+    return sorted_vals[max(0, math.ceil(p / 100 * len(sorted_vals)) - 1)]
+
+def summarize(latencies: list[float], errors: int, wall: float) -> dict:
+    lat = sorted(latencies)
+    return {"n": len(lat), "errors": errors, "rps": round(len(lat) / wall, 1) if wall > 0 else 0.0,
+            "p50_ms": round(percentile(lat, 50) * 1000, 3), "p95_ms": round(percentile(lat, 95) * 1000, 3),
+            "p99_ms": round(percentile(lat, 99) * 1000, 3)}
+
+async def run_load(make_request, duration: float, concurrency: int, max_requests: int | None = None) -> dict:
+    """Closed loop: `concurrency` workers issue `await make_request()` back to back for `duration` seconds.
+
+    `make_request` returns True on success; returning None ends the scenario (input exhausted).
+    """
+    latencies: list[float] = []
+    errors = 0
+    deadline = time.perf_counter() + duration
+    stop = False
+
+    async def worker():
+        nonlocal errors, stop
+        while not stop and time.perf_counter() < deadline:
+            if max_requests is not None and len(latencies) + errors >= max_requests: return
+            t = time.perf_counter()
+            try:
+                ok = await make_request()
+            except Exception as e:
+                print(f"request failed: {type(e).__name__}: {e}", file=sys.stderr)
+                ok = False
+            if ok is None:
+                stop = True
+                return
+            if ok: latencies.append(time.perf_counter() - t)
+            else: errors += 1
+
+    start = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    return summarize(latencies, errors, time.perf_counter() - start)
+
+class Catalog:
+    """Name pools for convert scenarios: a hot set warmed up front and cold names handed out once each."""
+    def __init__(self, rows: int, entity_size: int, hot: int):
+        self.entity_size = entity_size
+        self.entities = max(1, rows // entity_size)
+        self.hot = min(hot, entity_size)
+        self.cold = {e: list(range(self.hot, entity_size)) for e in range(self.entities)}
+        for pool in self.cold.values(): random.shuffle(pool)
+
+    def names(self, size: int, hit: int) -> tuple[str, list[str]] | None:
+        e = random.randrange(self.entities)
+        n_hot = round(size * hit / 100)
+        cold = self.cold[e]
+        if len(cold) < size - n_hot: return None
+        idx = [random.randrange(self.hot) for _ in range(n_hot)] + [cold.pop() for _ in range(size - n_hot)]
+        base = e * self.entity_size
+        return f"e{e:04d}", [f"col_{base + i}" for i in idx]
+
+async def warm(client, catalog: Catalog):
+    for e in range(catalog.entities):
+        names = [f"col_{e * catalog.entity_size + i}" for i in range(catalog.hot)]
+        for i in range(0, len(names), 1000):
+            r = await client.post("/v1/convert/physical-to-logical",
+                                  json={"namespace": NS, "entity": f"e{e:04d}", "physical_names": names[i:i + 1000]})
+            r.raise_for_status()
+
+async def scenarios(client, group: str, catalog: Catalog, args) -> dict:
+    out = {}
+    if group == "convert":
+        await warm(client, catalog)
+        for size in CONVERT_SIZES:
+            for hit in HIT_RATIOS:
+                async def req(size=size, hit=hit):
+                    picked = catalog.names(size, hit)
+                    if picked is None: return None
+                    entity, names = picked
+                    r = await client.post("/v1/convert/physical-to-logical",
+                                          json={"namespace": NS, "entity": entity, "physical_names": names})
+                    return r.status_code == 200
+                out[f"convert_b{size}_h{hit}"] = await run_load(req, args.duration, args.concurrency)
+
+        body = {"namespace": NS, "entity": "e0000", "physical_names": ["col_0", "col_1"]}
+        r = await client.post("/v1/convert/physical-to-logical", json=body)
+        headers = {"If-None-Match": r.headers.get("etag", "")}
+        async def not_modified():
+            r = await client.post("/v1/convert/physical-to-logical", json=body, headers=headers)
+            return r.status_code == 304
+        out["convert_304"] = await run_load(not_modified, args.duration, args.concurrency)
+
+    elif group == "search":
+        async def like():
+            r = await client.get("/v1/attributes/search",
+                                 params={"namespace": NS, "q": f"col_{random.randrange(args.rows)}", "limit": 50})
+            return r.status_code == 200
+        async def fts():
+            r = await client.get("/v1/attributes/search",
+                                 params={"namespace": NS, "q": f"column {random.randrange(args.rows)}", "mode": "fts"})
+            return r.status_code == 200
+        out["search_like"] = await run_load(like, args.duration, args.concurrency)
+        out["search_fts"] = await run_load(fts, args.duration, args.concurrency)
+
+    elif group in ("create", "bulk"):
+        run_id, counter = f"{int(time.time())}_{os.getpid()}", iter(range(10 ** 9))
+        size, path = (100, "/v1/attributes") if group == "create" else (1000, "/v1/attributes/bulk")
+
+        def rows():
+            n = next(counter)
+            return [{"namespace": WRITE_NS, "entity": f"r{run_id}_{n}", "physical_name": f"col_{i}",
+                     "logical_name": f"Column {i}", "data_type": "text"} for i in range(size)]
+        async def write():
+            r = await client.post(path, json=rows(), params={"report": "none"} if group == "bulk" else None)
+            return r.status_code == 200
+        # Writes are heavy: fewer workers, so the DB rather than the client sets the pace
+        out[f"{group}_b{size}"] = await run_load(write, args.duration, max(1, args.concurrency // 4))
+
+    elif group == "refresh":
+        async def refresh():
+            r = await client.post("/v1/cache/refresh", params={"namespace": NS, "entity": "e0000"})
+            if r.status_code != 202: return False
+            while True:
+                status = (await client.get(r.json()["status_url"])).json()
+                if status["status"] in ("succeeded", "failed"): return status["status"] == "succeeded"
+                await asyncio.sleep(0.01)
+        out["refresh"] = await run_load(refresh, args.duration, 1, max_requests=args.refresh_runs)
+
+    elif group == "micro":
+        out.update(micro(args.micro_iterations))
+    return out
+
+def micro(iterations: int) -> dict:
+    """CPU-only hot paths, timed in batches of 100 calls (latency = per call)."""
+    import orjson
+    from starlette.requests import Request
+    from api.app.repo.attribute_repo import PAYLOAD_FIELDS, row_to_payload
+    from api.app.services.cache import LocalCache
+    from api.app.services.conditional import _digest
+
+    l1 = LocalCache(100_000, 3600)
+    for i in range(10_000): l1.set(f"attr:by_phys:{NS}:e0000:col_{i}", {"id": i})
+    keys = [f"attr:by_phys:{NS}:e0000:col_{random.randrange(10_000)}" for _ in range(100)]
+    payload = synthetic_rows(0, 1, 1000)[0] | {"id": 1, "version": 1, "created_by": "S", "updated_by": "S"}
+    row = tuple(payload.get(f) for f in PAYLOAD_FIELDS)
+    raw = orjson.dumps(payload)
+    request = Request({"type": "http", "method": "POST", "path": "/v1/convert/physical-to-logical",
+                       "query_string": b"", "headers": []})
+    body = {"namespace": NS, "entity": "e0000", "physical_names": [f"col_{i}" for i in range(100)]}
+
+    cases = {
+        "micro_l1_get": lambda: [l1.get(k) for k in keys],
+        "micro_row_to_payload": lambda: [row_to_payload(row) for _ in range(100)],
+        "micro_orjson_loads": lambda: [orjson.loads(raw) for _ in range(100)],
+        "micro_etag_digest": lambda: [_digest(request, [1, 2], body) for _ in range(100)],
+    }
+    out = {}
+    for name, fn in cases.items():
+        lat = []
+        start = time.perf_counter()
+        for _ in range(max(1, iterations // 100)):
+            t = time.perf_counter()
+            fn()
+            lat.append((time.perf_counter() - t) / 100)
+        wall = time.perf_counter() - start
+        out[name] = summarize(lat, 0, wall) | {"rps": round(len(lat) * 100 / wall, 1)}
+    return out
+
+def compare(current: dict, baseline: dict, threshold: float) -> list[str]:
+    """Regressions of `current` vs `baseline`: p95 up or requests/sec down by more than `threshold`."""
+    found = []
+    for name, cur in current.items():
+        base = baseline.get(name)
+        if not base or not cur.get("n"): continue
+        if base.get("p95_ms") and cur["p95_ms"] > base["p95_ms"] * (1 + threshold):
+            found.append(f"{name}: p95 {base['p95_ms']}ms -> {cur['p95_ms']}ms")
+        if base.get("rps") and cur["rps"] < base["rps"] * (1 - threshold):
+            found.append(f"{name}: rps {base['rps']} -> {cur['rps']}")
+        if cur.get("errors", 0) > base.get("errors", 0):
+            found.append(f"{name}: errors {base.get('errors', 0)} -> {cur['errors']}")
+    return found
+
+def _git_sha() -> str | None:
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True).stdout.strip() or None
+    except OSError:
+        return None
+
+def print_table(results: dict):
+    print(f"{'scenario':<24}{'n':>8}{'err':>6}{'rps':>12}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}")
+    for name, r in results.items():
+        print(f"{name:<24}{r['n']:>8}{r['errors']:>6}{r['rps']:>12}{r['p50_ms']:>10}{r['p95_ms']:>10}{r['p99_ms']:>10}")
+
+async def run(args) -> dict:
+    import httpx
+    groups = [g for g in args.scenarios.split(",") if g]
+    needs_server = [g for g in groups if g != "micro"]
+    if needs_server and args.seed: await seed(args.rows, args.entity_size)
+    catalog = Catalog(args.rows, args.entity_size, args.hot)
+    results: dict = {}
+    if not needs_server:
+        for g in groups: results.update(await scenarios(None, g, catalog, args))
+        return results
+
+    if args.target == "http":
+        client = httpx.AsyncClient(base_url=args.base_url, timeout=60,
+                                   limits=httpx.Limits(max_connections=args.concurrency))
+        async with client:
+            for g in groups: results.update(await scenarios(client, g, catalog, args))
+        return results
+
+    from api.app.main import app
+    if args.fakeredis:
+        import fakeredis.aioredis
+        from api.app.services.cache import cache
+        cache.redis = fakeredis.aioredis.FakeRedis()
+    # ASGITransport does not run the lifespan (cache listener, snapshot); enter it here
+    async with app.router.lifespan_context(app):
+        async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://bench", timeout=60) as client:
+            for g in groups: results.update(await scenarios(client, g, catalog, args))
+    return results
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    ap.add_argument("--target", choices=["inproc", "http"], default="inproc")
+    ap.add_argument("--base-url", default="http://localhost:8080")
+    ap.add_argument("--scenarios", default=",".join(GROUPS), help=f"comma-separated subset of {','.join(GROUPS)}")
+    ap.add_argument("--rows", type=int, default=100_000, help="synthetic catalog size (10k-1M)")
+    ap.add_argument("--entity-size", type=int, default=1000)
+    ap.add_argument("--hot", type=int, default=200, help="names per entity warmed before the convert scenarios")
+    ap.add_argument("--no-seed", dest="seed", action="store_false")
+    ap.add_argument("--fakeredis", action="store_true", help="inproc: use fakeredis instead of REDIS_URL")
+    ap.add_argument("--duration", type=float, default=10, help="seconds per scenario")
+    ap.add_argument("--concurrency", type=int, default=16)
+    ap.add_argument("--refresh-runs", type=int, default=5)
+    ap.add_argument("--micro-iterations", type=int, default=200_000)
+    ap.add_argument("--seed-random", type=int, default=42)
+    ap.add_argument("--out", help="also write the results JSON here")
+    ap.add_argument("--baseline", default="scripts/bench_baseline.json")
+    ap.add_argument("--save-baseline", action="store_true", help="store these results as the new baseline")
+    ap.add_argument("--threshold", type=float, default=0.15, help="relative change flagged as a regression")
+    args = ap.parse_args(argv)
+    bad = [g for g in args.scenarios.split(",") if g and g not in GROUPS]
+    if bad: ap.error(f"unknown scenarios {bad}; choose from {','.join(GROUPS)}")
+    random.seed(args.seed_random)
+
+    results = asyncio.run(run(args))
+    report = {"meta": {"target": args.target, "rows": args.rows, "entity_size": args.entity_size,
+                       "concurrency": args.concurrency, "duration": args.duration, "git": _git_sha(),
+                       "python": platform.python_version(), "machine": platform.machine(),
+                       "at": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime())},
+              "scenarios": results}
+    print_table(results)
+    if args.out: pathlib.Path(args.out).write_text(json.dumps(report, indent=2))
+
+    baseline_path = pathlib.Path(args.baseline)
+    if args.save_baseline:
+        # Merge so a partial run (--scenarios) only replaces the scenarios it measured
+        old = json.loads(baseline_path.read_text()) if baseline_path.exists() else {"scenarios": {}}
+        report["scenarios"] = old["scenarios"] | results
+        baseline_path.write_text(json.dumps(report, indent=2) + "\n")
+        print(f"baseline written to {baseline_path}")
+        return 0
+    if not baseline_path.exists():
+        print(f"no baseline at {baseline_path}; run with --save-baseline to create one")
+        return 0
+    baseline = json.loads(baseline_path.read_text())
+    if {k: baseline["meta"].get(k) for k in ("target", "rows", "concurrency")} != \
+            {k: report["meta"][k] for k in ("target", "rows", "concurrency")}:
+        print("warning: baseline was recorded with a different target/rows/concurrency", file=sys.stderr)
+    regressions = compare(results, baseline["scenarios"], args.threshold)
+    for r in regressions: print(f"REGRESSION {r}")
+    return 1 if regressions else 0
+
+if __name__ == "__main__":
+    sys.exit(main())
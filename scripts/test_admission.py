@@ -0,0 +1,106 @@
+import os
+import sys
+import asyncio
+import pathlib
+from types import SimpleNamespace
+sys.path.insert(0, str(pathlib.Path('.').resolve()))
+
+os.environ.update(ADMISSION_MAX_WAIT_MS="50", ADMISSION_DEGRADED_SECONDS="0.2", ADMISSION_QUEUE="1",
+                  ADMISSION_DB_CONCURRENCY="1")
+from api.app.services.admission import Admission, Limiter, Overloaded
+
+async def _hold(limiter: Limiter, release: asyncio.Event, queue: bool = True):
+    async with limiter.slot(queue):
+        await release.wait()
+
+async def _check() -> str | None:
+    release = asyncio.Event()
+
+    # One holder, one waiter; the next caller finds the queue full and is rejected at once
+    lim = Limiter("route", "/r", limit=1, queue=1)
+    holder = asyncio.create_task(_hold(lim, release))
+    await asyncio.sleep(0)
+    waiter = asyncio.create_task(_hold(lim, release))
+    await asyncio.sleep(0)
+    try:
+        async with lim.slot(): return "a full queue admitted a third caller"
+    except Overloaded as e:
+        if e.status_code != 503 or "Retry-After" not in e.headers: return f"unexpected rejection {e.status_code} {e.headers}"
+    release.set()
+    await asyncio.gather(holder, waiter)
+    if (lim.admitted, lim.queued, lim.rejected, lim.active, lim.waiting) != (2, 1, 1, 0, 0):
+        return f"unexpected counters {lim.status()}"
+
+    # A queued caller gives up after ADMISSION_MAX_WAIT_MS
+    release.clear()
+    holder = asyncio.create_task(_hold(lim, release))
+    await asyncio.sleep(0)
+    try:
+        async with lim.slot(): return "a queued caller outlived ADMISSION_MAX_WAIT_MS"
+    except Overloaded:
+        if lim.timeouts != 1: return f"expected a timeout, got {lim.status()}"
+
+    # queue=False: rejected while the limiter is full, even with room in the queue
+    try:
+        async with lim.slot(queue=False): return "queue=False waited for a slot"
+    except Overloaded:
+        pass
+    release.set()
+    await holder
+
+    # A database rejection degrades the worker; it recovers after ADMISSION_DEGRADED_SECONDS
+    adm = Admission()
+    release.clear()
+    db_holder = asyncio.create_task(_hold_db(adm, release))
+    await asyncio.sleep(0)
+    try:
+        async with adm.db("ns", queue=False): return "a full database limiter admitted a caller"
+    except Overloaded:
+        pass
+    if not adm.degraded: return "a database rejection did not degrade the worker"
+    # While degraded, nothing queues for the database
+    try:
+        async with adm.db("ns"): return "a degraded worker queued for the database"
+    except Overloaded:
+        pass
+    release.set()
+    await db_holder
+    await asyncio.sleep(0.25)
+    if adm.degraded: return "the worker stayed degraded past ADMISSION_DEGRADED_SECONDS"
+    async with adm.db("ns"): pass
+
+    # Streaming endpoints take the route slot themselves and keep it until the body is done
+    async def stream_endpoint(): ...
+    async def plain_endpoint(): ...
+    adm.in_body(stream_endpoint)
+    adm.routes["/s"] = Limiter("route", "/s", limit=1, queue=0)
+    def request_for(endpoint):
+        return SimpleNamespace(scope={"route": SimpleNamespace(path="/s", endpoint=endpoint)}, url=SimpleNamespace(path="/s"))
+    request = request_for(stream_endpoint)
+    dep = adm.route(request)
+    await dep.__anext__()
+    if adm.routes["/s"].active: return "the route dependency held a streaming endpoint's slot"
+    slot = await adm.hold_route(request)
+    if adm.routes["/s"].active != 1: return "hold_route did not take the slot"
+    await slot.aclose()
+    if adm.routes["/s"].active: return "closing the held slot did not release it"
+    dep = adm.route(request_for(plain_endpoint))
+    await dep.__anext__()
+    if adm.routes["/s"].active != 1: return "the route dependency did not hold a plain endpoint's slot"
+    await dep.aclose()
+    return None
+
+async def _hold_db(adm: Admission, release: asyncio.Event):
+    async with adm.db("ns"):
+        await release.wait()
+
+def run_test():
+    error = asyncio.run(_check())
+    if error:
+        print('ERROR:', error)
+        return 1
+    print('Admission limits reject, time out, degrade and recover as configured')
+    return 0
+
+if __name__ == '__main__':
+    exit(run_test())
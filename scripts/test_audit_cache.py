@@ -0,0 +1,96 @@
+import sys
+import asyncio
+import pathlib
+sys.path.insert(0, str(pathlib.Path('.').resolve()))
+
+import fakeredis
+import fakeredis.aioredis
+import orjson
+from api.app.jobs import audit_cache
+from api.app.services import cache as cache_module
+
+def _payload(id, ent, phys, logi, synonyms=(), version=1):
+    return {"id": id, "namespace": "default", "entity": ent, "category": "entity", "logical_name": logi,
+            "physical_name": phys, "data_type": "text", "description": None, "source_system": None,
+            "created_by": "System", "updated_by": "System", "synonyms": list(synonyms), "tags": [],
+            "is_active": True, "version": version, "metadata": {}}
+
+def _expected(*payloads):
+    return {p["id"]: (p, audit_cache.attr_hash(p["namespace"], p["entity"], p["physical_name"], p["logical_name"]))
+            for p in payloads}
+
+async def _check(server) -> str | None:
+    cache = cache_module.Cache()
+    cache.layout = "legacy"
+    cache.redis = fakeredis.aioredis.FakeRedis(server=server)
+
+    # Entity "a" and entity "a:b": the SCAN for "a" also sees "a:b"'s keys
+    a = [_payload(1, "a", "x", "X", synonyms=["shared"]), _payload(2, "a", "y", "Y", synonyms=["shared"])]
+    ab = [_payload(3, "a:b", "z", "Z")]
+    await cache.set_many(a + ab, notify=False)
+    await cache.redis.set("attr:by_phys:default:a:gone", orjson.dumps(_payload(9, "a", "gone", "Gone")))
+
+    shadows = audit_cache.shadowing([("default", "a"), ("default", "a:b"), ("default", "ab")])
+    if shadows[("default", "a")] != [("default", "a:b")] or shadows[("default", "a:b")]:
+        return f"unexpected shadowing {shadows}"
+    stale, missing, orphaned, _ = await audit_cache._audit_legacy(cache, "default", "a", _expected(*a),
+                                                                 shadows[("default", "a")])
+    if orphaned != ["attr:by_phys:default:a:gone"]:
+        return f"orphans should only be a's own stale key, got {orphaned}"
+    # The shared synonym key holds whichever attribute was written last: either is current
+    if stale or missing:
+        return f"shared synonym reported as drift: stale={stale} missing={missing}"
+
+    # Repair re-reads the row: an update after the audit read must not be overwritten
+    audited, updated = _payload(1, "a", "x", "X", version=2), _payload(1, "a", "x", "X", version=3)
+    reads = []
+    async def read_expected(ns, ent, ids=None):
+        reads.append(ids)
+        return _expected(audited if ids is None else updated)
+    audit_cache.read_expected = read_expected
+    cache_module.Cache = lambda: cache
+    report = await audit_cache.audit_entity("default", "a", ("stale",), shadows[("default", "a")])
+    cache.redis = fakeredis.aioredis.FakeRedis(server=server)
+    got = orjson.loads(await cache.redis.get("attr:by_phys:default:a:x"))
+    if report["stale"] != 2 or reads != [None, [1]]:
+        return f"unexpected audit {report}, reads {reads}"
+    if got["version"] != 3:
+        return f"repair wrote version {got['version']} instead of the re-read 3"
+
+    # Entities deleted from the DB are found from the namespace's key prefixes (either layout)
+    await cache.set_many([_payload(4, "gone:x", "p", "P", synonyms=["s"])], notify=False)
+    cache.layout = "compact"
+    await cache.set_many([_payload(5, "dropped", "q", "Q")], notify=False)
+    cache.layout = "dual"
+    known = [("default", "a"), ("default", "a:b")]
+    found = await audit_cache.cached_entities(cache.redis, "dual", "default", known)
+    if found != [("default", "dropped"), ("default", "gone:x")]:
+        return f"deleted entities not found from Redis: {found}"
+    if await audit_cache.cached_entities(cache.redis, "legacy", None, known) != [("default", "gone:x")]:
+        return "the legacy scan without a namespace missed the deleted entity"
+
+    async def list_entities(namespace=None, entity=None): return list(known)
+    audit_cache.list_entities = list_entities
+    pairs, shadows = await audit_cache._plan("default", None)
+    cache.redis = fakeredis.aioredis.FakeRedis(server=server)
+    if ("default", "gone:x") not in pairs or ("default", "dropped") not in pairs:
+        return f"the plan left out entities only Redis has: {pairs}"
+    async def no_rows(ns, ent, ids=None): return {}
+    audit_cache.read_expected = no_rows
+    report = await audit_cache.audit_entity("default", "gone:x", ("orphaned",), shadows[("default", "gone:x")])
+    cache.redis = fakeredis.aioredis.FakeRedis(server=server)
+    # Its by_phys, by_logi and by_syn keys: none of them is in the DB any more
+    if report["orphaned"] != 3 or await cache.redis.keys("attr:by_*:default:gone:x:*"):
+        return f"a deleted entity's keys were not reported and dropped: {report}"
+    return None
+
+def run_test():
+    error = asyncio.run(_check(fakeredis.FakeServer()))
+    if error:
+        print('ERROR:', error)
+        return 1
+    print('Cache audit ignores shadowed entities and shared synonyms, finds deleted ones, and repairs from re-read rows')
+    return 0
+
+if __name__ == '__main__':
+    exit(run_test())
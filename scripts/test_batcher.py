@@ -0,0 +1,75 @@
+import sys
+import asyncio
+import pathlib
+import time
+sys.path.insert(0, str(pathlib.Path('.').resolve()))
+
+from api.app.services.batcher import MicroBatcher
+
+async def _check() -> str | None:
+    runs, flushes = [], []
+
+    async def run(key, names):
+        runs.append((key, sorted(names)))
+        await asyncio.sleep(0.01)
+        return {n: n.upper() for n in names if n != "unknown"}
+
+    # Window flush: callers within the window share one run and get back only their own names
+    batcher = MicroBatcher(run, window_ms=20, max_names=100, on_flush=lambda k, c, n: flushes.append((k, c, n)))
+    started = time.monotonic()
+    results = await asyncio.gather(batcher.load("k", ["a", "b"]), batcher.load("k", ["b", "c", "unknown"]),
+                                   batcher.load("other", ["a"]))
+    if runs != [("k", ["a", "b", "c", "unknown"]), ("other", ["a"])]:
+        return f"expected one run per key, got {runs}"
+    if results != [{"a": "A", "b": "B"}, {"b": "B", "c": "C", "unknown": None}, {"a": "A"}]:
+        return f"results were not fanned out per caller: {results}"
+    if time.monotonic() - started < 0.02 or flushes != [("k", 2, 4), ("other", 1, 1)] or len(batcher):
+        return f"expected a flush after the window, got {flushes}"
+
+    # max_names flush: a full batch is sent without waiting for the window
+    runs.clear()
+    batcher = MicroBatcher(run, window_ms=10_000, max_names=3)
+    started = time.monotonic()
+    first = asyncio.create_task(batcher.load("k", ["a", "b"]))
+    await asyncio.sleep(0)
+    second = await asyncio.wait_for(batcher.load("k", ["c"]), 1)
+    if second != {"c": "C"} or await first != {"a": "A", "b": "B"} or time.monotonic() - started > 1:
+        return "a batch at max_names was not sent early"
+
+    # An error reaches every caller of the batch
+    async def failing(key, names):
+        await asyncio.sleep(0.01)
+        raise RuntimeError("db down")
+    batcher = MicroBatcher(failing, window_ms=5, max_names=100)
+    results = await asyncio.gather(batcher.load("k", ["a"]), batcher.load("k", ["b"]), return_exceptions=True)
+    if not all(isinstance(r, RuntimeError) for r in results):
+        return f"expected every caller to see the error, got {results}"
+
+    # A cancelled caller doesn't cancel the batch for the others
+    runs.clear()
+    batcher = MicroBatcher(run, window_ms=5, max_names=100)
+    leaving = asyncio.create_task(batcher.load("k", ["a"]))
+    staying = asyncio.create_task(batcher.load("k", ["b"]))
+    await asyncio.sleep(0)
+    leaving.cancel()
+    if await staying != {"b": "B"} or runs != [("k", ["a", "b"])]:
+        return "the batch did not survive a cancelled caller"
+
+    # window_ms <= 0: no batching
+    runs.clear()
+    batcher = MicroBatcher(run, window_ms=0, max_names=100)
+    await asyncio.gather(batcher.load("k", ["a"]), batcher.load("k", ["b"]))
+    if batcher.enabled or len(runs) != 2:
+        return f"expected direct runs with batching off, got {runs}"
+    return None
+
+def run_test():
+    error = asyncio.run(_check())
+    if error:
+        print('ERROR:', error)
+        return 1
+    print('MicroBatcher flushes on window and size, fans out results and errors')
+    return 0
+
+if __name__ == '__main__':
+    exit(run_test())
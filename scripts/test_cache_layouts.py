@@ -0,0 +1,102 @@
+import os
+import sys
+import asyncio
+import pathlib
+sys.path.insert(0, str(pathlib.Path('.').resolve()))
+
+# A Redis URL enables the cache; the client itself is replaced with fakeredis below
+os.environ.setdefault("REDIS_URL", "redis://localhost:6379/0")
+import fakeredis
+import fakeredis.aioredis
+from api.app.services.cache import Cache, LAYOUTS
+
+NS, ENT = "default", "customer"
+
+def _payload(id_, phys, logi, synonyms=(), entity=ENT):
+    return {"id": id_, "namespace": NS, "entity": entity, "category": "entity", "logical_name": logi,
+            "physical_name": phys, "data_type": "text", "description": None, "source_system": None,
+            "created_by": "System", "updated_by": "System", "synonyms": list(synonyms), "tags": [],
+            "is_active": True, "version": 1, "metadata": {}}
+
+def _names(p):
+    return (p["namespace"], p["entity"], p["physical_name"], p["logical_name"], p["synonyms"])
+
+def _worker(layout, server, lua=True) -> Cache:
+    cache = Cache()
+    cache.layout, cache._lua = layout, lua
+    cache.redis = fakeredis.aioredis.FakeRedis(server=server)
+    cache.l1 = None  # every read goes to Redis
+    return cache
+
+def _ids(entries):
+    return [e and e["id"] for e in entries]
+
+async def _sequence(cache: Cache) -> list:
+    """The same writes and reads for every layout; returns what each read saw (as ids)."""
+    a, b = _payload(1, "cust_id", "Customer Id", ["Id"]), _payload(2, "cust_nm", "Customer Name")
+    other = _payload(3, "acct_id", "Account Id", entity="account")
+    seen = []
+    await cache.set_many([a, b, other])
+    seen.append(_ids(await cache.get_phys_many(NS, ENT, ["cust_id", "cust_nm", "acct_id", "nope"])))
+    seen.append(_ids(await cache.get_logi_many(NS, ENT, ["Customer Id", "Customer Name", "nope"])))
+    seen.append(_ids(await cache.get_syn_many(NS, ENT, ["Id", "nope"])))
+
+    # Rename, the way the update route does it: old and new names invalidated together, then a read fills
+    renamed = a | {"logical_name": "Customer Number", "synonyms": ["No"], "version": 2}
+    await cache.invalidate_many([_names(a), _names(renamed)])
+    seen.append(_ids(await cache.get_logi_many(NS, ENT, ["Customer Id", "Customer Number"])))
+    await cache.set_many([renamed], notify=False)
+    seen.append(_ids(await cache.get_logi_many(NS, ENT, ["Customer Id", "Customer Number"])))
+    seen.append(_ids(await cache.get_syn_many(NS, ENT, ["Id", "No"])))
+    seen.append([e and e["version"] for e in await cache.get_phys_many(NS, ENT, ["cust_id"])])
+
+    await cache.invalidate(*_names(b))
+    seen.append(_ids(await cache.get_phys_many(NS, ENT, ["cust_nm", "cust_id"])))
+    seen.append(_ids(await cache.get_phys_many(NS, "account", ["acct_id"])))
+    return seen
+
+EXPECTED = [[1, 2, None, None], [1, 2, None], [1, None], [None, None], [None, 1], [None, 1], [2], [None, 1], [3]]
+
+async def _check() -> str | None:
+    for layout in LAYOUTS:
+        for lua in ((True, False) if layout != "legacy" else (True,)):
+            cache = _worker(layout, fakeredis.FakeServer(), lua)
+            seen = await _sequence(cache)
+            if seen != EXPECTED:
+                return f"{layout} (lua={lua}) saw {seen}, expected {EXPECTED}"
+            entity = await cache.get_entity(NS, ENT)
+            if layout == "legacy" and entity is not None:
+                return "the legacy layout returned per-entity records"
+            if layout != "legacy" and sorted(p["id"] for p in entity) != [1]:
+                return f"{layout}: get_entity returned {entity} after the invalidation"
+
+    # Compact hashes only: no per-name keys are written
+    server = fakeredis.FakeServer()
+    compact = _worker("compact", server)
+    await compact.set_many([_payload(1, "cust_id", "Customer Id")])
+    if await compact.redis.keys("attr:by_*"): return "the compact layout wrote per-name keys"
+
+    # Rollout: a dual worker reads entries a legacy worker wrote; a compact one doesn't see them
+    server = fakeredis.FakeServer()
+    await _worker("legacy", server).set_many([_payload(1, "cust_id", "Customer Id", ["Id"])])
+    dual = _worker("dual", server)
+    if _ids(await dual.get_phys_many(NS, ENT, ["cust_id"])) != [1] or _ids(await dual.get_syn_many(NS, ENT, ["Id"])) != [1]:
+        return "the dual layout did not fall back to legacy keys"
+    if _ids(await _worker("compact", server).get_phys_many(NS, ENT, ["cust_id"])) != [None]:
+        return "the compact layout read legacy keys"
+    # ...and a dual worker's invalidation removes both copies
+    await dual.invalidate(NS, ENT, "cust_id", "Customer Id", ["Id"])
+    if await dual.redis.keys("attr:by_*") or await dual.redis.hlen(f"attr:idx:phys:{NS}:{ENT}"):
+        return "a dual invalidation left legacy keys or compact index entries behind"
+    return None
+
+def run_test():
+    error = asyncio.run(_check())
+    if error:
+        print('ERROR:', error)
+        return 1
+    print('legacy, dual and compact cache layouts answer the same set/get/invalidate sequence alike')
+    return 0
+
+if __name__ == '__main__':
+    exit(run_test())
@@ -0,0 +1,77 @@
+import sys
+import pathlib
+import tempfile
+sys.path.insert(0, str(pathlib.Path('.').resolve()))
+
+from api.app.services.catalog import CatalogFile, compile_rows, publish, _published_writes
+
+def _row(id, ns, ent, phys, logi, synonyms=(), description=None):
+    return {"id": id, "namespace": ns, "entity": ent, "category": "entity", "logical_name": logi,
+            "physical_name": phys, "data_type": "text", "description": description, "source_system": None,
+            "created_by": "System", "updated_by": "System", "synonyms": list(synonyms),
+            "tags": '["pii"]' if id == 1 else None, "version": id, "metadata": '{"owner": "crm"}' if id == 1 else None}
+
+ROWS = [
+    _row(1, "default", "customer", "cust_id", "Customer Id", synonyms=["CID", "Kunden-Nr"], description="Primary key"),
+    _row(2, "default", "customer", "cust_nm", "Customer Name", synonyms=["CID"]),
+    _row(3, "default", "customer", "café_nm", "Café Name ☕", synonyms=["Nom du café"]),
+    _row(4, "default", "customer", "emoji_😀", "Emoji 😀"),
+    _row(5, "default", "customer:eu", "cust_id", "EU Customer Id"),
+    _row(6, "sales", "customer", "cust_id", "Sales Customer Id"),
+]
+
+def run_test():
+    with tempfile.TemporaryDirectory() as tmp:
+        path = publish(compile_rows(ROWS, generation=42, writes=7), 42, tmp)
+        f = CatalogFile(path)
+        try:
+            if (f.generation, f.writes, f.rows, f.entities) != (42, 7, 6, 3) or _published_writes(tmp) != 7:
+                print('ERROR: header', f.generation, f.writes, f.rows, f.entities)
+                return 1
+
+            # The string table is sorted by UTF-8 bytes, so every interned string bisects to itself
+            strings = f._strings
+            if [strings[i] for i in range(len(strings))] != sorted(strings[i] for i in range(len(strings))):
+                print('ERROR: string table is not sorted')
+                return 1
+
+            phys = f.get_many("phys", "default", "customer", ["cust_id", "café_nm", "emoji_😀", "unknown", "cust_nm"])
+            if [p and p["id"] for p in phys] != [1, 3, 4, None, 2]:
+                print('ERROR: physical lookups', [p and p["id"] for p in phys])
+                return 1
+            first = phys[0]
+            if (first["tags"], first["metadata"], first["synonyms"], first["description"], first["source_system"],
+                    first["is_active"], first["version"]) != (["pii"], {"owner": "crm"}, ["CID", "Kunden-Nr"],
+                                                              "Primary key", None, True, 1):
+                print('ERROR: payload', first)
+                return 1
+            if phys[1]["tags"] != [] or phys[1]["metadata"] != {}:
+                print('ERROR: NULL tags/metadata should decode to [] / {}', phys[1])
+                return 1
+
+            logi = f.get_many("logi", "default", "customer", ["Café Name ☕", "Emoji 😀", "CID"])
+            syn = f.get_many("syn", "default", "customer", ["CID", "Kunden-Nr", "Nom du café", "Customer Id"])
+            if [p and p["id"] for p in logi] != [3, 4, None] or [p and p["id"] for p in syn] != [1, 1, 3, None]:
+                print('ERROR: logical/synonym lookups', [p and p["id"] for p in logi], [p and p["id"] for p in syn])
+                return 1
+
+            # Entities and namespaces are separate slices, including an entity that extends another's name
+            other = [f.get_many("phys", ns, ent, ["cust_id"])[0] for ns, ent in
+                     [("default", "customer:eu"), ("sales", "customer"), ("default", "nobody"), ("nowhere", "customer")]]
+            if [p and p["id"] for p in other] != [5, 6, None, None]:
+                print('ERROR: entity/namespace slices', [p and p["id"] for p in other])
+                return 1
+
+            empty = CatalogFile(publish(compile_rows([], generation=43), 43, tmp))
+            if empty.rows or empty.get_many("phys", "default", "customer", ["cust_id"]) != [None]:
+                print('ERROR: empty catalog')
+                return 1
+            empty.close()
+        finally:
+            f.close()
+
+    print('Compiled catalog round-trips strings, synonyms and unicode through its binary searches')
+    return 0
+
+if __name__ == '__main__':
+    exit(run_test())
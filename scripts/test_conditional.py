@@ -0,0 +1,71 @@
+import os
+import sys
+import asyncio
+import pathlib
+sys.path.insert(0, str(pathlib.Path('.').resolve()))
+
+# A Redis URL enables the cache (and its L1); the client itself is replaced with fakeredis below
+os.environ.setdefault("REDIS_URL", "redis://localhost:6379/0")
+import fakeredis.aioredis
+import httpx
+from fastapi import FastAPI, Request
+from api.app.services.cache import cache
+from api.app.services.conditional import conditional
+
+app = FastAPI()
+computed = []
+
+@app.get("/items")
+async def items(request: Request, cacheable: bool = True):
+    async def compute():
+        computed.append(1)
+        return {"computed": len(computed)}
+    return await conditional(request, ["sales"], None, compute, cacheable=cacheable)
+
+async def _check() -> str | None:
+    cache.redis = fakeredis.aioredis.FakeRedis()
+    async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://t") as client:
+        r = await client.get("/items")
+        etag = r.headers.get("etag")
+        if r.status_code != 200 or not etag or len(computed) != 1: return f"first request: {r.status_code} {etag}"
+
+        # The same request with the tag: 304 without computing anything
+        r = await client.get("/items", headers={"If-None-Match": etag})
+        if r.status_code != 304 or r.content or len(computed) != 1: return f"matching If-None-Match answered {r.status_code}"
+        r = await client.get("/items", headers={"If-None-Match": f'W/{etag}, "other"'})
+        if r.status_code != 304: return "a weak tag in a list did not match"
+
+        # Without the tag: the body comes from the response cache (also with an empty L1)
+        cache.l1.clear()
+        r = await client.get("/items")
+        if r.status_code != 200 or r.json() != {"computed": 1} or len(computed) != 1:
+            return "the response cache was not used"
+
+        # A write to another namespace keeps the tag; a write to this one changes it
+        await cache.invalidate("other", "e", "p", "L")
+        r = await client.get("/items", headers={"If-None-Match": etag})
+        if r.status_code != 304: return "a write to another namespace changed the ETag"
+        await cache.invalidate("sales", "customer", "cust_id", "Customer Id")
+        r = await client.get("/items", headers={"If-None-Match": etag})
+        if r.status_code != 200 or r.headers.get("etag") in (None, etag) or r.json() != {"computed": 2}:
+            return f"a write to the namespace kept the ETag or the cached body: {r.status_code} {r.json()}"
+
+        # cacheable=False: no ETag, computed every time, nothing stored
+        stored = len(await cache.redis.keys("attr:resp:*"))
+        for _ in range(2):
+            r = await client.get("/items?cacheable=false", headers={"If-None-Match": etag})
+            if r.status_code != 200 or "etag" in r.headers: return "a non-cacheable response got an ETag or a 304"
+        if len(computed) != 4 or len(await cache.redis.keys("attr:resp:*")) != stored:
+            return "a non-cacheable response was served from or stored in the response cache"
+    return None
+
+def run_test():
+    error = asyncio.run(_check())
+    if error:
+        print('ERROR:', error)
+        return 1
+    print('ETags answer 304 until the namespace is written; cacheable=False bypasses the response cache')
+    return 0
+
+if __name__ == '__main__':
+    exit(run_test())
@@ -0,0 +1,131 @@
+import sys
+import asyncio
+import pathlib
+sys.path.insert(0, str(pathlib.Path('.').resolve()))
+
+from api.app.repo import bulk
+from api.app.repo.attribute_repo import DuplicateError
+
+def _existing():
+    return {
+        10: {"namespace": "default", "entity": "customer", "physical_name": "cust_id", "logical_name": "Customer Id",
+             "data_type": "int", "synonyms": []},
+        11: {"namespace": "default", "entity": "customer", "physical_name": "cust_nm", "logical_name": "Customer Name",
+             "data_type": "text", "synonyms": ["Name"]},
+        12: {"namespace": "default", "entity": "customer", "physical_name": "cust_ph", "logical_name": "Phone",
+             "data_type": "text", "synonyms": []},
+    }
+
+class FakeConnection:
+    """Answers copy_upsert's statements the way Postgres would, from an in-memory meta.attribute."""
+    def __init__(self):
+        self.table = _existing()
+        self.staged: list[dict] = []
+
+    async def execute(self, sql, *args): pass
+
+    async def copy_records_to_table(self, table, records, columns):
+        self.staged = [dict(zip(columns, r)) for r in records]
+
+    def _find(self, s, field):
+        return next((i for i, r in self.table.items() if (r["namespace"], r["entity"], r[field]) ==
+                     (s["namespace"], s["entity"], s[field])), None)
+
+    def _classify(self):
+        seen_p, seen_l, out = {}, {}, []
+        for s in sorted(self.staged, key=lambda s: s["row_no"]):
+            kp, kl = (s["namespace"], s["entity"], s["physical_name"]), (s["namespace"], s["entity"], s["logical_name"])
+            seen_p[kp], seen_l[kl] = seen_p.get(kp, 0) + 1, seen_l.get(kl, 0) + 1
+            p = self._find(s, "physical_name")
+            out.append({"row_no": s["row_no"], "rn_p": seen_p[kp], "rn_l": seen_l[kl], "phys_id": p,
+                        "logi_id": self._find(s, "logical_name"),
+                        "old_logical": self.table[p]["logical_name"] if p else None,
+                        "old_synonyms": self.table[p]["synonyms"] if p else None})
+        return out
+
+    def _insert(self, sql, row_nos):
+        returned = []
+        for s in (s for s in self.staged if s["row_no"] in row_nos):
+            fields = {k: s[k] for k in ("namespace", "entity", "physical_name", "logical_name", "data_type", "synonyms")}
+            hit = self._find(s, "physical_name")
+            if hit is None:
+                id_, inserted = max(self.table) + 1, True
+            elif "DO UPDATE" in sql and self.table[hit] != fields:
+                id_, inserted = hit, False
+            else:
+                continue  # DO NOTHING, or DO UPDATE ... WHERE IS DISTINCT FROM is false
+            self.table[id_] = fields
+            returned.append({"id": id_, **fields, "category": "entity", "description": None, "source_system": None,
+                             "created_by": "System", "updated_by": "System", "tags": "[]", "is_active": True,
+                             "version": 1 if inserted else 2, "metadata": "{}", "inserted": inserted})
+        return returned
+
+    async def fetch(self, sql, *args):
+        if "row_number()" in sql: return self._classify()
+        if sql.lstrip().startswith("INSERT"): return self._insert(sql, args[0])
+        raise AssertionError(f"unexpected statement {sql[:60]}")
+
+def _row(phys, logi, data_type="text", synonyms=()):
+    return {"namespace": "default", "entity": "customer", "physical_name": phys, "logical_name": logi,
+            "data_type": data_type, "synonyms": list(synonyms)}
+
+ROWS = [
+    _row("cust_dob", "Birth Date"),                  # new
+    _row("cust_id", "Customer Id", data_type="int"),  # identical to id 10
+    _row("cust_nm", "Client Name", synonyms=["Name"]),  # id 11 under a new logical name
+    _row("cust_x", "Phone"),                         # logical name held by id 12
+    _row("cust_dob", "Date of Birth"),               # repeats row 0's physical name
+]
+
+async def _check() -> str | None:
+    conn = FakeConnection()
+    res = await bulk.copy_upsert(conn, ROWS, "update")
+    got = [o["status"] for o in res.outcomes]
+    if got != ["inserted", "unchanged", "updated", "conflict", "duplicate"]:
+        return f"update: unexpected outcomes {got}"
+    if [p["physical_name"] for p in res.payloads] != ["cust_dob", "cust_nm"] or res.outcomes[2]["id"] != 11:
+        return f"update: unexpected payloads {res.payloads}"
+    if res.stale != [("default", "customer", "cust_nm", "Customer Name", ["Name"])]:
+        return f"update: the renamed row's old keys should be stale, got {res.stale}"
+    if res.counts != {"inserted": 1, "unchanged": 1, "updated": 1, "conflict": 1, "duplicate": 1}:
+        return f"update: unexpected counts {res.counts}"
+
+    res = await bulk.copy_upsert(FakeConnection(), ROWS, "skip")
+    got = [o["status"] for o in res.outcomes]
+    if got != ["inserted", "skipped", "skipped", "skipped", "duplicate"] or res.stale:
+        return f"skip: unexpected outcomes {got}, stale {res.stale}"
+    if res.outcomes[1]["id"] != 10 or res.outcomes[3]["id"] != 12:
+        return f"skip: skipped rows should name the existing attribute, got {res.outcomes}"
+
+    conn = FakeConnection()
+    try:
+        await bulk.copy_upsert(conn, ROWS, "fail")
+        return "fail: duplicates were written"
+    except DuplicateError as e:
+        if len(e.duplicates) != 4 or conn.table != _existing():
+            return f"fail: unexpected duplicates {e.duplicates} or writes"
+
+    # A concurrent insert between classification and INSERT ... ON CONFLICT DO NOTHING: skipped, not inserted
+    conn = FakeConnection()
+    classify = conn._classify
+    def classify_then_race():
+        out = classify()
+        conn.table[99] = {"namespace": "default", "entity": "customer", "physical_name": "cust_dob",
+                          "logical_name": "Birth Date", "data_type": "text", "synonyms": []}
+        return out
+    conn._classify = classify_then_race
+    res = await bulk.copy_upsert(conn, ROWS[:1], "skip")
+    if [o["status"] for o in res.outcomes] != ["skipped"] or res.payloads:
+        return f"race: unexpected outcomes {res.outcomes}"
+    return None
+
+def run_test():
+    error = asyncio.run(_check())
+    if error:
+        print('ERROR:', error)
+        return 1
+    print('copy_upsert classifies inserted/updated/unchanged/skipped/conflict/duplicate rows')
+    return 0
+
+if __name__ == '__main__':
+    exit(run_test())
@@ -0,0 +1,62 @@
+import os
+import sys
+import pathlib
+import tempfile
+sys.path.insert(0, str(pathlib.Path('.').resolve()))
+
+from types import SimpleNamespace
+from api.app.jobs import import_catalog
+
+CSV = """namespace,entity,category,logical_name,physical_name,data_type,synonyms
+default,customer,entity,Customer Name,cust_nm,text,Client Name|Name
+default,customer,entity,Customer Name Again,cust_nm,text,
+default,customer,entity,Customer Id,cust_id,int,
+default,customer,entity,Customer Name,cust_name_dup,text,
+default,customer,entity,,no_logical,text,
+default,account,entity,Account Id,acct_id,int,"[""Acct""]"
+"""
+
+def run_test():
+    from distributed import Client, LocalCluster
+    from api.app.dask_config import DaskConfig
+
+    # DASK_LOCAL_THREADS=0 (auto) must give a cluster with workers, not LocalCluster(n_workers=0)
+    os.environ.update(DASK_MODE='local', DASK_LOCAL_THREADS='0')
+    client = DaskConfig().client()
+    try:
+        if not client.scheduler_info()['workers']:
+            print('ERROR: DaskConfig started a LocalCluster without workers')
+            return 1
+    finally:
+        client.close()
+
+    loaded = []
+    async def fake_load(rows, on_conflict):
+        loaded.extend(rows)
+        return SimpleNamespace(counts={'inserted': len(rows)}, outcomes=[{'row': i, 'status': 'inserted'} for i in range(len(rows))])
+    # In-process workers, so the stub replaces the DB/Redis load on them too
+    import_catalog._load = fake_load
+
+    with tempfile.TemporaryDirectory() as d:
+        path = os.path.join(d, 'catalog.csv')
+        with open(path, 'w') as f: f.write(CSV)
+        with Client(LocalCluster(n_workers=1, processes=False)) as client:
+            summary = import_catalog.run_import(client, path, blocksize='200B')
+
+    if summary['rows_read'] != 6 or summary['invalid'] != 1 or summary['duplicates_in_input'] != 2:
+        print('ERROR: unexpected summary', summary)
+        return 1
+    got = sorted((r['physical_name'], r['logical_name']) for r in loaded)
+    want = [('acct_id', 'Account Id'), ('cust_id', 'Customer Id'), ('cust_nm', 'Customer Name')]
+    if got != want:
+        print('ERROR: loaded rows', got)
+        return 1
+    syn = {r['physical_name']: r['synonyms'] for r in loaded}
+    if syn['cust_nm'] != ['Client Name', 'Name'] or syn['acct_id'] != ['Acct']:
+        print('ERROR: list columns not parsed', syn)
+        return 1
+    print('import_catalog validated, de-duplicated (first occurrence wins) and loaded', len(loaded), 'rows')
+    return 0
+
+if __name__ == '__main__':
+    exit(run_test())
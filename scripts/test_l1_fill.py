@@ -0,0 +1,66 @@
+import os
+import sys
+import asyncio
+import pathlib
+sys.path.insert(0, str(pathlib.Path('.').resolve()))
+
+# A Redis URL enables the cache (and its L1); the client itself is replaced with fakeredis below
+os.environ.setdefault("REDIS_URL", "redis://localhost:6379/0")
+import fakeredis
+import fakeredis.aioredis
+from api.app.services.cache import Cache, name_key
+
+def _payload(logi, version=1):
+    return {"id": 1, "namespace": "default", "entity": "customer", "category": "entity", "logical_name": logi,
+            "physical_name": "cust_nm", "data_type": "text", "description": None, "source_system": None,
+            "created_by": "System", "updated_by": "System", "synonyms": [], "tags": [], "is_active": True,
+            "version": version, "metadata": {}}
+
+KEY = name_key("phys", "default", "customer", "cust_nm")
+
+def _worker(server) -> Cache:
+    cache = Cache()
+    cache.redis = fakeredis.aioredis.FakeRedis(server=server)
+    return cache
+
+async def _check() -> str | None:
+    server = fakeredis.FakeServer()
+    a, b = _worker(server), _worker(server)
+    await a.start_listener()
+    await asyncio.sleep(0.05)
+    try:
+        # No invalidation between the DB read and the fill: the L1 is filled
+        epoch = a.l1_epoch
+        await a.set_many([_payload("Customer Name")], notify=False, epoch=epoch)
+        if a.l1.get(KEY) is None: return "a fill with a current epoch left the L1 empty"
+
+        # This worker invalidates while the DB read is in flight: the row read before it stays out of the L1
+        epoch = a.l1_epoch
+        await a.invalidate("default", "customer", "cust_nm", "Customer Name")
+        await a.set_many([_payload("Customer Name")], notify=False, epoch=epoch)
+        if a.l1.get(KEY) is not None: return "a fill that predates a local invalidation reached the L1"
+
+        # Another worker's update arrives through pub/sub during the read: same thing
+        epoch = a.l1_epoch
+        await b.invalidate("default", "customer", "cust_nm", "Customer Name")
+        await asyncio.sleep(0.05)
+        await a.set_many([_payload("Customer Name")], notify=False, epoch=epoch)
+        if a.l1.get(KEY) is not None: return "a fill that predates a peer's invalidation reached the L1"
+
+        # Without an epoch (a write, not a DB read) the L1 is filled as before
+        await a.set_many([_payload("Client Name", version=2)])
+        if (a.l1.get(KEY) or {}).get("version") != 2: return "a write did not fill the L1"
+    finally:
+        await a.stop_listener()
+    return None
+
+def run_test():
+    error = asyncio.run(_check())
+    if error:
+        print('ERROR:', error)
+        return 1
+    print('DB fills that raced with an invalidation are kept out of the L1')
+    return 0
+
+if __name__ == '__main__':
+    exit(run_test())
@@ -0,0 +1,35 @@
+import sys
+import time
+import pathlib
+sys.path.insert(0, str(pathlib.Path('.').resolve()))
+
+from api.app.services.cache import LocalCache
+
+def run_test():
+    l1 = LocalCache(max_entries=2, ttl=60)
+    l1.set('a', {'v': 1})
+    l1.set('b', {'v': 2})
+    # Touch 'a' so 'b' becomes the least recently used entry
+    assert l1.get('a') == {'v': 1}
+    l1.set('c', {'v': 3})
+    if l1.get('b') is not None:
+        print('ERROR: LRU entry was not evicted')
+        return 1
+
+    l1.discard(['a'])
+    if l1.get('a') is not None:
+        print('ERROR: discard did not drop the entry')
+        return 1
+
+    short = LocalCache(max_entries=10, ttl=0.01)
+    short.set('x', {'v': 1})
+    time.sleep(0.02)
+    if short.get('x') is not None or len(short) != 0:
+        print('ERROR: expired entry was served')
+        return 1
+
+    print('LocalCache LRU/TTL behave as expected')
+    return 0
+
+if __name__ == '__main__':
+    exit(run_test())
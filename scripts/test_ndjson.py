@@ -0,0 +1,61 @@
+import sys
+import asyncio
+import pathlib
+sys.path.insert(0, str(pathlib.Path('.').resolve()))
+
+import orjson
+from api.app.routers import convert
+
+class FakeRequest:
+    """Delivers the body in the given pieces, which need not end on line boundaries."""
+    def __init__(self, *pieces: bytes):
+        self.pieces = pieces
+
+    async def stream(self):
+        for p in self.pieces: yield p
+
+async def _lookup(session, ns, entity, names):
+    return {n: {"logical_name": n.upper()} for n in names if n != "unknown"}
+
+async def _collect(gen) -> list[dict]:
+    return [orjson.loads(line) for chunk in [c async for c in gen] for line in chunk.splitlines()]
+
+async def _check() -> str | None:
+    cases = {b'"a"': ["a"], b'["a", "b"]': ["a", "b"], b'  ': [], b'[]': []}
+    for line, want in cases.items():
+        if convert._parse_line(line) != want: return f"{line!r} parsed as {convert._parse_line(line)!r}"
+    for line in (b'{"a": 1}', b'[1, 2]', b'"unterminated', b'42'):
+        if not isinstance(convert._parse_line(line), ValueError): return f"{line!r} was accepted"
+
+    # Lines split across body pieces, blank lines and a last line without a newline
+    read = [x async for x in convert._read_names(FakeRequest(b'"a"\n["b",', b' "c"]\n\n', b'"d"'))]
+    if read != [(1, ["a"]), (2, ["b", "c"]), (3, []), (4, ["d"])]:
+        return f"unexpected lines {read}"
+
+    # A bad line's error comes after the results of the names before it, not ahead of them
+    body = FakeRequest(b'"a"\n["b", "unknown"]\nnot json\n"c"\n')
+    out = await _collect(convert._stream(body, _lookup, "default", "e", chunk_size=1000))
+    got = [o.get("name", o.get("line")) for o in out]
+    if got != ["a", "b", "unknown", 3, "c"]:
+        return f"output out of input order: {got}"
+    if out[2]["result"] is not None or out[0]["result"] != {"logical_name": "A"} or "invalid JSON" not in out[3]["error"]:
+        return f"unexpected output {out}"
+
+    # Chunks smaller than the input still come out in order
+    names = [f"n{i}" for i in range(7)]
+    body = FakeRequest(b"".join(orjson.dumps(n) + b"\n" for n in names) + b'{"bad": 1}\n')
+    out = await _collect(convert._stream(body, _lookup, "default", "e", chunk_size=2))
+    if [o.get("name", o.get("line")) for o in out] != names + [8]:
+        return f"chunked output out of order: {out}"
+    return None
+
+def run_test():
+    error = asyncio.run(_check())
+    if error:
+        print('ERROR:', error)
+        return 1
+    print('NDJSON stream input is parsed per line and answered in input order')
+    return 0
+
+if __name__ == '__main__':
+    exit(run_test())
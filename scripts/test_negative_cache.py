@@ -0,0 +1,69 @@
+import os
+import sys
+import asyncio
+import pathlib
+sys.path.insert(0, str(pathlib.Path('.').resolve()))
+
+# A Redis URL enables the cache (and its L1); the client itself is replaced with fakeredis below
+os.environ.setdefault("REDIS_URL", "redis://localhost:6379/0")
+import fakeredis
+import fakeredis.aioredis
+from api.app.services.cache import Cache
+
+NEG_KEY = "attr:neg:phys:default:customer"
+
+def _payload(phys):
+    return {"id": 1, "namespace": "default", "entity": "customer", "category": "entity", "logical_name": phys.upper(),
+            "physical_name": phys, "data_type": "text", "description": None, "source_system": None,
+            "created_by": "System", "updated_by": "System", "synonyms": [], "tags": [], "is_active": True,
+            "version": 1, "metadata": {}}
+
+def _worker(server) -> Cache:
+    cache = Cache()
+    cache.redis = fakeredis.aioredis.FakeRedis(server=server)
+    return cache
+
+async def _check() -> str | None:
+    server = fakeredis.FakeServer()
+    a, b = _worker(server), _worker(server)
+
+    # No write in between: the miss is remembered
+    unknown, token = await a.get_missing("phys", "default", "customer", ["nope"])
+    await a.set_missing("phys", "default", "customer", ["nope"], token)
+    if unknown != [False] or not await a.redis.sismember(NEG_KEY, "nope"):
+        return "a plain miss was not cached as unknown"
+
+    # This worker creates the name between the lookup and set_missing: nothing negative is stored
+    unknown, token = await a.get_missing("phys", "default", "customer", ["new_col"])
+    await a.set_many([_payload("new_col")])
+    await a.set_missing("phys", "default", "customer", ["new_col"], token)
+    if await a.redis.sismember(NEG_KEY, "new_col"):
+        return "a negative entry was stored after a write to the entity"
+    if (await a.get_missing("phys", "default", "customer", ["new_col"]))[0] != [False]:
+        return "the L1 remembered a name written meanwhile as unknown"
+
+    # Another worker's write lands in between: the neg_gen token still rejects the stale miss
+    unknown, token = await a.get_missing("phys", "default", "customer", ["other_col"])
+    await b.set_many([_payload("other_col")])
+    await a.set_missing("phys", "default", "customer", ["other_col"], token)
+    if await a.redis.sismember(NEG_KEY, "other_col"):
+        return "a negative entry was stored after another worker's write"
+
+    # A write to a different entity doesn't invalidate the token
+    unknown, token = await a.get_missing("phys", "default", "customer", ["still_missing"])
+    await b.set_many([_payload("x") | {"entity": "account"}])
+    await a.set_missing("phys", "default", "customer", ["still_missing"], token)
+    if not await a.redis.sismember(NEG_KEY, "still_missing"):
+        return "a write to another entity blocked the negative entry"
+    return None
+
+def run_test():
+    error = asyncio.run(_check())
+    if error:
+        print('ERROR:', error)
+        return 1
+    print('Negative entries are not stored when the entity was written during the lookup')
+    return 0
+
+if __name__ == '__main__':
+    exit(run_test())
@@ -0,0 +1,105 @@
+import sys
+import asyncio
+import base64
+import pathlib
+from types import SimpleNamespace
+sys.path.insert(0, str(pathlib.Path('.').resolve()))
+
+import httpx
+from fastapi import FastAPI
+from sqlalchemy.dialects import postgresql
+from api.app.repo.attribute_repo import AttributeRepo, decode_cursor, encode_cursor
+from api.app.repo.db import get_read_session
+from api.app.routers import search
+
+# (rank, id) of every match; runs of equal ranks span page boundaries
+MATCHES = [(0.9, 4), (0.5, 2), (0.5, 3), (0.5, 8), (0.5, 9), (0.1, 1), (0.1, 5)]
+
+class _Row(tuple):
+    """(Attribute, rank[, total]) row with the labelled columns as attributes, like a SQLAlchemy Row."""
+    def __new__(cls, values, **labels):
+        row = super().__new__(cls, values)
+        row.__dict__.update(labels)
+        return row
+
+class FakeSession:
+    """Answers search_fts's statement from MATCHES: applies its keyset predicate, ordering and limit."""
+    def __init__(self):
+        self.statements = []
+
+    async def execute(self, stmt):
+        compiled = stmt.compile(dialect=postgresql.dialect())
+        sql, params = str(compiled), compiled.params
+        self.statements.append(sql)
+        rows = sorted(MATCHES, key=lambda m: (-m[0], m[1]))
+        if "id_1" in params:
+            last_rank, last_id, limit = params["param_1"], params["id_1"], params["param_3"]
+            rows = [(r, i) for r, i in rows if r < last_rank or (r == last_rank and i > last_id)]
+        else:
+            limit = params["param_1"]
+        first_page = "count(*) OVER ()" in sql
+        out = [_Row((SimpleNamespace(id=i), r) + ((len(MATCHES),) if first_page else ()), rank=r,
+                    **({"total": len(MATCHES)} if first_page else {})) for r, i in rows[:limit]]
+        return SimpleNamespace(all=lambda: out)
+
+async def _check() -> str | None:
+    repo = AttributeRepo(FakeSession())
+    seen, totals, cursor, pages = [], set(), None, 0
+    while True:
+        rows, total, cursor = await repo.search_fts(None, None, "cust", 2, cursor)
+        seen += [r.id for r in rows]
+        totals.add(total)
+        pages += 1
+        if cursor is None: break
+        if pages > len(MATCHES): return "paging did not terminate"
+    if seen != [4, 2, 3, 8, 9, 1, 5]:
+        return f"pages skipped or repeated rows across equal ranks: {seen}"
+    if totals != {len(MATCHES)} or pages != 4:
+        return f"expected the first page's total carried through 4 pages, got {totals}, {pages}"
+    if "count(*) OVER ()" in repo.session.statements[-1]:
+        return "later pages recounted the total"
+
+    # Exactly one page: no cursor
+    rows, total, cursor = await repo.search_fts(None, None, "cust", len(MATCHES), None)
+    if len(rows) != len(MATCHES) or cursor is not None:
+        return "a complete first page returned a next cursor"
+
+    if decode_cursor(encode_cursor(0.5, 3, 7)) != (0.5, 3, 7):
+        return "cursor does not round-trip"
+    tampered = [
+        "not-base64!!",
+        base64.urlsafe_b64encode(b"[0.5, 3]").decode(),
+        base64.urlsafe_b64encode(b'["high", 3, 7]').decode(),
+        base64.urlsafe_b64encode(b'{"rank": 0.5}').decode(),
+        encode_cursor(0.5, 3, 7)[:-4],
+    ]
+    for bad in tampered:
+        try:
+            await repo.search_fts(None, None, "cust", 2, bad)
+            return f"tampered cursor {bad!r} was accepted"
+        except ValueError:
+            pass
+
+    # Out-of-range paging is rejected before any query runs
+    app = FastAPI()
+    app.include_router(search.router)
+    session = FakeSession()
+    async def fake_session(): yield session
+    app.dependency_overrides[get_read_session] = fake_session
+    async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://t") as client:
+        for query in ("limit=0", "limit=-1", "limit=100000", "offset=-1"):
+            r = await client.get(f"/v1/attributes/search?q=cust&mode=fts&{query}")
+            if r.status_code != 422: return f"{query} answered {r.status_code}, expected 422"
+    if session.statements: return "an out-of-range request reached the database"
+    return None
+
+def run_test():
+    error = asyncio.run(_check())
+    if error:
+        print('ERROR:', error)
+        return 1
+    print('search_fts keyset cursor pages across equal ranks and rejects tampered cursors')
+    return 0
+
+if __name__ == '__main__':
+    exit(run_test())
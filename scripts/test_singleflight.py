@@ -0,0 +1,60 @@
+import sys
+import asyncio
+import pathlib
+sys.path.insert(0, str(pathlib.Path('.').resolve()))
+
+from api.app.services.singleflight import SingleFlight
+
+async def _check() -> str | None:
+    flights = SingleFlight()
+    loads = []
+
+    async def loader(keys):
+        loads.append(keys)
+        await asyncio.sleep(0.05)
+        return {k: f"value-{k}" for k in keys}
+
+    # N concurrent callers: one load, everyone gets the value
+    results = await asyncio.gather(*(flights.do_many(["a"], loader) for _ in range(10)))
+    if loads != [["a"]] or any(out != {"a": "value-a"} for out, _ in results):
+        return f"expected one load shared by all callers, got loads={loads}"
+    if sum(n for _, n in results) != 9 or len(flights):
+        return f"expected 9 coalesced keys and no flight left, got {[n for _, n in results]}, {len(flights)}"
+
+    # A leader exception reaches every follower, without a load per follower
+    loads.clear()
+
+    async def failing(keys):
+        loads.append(keys)
+        await asyncio.sleep(0.05)
+        raise RuntimeError("db down")
+    results = await asyncio.gather(*(flights.do_many(["b"], failing) for _ in range(5)), return_exceptions=True)
+    if not all(isinstance(r, RuntimeError) and str(r) == "db down" for r in results):
+        return f"expected every caller to see the leader's error, got {results}"
+    if loads != [["b"]] or "b" in flights:
+        return f"expected a single failing load and the key cleared, got loads={loads}"
+
+    # Cancelling the leader: its followers load for themselves instead of hanging
+    loads.clear()
+    leader = asyncio.create_task(flights.do_many(["c"], loader))
+    await asyncio.sleep(0.01)
+    followers = [asyncio.create_task(flights.do_many(["c"], loader)) for _ in range(3)]
+    await asyncio.sleep(0.01)
+    leader.cancel()
+    done = await asyncio.wait_for(asyncio.gather(*followers), 1)
+    if any(out != {"c": "value-c"} for out, _ in done):
+        return f"followers of a cancelled leader got {done}"
+    if len(loads) != 2 or len(flights):
+        return f"expected the cancelled load plus one retry and no flight left, got loads={loads}"
+    return None
+
+def run_test():
+    error = asyncio.run(_check())
+    if error:
+        print('ERROR:', error)
+        return 1
+    print('SingleFlight shares loads, errors and recovers from a cancelled leader')
+    return 0
+
+if __name__ == '__main__':
+    exit(run_test())
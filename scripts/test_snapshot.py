@@ -0,0 +1,99 @@
+import sys
+import asyncio
+import json
+import pathlib
+from datetime import datetime, timedelta, timezone
+sys.path.insert(0, str(pathlib.Path('.').resolve()))
+
+from sqlalchemy.dialects import postgresql
+from api.app.repo.db import Attribute
+from api.app.services import snapshot as snapshot_module
+from api.app.services.snapshot import NOTIFY_CHANNEL, Snapshot
+
+T0 = datetime(2024, 1, 1, tzinfo=timezone.utc)
+
+def _row(id_, phys, logi, synonyms=(), active=True, version=1, minutes=0):
+    return Attribute(id=id_, namespace="default", entity="customer", category="entity", physical_name=phys,
+                     logical_name=logi, data_type="text", synonyms=list(synonyms), tags=[], is_active=active,
+                     version=version, meta={}, created_by="System", updated_by="System",
+                     updated_at=T0 + timedelta(minutes=minutes))
+
+class _Result:
+    def __init__(self, rows): self.rows = rows
+    def scalars(self): return self
+    def all(self): return self.rows
+    def __iter__(self): return iter(self.rows)
+
+    async def partitions(self):
+        for start in range(0, len(self.rows), 2): yield self.rows[start:start + 2]
+
+class FakeSession:
+    """Answers the snapshot's statements from TABLE (id -> row): full load, catch-up and id sweep."""
+    async def __aenter__(self): return self
+    async def __aexit__(self, *exc): pass
+    def expunge_all(self): pass
+
+    async def stream(self, stmt):
+        return _Result([r for r in TABLE.values() if r.is_active])
+
+    async def execute(self, stmt):
+        compiled = stmt.compile(dialect=postgresql.dialect())
+        if "updated_at_1" in compiled.params:
+            since = compiled.params["updated_at_1"]
+            return _Result(sorted((r for r in TABLE.values() if r.updated_at > since), key=lambda r: r.updated_at))
+        return _Result([r.id for r in TABLE.values() if r.is_active])
+
+TABLE: dict[int, Attribute] = {}
+
+def _phys(snap, *names): return [p and p["id"] for p in snap.get_phys_many("default", "customer", list(names))]
+
+async def _check() -> str | None:
+    snapshot_module.SessionLocal = FakeSession
+    TABLE.update({1: _row(1, "cust_id", "Customer Id", ["Id"]), 2: _row(2, "cust_nm", "Customer Name"),
+                  3: _row(3, "cust_ph", "Phone"), 4: _row(4, "old_col", "Old", active=False)})
+    snap = Snapshot()
+    await snap.load()
+    if not snap.ready or sorted(snap.by_id) != [1, 2, 3] or _phys(snap, "cust_id", "old_col") != [1, None]:
+        return f"unexpected load {sorted(snap.by_id)}"
+    if snap.get_syn_many("default", "customer", ["Id"])[0]["id"] != 1: return "synonyms were not indexed"
+    if snap.memory_bytes <= 0 or snap.status()["memory_bytes"] != snap.memory_bytes:
+        return "the load did not measure the snapshot's memory"
+    loaded = snap.generation
+
+    # Nothing changed: the overlap window re-reads rows but doesn't bump the generation
+    if await snap.catch_up() or snap.generation != loaded: return "an idle catch-up reported changes"
+
+    # A rename, a deactivation and an insert after the high-water mark
+    TABLE[1] = _row(1, "cust_id", "Customer Number", ["No"], version=2, minutes=5)
+    TABLE[2] = _row(2, "cust_nm", "Customer Name", active=False, version=2, minutes=5)
+    TABLE[5] = _row(5, "cust_em", "Email", minutes=6)
+    if await snap.catch_up() != 3: return "the catch-up missed changed rows"
+    logi = [p and p["id"] for p in snap.get_logi_many("default", "customer", ["Customer Id", "Customer Number", "Email"])]
+    if logi != [None, 1, 5] or _phys(snap, "cust_nm") != [None]:
+        return f"catch-up applied the changes wrongly: {logi}"
+    if snap.get_syn_many("default", "customer", ["Id"]) != [None] or snap.generation != loaded + 1:
+        return "the renamed row kept its old synonym, or the generation did not move once"
+    if snap.high_water != T0 + timedelta(minutes=6): return f"high-water mark not advanced: {snap.high_water}"
+
+    # NOTIFY: a DELETE drops the row at once; an INSERT/UPDATE wakes the catch-up loop
+    snap._on_notify(None, 0, NOTIFY_CHANNEL, json.dumps({"op": "DELETE", "id": 3}))
+    if _phys(snap, "cust_ph") != [None] or snap.generation != loaded + 2: return "a DELETE notification was not applied"
+    snap._on_notify(None, 0, NOTIFY_CHANNEL, json.dumps({"op": "UPDATE"}))
+    if not snap._wake.is_set(): return "an UPDATE notification did not wake the catch-up"
+
+    # Without LISTEN, a hard delete is only found by the id sweep
+    del TABLE[5]
+    if await snap.catch_up() or await snap.sweep_deletes() != 1 or _phys(snap, "cust_em") != [None]:
+        return "a hard delete was not swept"
+    return None
+
+def run_test():
+    error = asyncio.run(_check())
+    if error:
+        print('ERROR:', error)
+        return 1
+    print('Snapshot loads, catches up, applies notifications and sweeps hard deletes')
+    return 0
+
+if __name__ == '__main__':
+    exit(run_test())
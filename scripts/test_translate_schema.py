@@ -0,0 +1,69 @@
+import os
+import sys
+import glob
+import json
+import pathlib
+import tempfile
+sys.path.insert(0, str(pathlib.Path('.').resolve()))
+
+import pandas as pd
+from api.app.jobs import translate_schema
+
+CATALOG = """namespace,entity,physical_name,logical_name,id,version,data_type,is_active
+sales,customer,cust_id,Customer Id,1,1,int,true
+sales,customer,cust_nm,Customer Name,2,3,text,true
+sales,customer,cust_old,Old,3,1,text,false
+default,customer,cust_id,Default Customer Id,4,1,int,true
+"""
+
+# Two rows without a namespace: they belong to --namespace (sales), not to namespace ""
+INVENTORY = pd.DataFrame({
+    "table_name": ["t1", "t1", "t1", "t2", "t2", "t3"],
+    "namespace": ["sales", "", "sales", "sales", "default", None],
+    "entity": ["customer"] * 6,
+    "physical_name": ["cust_id", "cust_nm", "cust_old", "nope", "cust_id", "nope"],
+})
+
+def _check(out: str, out_format: str) -> str | None:
+    if out_format == "csv":
+        translated = pd.concat(pd.read_csv(p, keep_default_na=False) for p in glob.glob(os.path.join(out, "translated", "*.csv")))
+        unresolved = pd.concat(pd.read_csv(p) for p in glob.glob(os.path.join(out, "unresolved", "*.csv")))
+    else:
+        translated = pd.read_parquet(os.path.join(out, "translated"))
+        unresolved = pd.read_parquet(os.path.join(out, "unresolved"))
+    translated = translated.sort_values(["table_name", "physical_name", "namespace"])
+    got = [(r.namespace, r.physical_name, r.logical_name if r.resolved else None) for r in translated.itertuples()]
+    want = [("sales", "cust_id", "Customer Id"), ("sales", "cust_nm", "Customer Name"), ("sales", "cust_old", None),
+            ("default", "cust_id", "Default Customer Id"), ("sales", "nope", None), ("sales", "nope", None)]
+    if got != want: return f"{out_format}: translated {got}"
+    if "table_name" not in translated or set(translated["table_name"]) != {"t1", "t2", "t3"}:
+        return f"{out_format}: pass-through columns lost"
+    if [tuple(r) for r in unresolved.sort_values("physical_name")[["namespace", "physical_name", "occurrences"]].values] != \
+            [("sales", "cust_old", 1), ("sales", "nope", 2)]:
+        return f"{out_format}: unresolved {unresolved.to_dict('records')}"
+    with open(os.path.join(out, "report.json")) as f: report = json.load(f)
+    if (report["rows"], report["resolved"], report["unresolved"], report["unresolved_distinct"]) != (6, 3, 3, 2):
+        return f"{out_format}: report {report}"
+    return None
+
+def run_test():
+    from distributed import Client, LocalCluster
+
+    with tempfile.TemporaryDirectory() as d, Client(LocalCluster(n_workers=1, processes=False)) as client:
+        catalog = os.path.join(d, "catalog.csv")
+        with open(catalog, "w") as f: f.write(CATALOG)
+        INVENTORY.to_csv(os.path.join(d, "inventory.csv"), index=False)
+        INVENTORY.to_parquet(os.path.join(d, "inventory.parquet"))
+        for inventory, out_format in (("inventory.csv", "csv"), ("inventory.parquet", "parquet")):
+            out = os.path.join(d, out_format)
+            translate_schema.run_translate(client, os.path.join(d, inventory), out, out_format=out_format,
+                                           catalog_path=catalog, namespace="sales", blocksize="100B")
+            error = _check(out, out_format)
+            if error:
+                print('ERROR:', error)
+                return 1
+    print('translate_schema resolves inventories to csv and parquet, blank namespaces from --namespace')
+    return 0
+
+if __name__ == '__main__':
+    exit(run_test())
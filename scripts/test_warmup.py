@@ -0,0 +1,50 @@
+import os
+import sys
+import asyncio
+import pathlib
+sys.path.insert(0, str(pathlib.Path('.').resolve()))
+
+os.environ.setdefault("HOT_STATS_FLUSH_SECONDS", "30")
+import fakeredis.aioredis
+from api.app.services.cache import cache
+from api.app.services.warmup import Warmup
+
+async def _no_warm(): pass
+
+def _worker() -> Warmup:
+    w = Warmup()
+    w._run = _no_warm  # nothing to warm: only the hot-stats counting is under test
+    return w
+
+async def _check() -> str | None:
+    # No Redis: no flusher, so traffic for ever-new entity names is not accumulated
+    cache.redis = None
+    w = _worker()
+    await w.start()
+    for i in range(1000): w.record("default", f"entity_{i}", 1)
+    if w._hits: return f"{len(w._hits)} entities counted without a flusher to drain them"
+    await w.stop()
+
+    # With Redis the counts are kept and flushed to the hourly sorted set
+    cache.redis = fakeredis.aioredis.FakeRedis()
+    w = _worker()
+    await w.start()
+    w.record("default", "customer", 3)
+    w.record("default", "customer", 2)
+    await w.stop()
+    ranked = await cache.redis.zunion([k async for k in cache.redis.scan_iter("attr:hot:*")], withscores=True)
+    if ranked != [(b"default\x1fcustomer", 5.0)]:
+        return f"unexpected hot stats {ranked}"
+    if w._hits: return "counts were kept after the flush"
+    return None
+
+def run_test():
+    error = asyncio.run(_check())
+    if error:
+        print('ERROR:', error)
+        return 1
+    print('Hot-entity counts are only kept while a flusher drains them to Redis')
+    return 0
+
+if __name__ == '__main__':
+    exit(run_test())
@@ -122,6 +122,15 @@ def main():
         logger.error("DB did not become ready; exiting")
         sys.exit(2)
 
+    # Multi-process Prometheus metrics: start from an empty directory so samples of
+    # workers from a previous run are not aggregated into /metrics
+    prom_dir = os.getenv("PROMETHEUS_MULTIPROC_DIR")
+    if prom_dir:
+        os.makedirs(prom_dir, exist_ok=True)
+        for name in os.listdir(prom_dir):
+            if name.endswith(".db"):
+                os.remove(os.path.join(prom_dir, name))
+
     # exec the command
     logger.info("Executing: %s", cmd)
     os.execvp(cmd[0], cmd)